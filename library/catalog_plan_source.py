@@ -0,0 +1,95 @@
+import re
+
+from pymongo import ASCENDING
+
+from library.store_links import STORE_LINKS
+
+
+class CATALOG_PLAN_SOURCE:
+    """
+    Fuente de datos del planeador de catálogo armada en el servidor.
+
+    shopify_update_items une vínculos, items de Zoho y productos de la tienda en dicts de
+    Python después de traer los documentos completos. Esta fuente entrega por ventanas
+    (links, zoho_by_id, shopify_by_id) con solo los campos que se comparan:
+    - Zoho_Inventory.store_links → $lookup a Zoho_Inventory.items por item_id, con $project
+      de los campos que usa el template (data_dict.get("...")).
+    - {store}.products: $lookup no cruza bases de datos, así que los productos de la ventana
+      se leen con un $in proyectado a las llaves del template + id / variants.id.
+    - modified_since (opcional): solo quedan como candidatos los items cuyo
+      last_modified_time de Zoho es posterior (los vínculos sin item de Zoho siempre
+      quedan: son archivados). Cambios hechos directo en Shopify no se detectan con este
+      filtro; conviene una corrida completa periódica.
+    """
+
+    ZOHO_ITEMS = "items"  # misma base que store_links (Zoho_Inventory)
+    PRODUCT_KEYS = ("id", "admin_graphql_api_id", "status")
+    VARIANT_KEYS = ("id", "sku")
+
+    def __init__(self, client, store: str, template: str, template_schema: dict):
+        self.client = client
+        self.store = store
+        self.store_links = STORE_LINKS(client)
+        self.zoho_fields = sorted(
+            set(re.findall(r'data_dict\.get\(\s*"([^"]+)"', template or "")) | {"item_id", "last_modified_time"}
+        )
+
+        product_fields = set(self.PRODUCT_KEYS)
+        for key, sub in (template_schema or {}).items():
+            if isinstance(sub, list) and sub and isinstance(sub[0], dict):
+                product_fields |= {f"{key}.{k}" for k in sub[0]}
+                if key == "variants":
+                    product_fields |= {f"variants.{k}" for k in self.VARIANT_KEYS}
+            else:
+                product_fields.add(key)
+        self.product_projection = {"_id": 0, **{f: 1 for f in sorted(product_fields)}}
+
+    def pipeline(self, link_ids: list, modified_since=None) -> list:
+        """Pipeline sobre store_links para los _id de una ventana."""
+        stages = [
+            {"$match": {"_id": {"$in": link_ids}}},
+            {"$sort": {"_id": ASCENDING}},
+            {"$lookup": {"from": self.ZOHO_ITEMS, "localField": "item_id", "foreignField": "item_id", "as": "zoho"}},
+            {"$project": {
+                "_id": 0, "store": 1, "item_id": 1, "shopify_id": 1, "name": 1,
+                **{f"zoho.{f}": 1 for f in self.zoho_fields},
+            }},
+            {"$unwind": {"path": "$zoho", "preserveNullAndEmptyArrays": True}},
+        ]
+        if modified_since is not None:
+            stages.append({"$match": {"$or": [
+                {"zoho": {"$exists": False}},
+                {"$expr": {"$gte": [
+                    {"$dateFromString": {"dateString": "$zoho.last_modified_time", "onError": None, "onNull": None}},
+                    modified_since,
+                ]}},
+            ]}})
+        return stages
+
+    def windows(self, size: int, modified_since=None, filter_extra: dict | None = None):
+        """
+        Genera (links, zoho_by_id, shopify_by_id) por ventanas de `size` vínculos.
+        La paginación es por _id con una consulta de solo ids; las ventanas sin candidatos
+        se saltan.
+        """
+        filter_extra = {"shopify_id": {"$ne": None}} if filter_extra is None else filter_extra
+        for page in self.store_links.iter_windows(self.store, size, filter_extra, projection={"_id": 1}):
+            link_ids = [row["_id"] for row in page]
+            rows = list(self.store_links.collection.aggregate(self.pipeline(link_ids, modified_since)))
+            if not rows:
+                continue
+
+            links, zoho_by_id = [], {}
+            for row in rows:
+                zoho = row.pop("zoho", None)
+                if zoho and zoho.get("item_id") is not None:
+                    zoho_by_id[zoho["item_id"]] = zoho
+                links.append(row)
+
+            shopify_ids = [link["shopify_id"] for link in links if link.get("shopify_id") is not None]
+            shopify_by_id = {
+                doc["id"]: doc
+                for doc in self.client[self.store]["products"].find({"id": {"$in": shopify_ids}}, self.product_projection)
+                if doc.get("id") is not None
+            } if shopify_ids else {}
+            yield links, zoho_by_id, shopify_by_id
@@ -0,0 +1,65 @@
+import math
+
+
+class GRAPHQL_BATCHER:
+    """
+    Tamaño de lote adaptativo para operaciones GraphQL con listas (inventorySetQuantities,
+    mutaciones con alias, nodes(ids:)...).
+
+    En lugar de una constante adivinada, después de cada llamada se mide el costo real por
+    elemento (extensions.cost.actualQueryCost / tamaño del lote) y se elige el siguiente
+    tamaño para que un lote consuma como máximo `budget_fraction` del bucket
+    (throttleStatus.maximumAvailable), sin pasar de `max_size` (máximo de la API) ni del
+    costo máximo por consulta. Si la llamada fue THROTTLED (extensions.throttled_retries
+    que agrega SHOPIFY_GRAPHQL.execute), el lote se parte a la mitad. Solo cuentan las
+    respuestas de este batcher: los throttles de otros hilos que comparten el cliente
+    (p.ej. INVENTORY_VERIFIER) no achican sus lotes.
+    El crecimiento es a lo más x2 por lote para no sobrepasarse con una estimación vieja.
+    """
+
+    def __init__(self, gql, max_size: int, initial: int = 50, min_size: int = 1, budget_fraction: float = 0.5):
+        self.gql = gql
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(1, int(min_size))
+        self.size = max(self.min_size, min(int(initial), self.max_size))
+        self.budget_fraction = float(budget_fraction)
+        self.cost_per_item: float | None = None
+        self.throttled = 0  # respuestas de este batcher que vinieron THROTTLED
+
+    def estimated_cost(self, n: int) -> float | None:
+        """Costo esperado de un lote de n elementos (None mientras no haya medición)."""
+        if self.cost_per_item is None:
+            return None
+        return self.cost_per_item * n
+
+    def record(self, batch_len: int, body: dict | None = None) -> int:
+        """
+        Actualiza el tamaño con el resultado de la última llamada. Devuelve el nuevo tamaño.
+        body = respuesta de esa llamada; si otro hilo usa el mismo cliente, gql.last_cost
+        puede ser de otra consulta.
+        """
+        if (((body or {}).get("extensions") or {}).get("throttled_retries") or 0) > 0:
+            self.throttled += 1
+            self.size = max(self.min_size, self.size // 2)
+            return self.size
+
+        cost_info = (((body or {}).get("extensions") or {}).get("cost") if body is not None else self.gql.last_cost) or {}
+        cost = cost_info.get("actualQueryCost")
+        if cost is None:
+            cost = cost_info.get("requestedQueryCost")
+        if cost is None or batch_len <= 0:
+            return self.size
+
+        self.cost_per_item = max(float(cost) / batch_len, 0.01)
+        budget = min(self.gql.maximum_available * self.budget_fraction, self.gql.MAX_SINGLE_QUERY_COST)
+        target = max(self.min_size, min(self.max_size, math.floor(budget / self.cost_per_item)))
+        self.size = min(target, self.size * 2)
+        return self.size
+
+    def batches(self, items: list):
+        """Genera lotes consecutivos; cada lote usa el tamaño vigente (llama record entre lotes)."""
+        i = 0
+        while i < len(items):
+            batch = items[i:i + self.size]
+            i += len(batch)
+            yield batch
@@ -0,0 +1,181 @@
+from datetime import datetime, timezone
+
+from bson.int64 import Int64
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+
+class ID_NORMALIZER:
+    """
+    Tipos canónicos de ids en Mongo, aplicados una sola vez al ingerir.
+
+    Los ids llegaban como int, str o {"$numberLong": "..."} según la ruta que los escribió,
+    así que los planners coercionaban en Python (_safe_str, int(...)) y los $in fallaban
+    en silencio cuando el tipo no coincidía. Convención:
+
+    - Ids de Shopify (product, variant, inventory_item, location, order...) → Int64 (BSON long)
+    - Ids de Zoho (item_id) → str
+
+    normalize_shopify_record se usa al ingerir cada endpoint de Shopify; ensure_migrated
+    convierte una sola vez los datos existentes de la tienda (marca en management.migrations).
+    """
+
+    MIGRATION_ID = "int64_ids_v1"
+
+    # campos por colección de la tienda; "lista.campo" = campo dentro de cada elemento de la lista
+    SHOPIFY_ID_FIELDS = {
+        "products": [
+            "id",
+            "variants.id", "variants.product_id", "variants.inventory_item_id", "variants.image_id",
+            "images.id", "images.product_id",
+            "options.id", "options.product_id",
+        ],
+        "inventory_levels": ["inventory_item_id", "location_id"],
+        "orders": [
+            "id", "location_id", "customer.id",
+            "line_items.id", "line_items.product_id", "line_items.variant_id",
+        ],
+    }
+
+    _migrated: set = set()
+
+    # -------------------------
+    # Conversión
+    # -------------------------
+    @staticmethod
+    def to_int64(value):
+        """123 | "123" | {"$numberLong": "123"} | 123.0 → Int64(123); cualquier otra cosa → None."""
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, Int64):
+            return value
+        if isinstance(value, dict):
+            value = value.get("$numberLong")
+        try:
+            if isinstance(value, float):
+                if not value.is_integer():
+                    return None
+                return Int64(int(value))
+            return Int64(int(str(value).strip()))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def to_item_id(value):
+        """Id de Zoho → str (None si viene vacío)."""
+        if value is None:
+            return None
+        if isinstance(value, dict) and "$numberLong" in value:
+            value = value["$numberLong"]
+        value = str(value).strip()
+        return value or None
+
+    @classmethod
+    def _normalize_path(cls, doc: dict, path: str) -> bool:
+        """Normaliza doc[path] en sitio. Devuelve True si algo cambió."""
+        head, _, rest = path.partition(".")
+        if head not in doc:
+            return False
+        if not rest:
+            current = doc[head]
+            canonical = cls.to_int64(current)
+            if canonical is None or (type(current) is Int64 and current == canonical):
+                return False
+            doc[head] = canonical
+            return True
+
+        changed = False
+        value = doc[head]
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, dict):
+                changed = cls._normalize_path(item, rest) or changed
+        return changed
+
+    @classmethod
+    def normalize_shopify_record(cls, collection: str, rec: dict) -> dict:
+        """Normaliza en sitio (y regresa) un registro de Shopify antes de guardarlo."""
+        for path in cls.SHOPIFY_ID_FIELDS.get(collection, []):
+            cls._normalize_path(rec, path)
+        return rec
+
+    # -------------------------
+    # Migración de datos existentes
+    # -------------------------
+    @classmethod
+    def ensure_migrated(cls, client, store: str, logger=None) -> dict:
+        """Convierte una sola vez los ids existentes de la tienda (y de sus vínculos)."""
+        key = f"{cls.MIGRATION_ID}:{store}"
+        if key in cls._migrated:
+            return {}
+        marker = client["management"]["migrations"]
+        if marker.find_one({"_id": key}, {"_id": 1}):
+            cls._migrated.add(key)
+            return {}
+
+        summary = {}
+        for collection, paths in cls.SHOPIFY_ID_FIELDS.items():
+            summary[collection] = cls._migrate_collection(
+                client[store][collection],
+                lambda doc, paths=paths: any([cls._normalize_path(doc, p) for p in paths]),
+                [p.split(".")[0] for p in paths],
+            )
+
+        def _fix_link(doc):
+            changed = False
+            if "item_id" in doc:
+                item_id = cls.to_item_id(doc["item_id"])
+                if item_id is not None and item_id != doc["item_id"]:
+                    doc["item_id"] = item_id
+                    changed = True
+            return cls._normalize_path(doc, "shopify_id") or changed
+
+        summary["store_links"] = cls._migrate_collection(
+            client["Zoho_Inventory"]["store_links"], _fix_link, ["item_id", "shopify_id"], {"store": store},
+        )
+        summary["inventory_map"] = cls._migrate_collection(
+            client["Zoho_Inventory"]["inventory_map"],
+            lambda doc: any([cls._normalize_path(doc, p) for p in ("product_id", "variant_id", "inventory_item_id")]),
+            ["product_id", "variant_id", "inventory_item_id"],
+            {"store": store},
+        )
+
+        marker.update_one(
+            {"_id": key},
+            {"$set": {"summary": summary, "migrated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        cls._migrated.add(key)
+        if callable(logger):
+            logger(f"🔢 Ids normalizados ({store}): {summary}")
+        return summary
+
+    @staticmethod
+    def _migrate_collection(collection, fix, top_fields: list, query: dict | None = None, batch_size: int = 1000) -> int:
+        projection = {f: 1 for f in set(top_fields)}
+        ops, op_ids, changed = [], [], 0
+
+        def _flush():
+            nonlocal ops, op_ids
+            if not ops:
+                return
+            try:
+                collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # el doc con el id canónico ya existía (índice único): el duplicado sobra
+                dups = [op_ids[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+                if dups:
+                    collection.bulk_write([DeleteOne({"_id": _id}) for _id in dups], ordered=False)
+            ops, op_ids = [], []
+
+        for doc in collection.find(query or {}, projection):
+            if not fix(doc):
+                continue
+            changed += 1
+            _id = doc.pop("_id")
+            ops.append(UpdateOne({"_id": _id}, {"$set": doc}))
+            op_ids.append(_id)
+            if len(ops) >= batch_size:
+                _flush()
+        _flush()
+        return changed
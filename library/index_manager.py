@@ -0,0 +1,159 @@
+import threading
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from library.store_links import STORE_LINKS
+from library.inventory_map import INVENTORY_MAP
+from library.job_journal import SHOPIFY_JOB_JOURNAL
+from library.sync_strategy_selector import SYNC_STRATEGY_SELECTOR
+
+
+class MONGO_INDEX_MANAGER:
+    """
+    Declaración central de los índices que necesitan las consultas de library/ y pages/.
+
+    Cada entrada es (db, colección) → [(keys, opciones)]. "{store}" se expande a cada
+    tienda del YAML (las llaves con store_name). ensure_once los crea una sola vez por
+    proceso; report compara lo declarado contra lo que existe en Mongo y marca:
+    - missing: declarados pero no creados
+    - extra:   existen pero nadie los declara (candidatos a borrar)
+    - unused:  declarados/existentes sin accesos según $indexStats (desde el último reinicio)
+    """
+
+    INDEXES = {
+        # Espejo de Shopify (una base por tienda)
+        ("{store}", "products"): [
+            ([("id", ASCENDING)], {"unique": True}),
+            ([("variants.sku", ASCENDING)], {}),
+        ],
+        ("{store}", "inventory_levels"): [
+            ([("inventory_item_id", ASCENDING)], {"unique": True}),
+            ([("location_id", ASCENDING), ("inventory_item_id", ASCENDING)], {}),
+        ],
+        ("{store}", "orders"): [
+            ([("id", ASCENDING)], {"unique": True}),
+        ],
+        # Espejo de Zoho
+        ("Zoho_Inventory", "items"): [
+            ([("item_id", ASCENDING)], {"unique": True}),
+            ([("status", ASCENDING)], {}),
+        ],
+        ("Zoho_Inventory", "salesorders"): [
+            ([("salesorder_number", ASCENDING)], {"unique": True}),
+            ([("reference_number", ASCENDING)], {}),
+        ],
+        ("Zoho_Inventory", "purchaseorders"): [
+            ([("purchaseorder_id", ASCENDING)], {"unique": True}),
+        ],
+        ("Zoho_Inventory", "invoices"): [
+            ([("invoice_id", ASCENDING)], {"unique": True}),
+        ],
+        ("Zoho_Inventory", "contacts"): [
+            ([("contact_id", ASCENDING)], {"unique": True}),
+        ],
+        ("Zoho_Inventory", STORE_LINKS.COLLECTION): STORE_LINKS.INDEXES,
+        ("Zoho_Inventory", INVENTORY_MAP.COLLECTION): INVENTORY_MAP.INDEXES,
+        # management
+        ("management", "product_images"): [
+            ([("item_id", ASCENDING)], {}),
+        ],
+        ("management", SHOPIFY_JOB_JOURNAL.COLLECTION): SHOPIFY_JOB_JOURNAL.INDEXES,
+        ("management", SYNC_STRATEGY_SELECTOR.COLLECTION): SYNC_STRATEGY_SELECTOR.INDEXES,
+    }
+
+    _ensured: set = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def stores_from_config(yaml_data: dict) -> list[str]:
+        return [k for k, v in (yaml_data or {}).items() if isinstance(v, dict) and v.get("store_name")]
+
+    @classmethod
+    def declared(cls, stores: list[str]) -> dict:
+        """{(db, colección): [(keys, opciones)]} con {store} ya expandido."""
+        out = {}
+        for (db_name, coll_name), specs in cls.INDEXES.items():
+            for db in (stores if db_name == "{store}" else [db_name]):
+                out[(db, coll_name)] = specs
+        return out
+
+    @staticmethod
+    def _key_tuple(keys) -> tuple:
+        return tuple((field, int(direction)) for field, direction in keys)
+
+    @staticmethod
+    def _key_label(key_tuple: tuple) -> str:
+        return ", ".join(f"{field}:{direction}" for field, direction in key_tuple)
+
+    @classmethod
+    def ensure_collection(cls, client, db_name: str, coll_name: str, specs: list | None = None):
+        """Crea los índices declarados de una colección (create_index es idempotente)."""
+        if specs is None:
+            specs = cls.INDEXES.get((db_name, coll_name)) or cls.INDEXES.get(("{store}", coll_name), [])
+        collection = client[db_name][coll_name]
+        for keys, options in specs:
+            collection.create_index(keys, **options)
+
+    @classmethod
+    def ensure_all(cls, client, stores: list[str], logger=None) -> dict:
+        created = {}
+        for (db_name, coll_name), specs in cls.declared(stores).items():
+            try:
+                cls.ensure_collection(client, db_name, coll_name, specs)
+                created[f"{db_name}.{coll_name}"] = len(specs)
+            except OperationFailure as e:
+                # p.ej. duplicados que impiden un índice único: se reporta, no se detiene el arranque
+                created[f"{db_name}.{coll_name}"] = f"error: {e}"
+                if callable(logger):
+                    logger(f"⚠️ No pude crear índices en {db_name}.{coll_name}: {e}")
+        return created
+
+    @classmethod
+    def ensure_once(cls, client, yaml_data: dict, logger=None):
+        """ensure_all una sola vez por proceso (páginas de Streamlit y pipelines lo llaman al iniciar)."""
+        stores = cls.stores_from_config(yaml_data)
+        key = (id(client), tuple(stores))
+        with cls._lock:
+            if key in cls._ensured:
+                return
+            cls._ensured.add(key)
+        cls.ensure_all(client, stores, logger=logger)
+
+    @classmethod
+    def report(cls, client, stores: list[str]) -> list[dict]:
+        """Una fila por índice: db, collection, keys, status (ok/unused/missing/extra), ops (accesos)."""
+        rows = []
+        for (db_name, coll_name), specs in cls.declared(stores).items():
+            collection = client[db_name][coll_name]
+            existing = {}
+            for info in collection.list_indexes():
+                if info["name"] == "_id_":
+                    continue
+                existing[cls._key_tuple(info["key"].items())] = info["name"]
+
+            usage = {}
+            try:
+                for stat in collection.aggregate([{"$indexStats": {}}]):
+                    usage[stat["name"]] = int(stat.get("accesses", {}).get("ops", 0))
+            except OperationFailure:
+                pass  # $indexStats no disponible (permisos / versión)
+
+            declared_keys = set()
+            for keys, _ in specs:
+                k = cls._key_tuple(keys)
+                declared_keys.add(k)
+                name = existing.get(k)
+                ops = usage.get(name) if name else None
+                rows.append({
+                    "db": db_name, "collection": coll_name, "keys": cls._key_label(k),
+                    "status": "missing" if name is None else ("unused" if ops == 0 else "ok"),
+                    "ops": ops,
+                })
+            for k, name in existing.items():
+                if k not in declared_keys:
+                    rows.append({
+                        "db": db_name, "collection": coll_name, "keys": cls._key_label(k),
+                        "status": "extra", "ops": usage.get(name),
+                    })
+        return rows
@@ -1,20 +1,16 @@
 import os
 from colorama import Fore, init, Style
-from pymongo import MongoClient
 import sys
 import yaml
 from dotenv import load_dotenv
-from pprint import pprint
+from pprint import pformat
 from copy import deepcopy
 from datetime import date
 import requests
 import json
-from pprint import pprint
 import os
 import re
 import ast
-from pprint import pprint
-from pymongo import MongoClient
 from colorama import init, Fore, Style
 import re, ast
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
@@ -22,6 +18,26 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 import time
 from datetime import datetime, timezone
+import threading
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from library.shopify_rate_limiter import SHOPIFY_RATE_LIMITER
+from library.shopify_graphql import SHOPIFY_GRAPHQL
+from library.job_journal import SHOPIFY_JOB_JOURNAL
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.sync_logger import SYNC_LOGGER
+from pymongo import UpdateOne
+from library.store_links import STORE_LINKS
+from library.inventory_map import INVENTORY_MAP
+from library.id_normalizer import ID_NORMALIZER
+from library.index_manager import MONGO_INDEX_MANAGER
+from library.graphql_batcher import GRAPHQL_BATCHER
+from library.inventory_verifier import INVENTORY_VERIFIER
+from library.inventory_fingerprint import INVENTORY_FINGERPRINT
+from library.inventory_publish_policy import INVENTORY_PUBLISH_POLICY
+from library.catalog_plan_source import CATALOG_PLAN_SOURCE
+from library.sync_models import Link, ZohoItemView, ShopifyProductView
+from library.sync_strategy_selector import SYNC_STRATEGY_SELECTOR
 
 
 class INVENTORY_AUTOMATIZATION:
@@ -32,6 +48,7 @@ class INVENTORY_AUTOMATIZATION:
         self.data = yaml_data
         self.yaml_path = os.path.join(self.working_folder, "config.yml")
         self.store = store
+        self.log = SYNC_LOGGER.from_config(self.data)
         self._location_id_cache: dict[str, int] = {}
 
         self.product_payload = """
@@ -56,10 +73,6 @@ class INVENTORY_AUTOMATIZATION:
     # -------------------------
     # Helpers
     # -------------------------
-    @staticmethod
-    def _safe_str(x):
-        return None if x is None else str(x)
-
     @staticmethod
     def _strip_inline_comment(line: str) -> str:
         """Quita comentarios con #, pero solo si el # está fuera de comillas."""
@@ -503,7 +516,143 @@ class INVENTORY_AUTOMATIZATION:
 
         return _norm_any(d)
 
-    def send_workload_to_shopify_api(self, products_to_update: list[dict], store: str, logger=None) -> list[dict]:
+    VERIFY_MODES = ("none", "response", "sample", "full")
+
+    # inventorySetQuantities acepta hasta 250 cantidades por llamada
+    INVENTORY_SET_MAX_QUANTITIES = 250
+    # inventoryActivate no acepta listas: se agrupan con alias en una sola mutation
+    INVENTORY_ACTIVATE_MAX_ALIASES = 50
+
+    # Campos de header REST (product) -> ProductInput de GraphQL
+    GRAPHQL_PRODUCT_FIELDS = {
+        "title": "title",
+        "body_html": "descriptionHtml",
+        "vendor": "vendor",
+        "product_type": "productType",
+        "status": "status",
+    }
+    GRAPHQL_PRODUCT_SELECTION = "id title descriptionHtml vendor productType status"
+
+    def _rest_product_to_graphql_input(self, payload_product) -> dict | None:
+        """
+        Convierte un payload REST de header (sin variants) a ProductInput de GraphQL.
+        Devuelve None si el payload trae algo que no sabemos mapear (variants, campos extra),
+        en cuyo caso el job se queda en el camino REST.
+        """
+        if not isinstance(payload_product, dict):
+            return None
+        out = {}
+        for k, v in payload_product.items():
+            if k == "id":
+                continue
+            gql_key = self.GRAPHQL_PRODUCT_FIELDS.get(k)
+            if gql_key is None:
+                return None
+            if k == "status":
+                s = str(v or "").strip().lower()
+                v = {"active": "ACTIVE", "archived": "ARCHIVED", "draft": "DRAFT", "inactive": "DRAFT"}.get(s)
+                if v is None:
+                    return None
+            out[gql_key] = v
+        return out or None
+
+    GRAPHQL_VARIANT_SELECTION = "id price compareAtPrice barcode taxable inventoryPolicy inventoryItem { sku tracked }"
+
+    def _rest_variant_to_graphql_input(self, payload_variant) -> dict | None:
+        """
+        Variante REST (como la arma _build_shopify_update_payload) -> ProductVariantsBulkInput.
+        Desde 2024-04 el sku y el tracking viven en inventoryItem.
+        Devuelve None si trae algo que no sabemos mapear (el job se queda en REST).
+        """
+        if not isinstance(payload_variant, dict) or payload_variant.get("id") is None:
+            return None
+        out = {"id": SHOPIFY_GRAPHQL.gid("ProductVariant", payload_variant["id"])}
+        inventory_item = {}
+        for k, v in payload_variant.items():
+            if k == "id":
+                continue
+            if k == "price":
+                out["price"] = str(v)
+            elif k == "compare_at_price":
+                out["compareAtPrice"] = None if v is None else str(v)
+            elif k == "barcode":
+                out["barcode"] = v
+            elif k == "taxable":
+                out["taxable"] = bool(v)
+            elif k == "inventory_policy":
+                out["inventoryPolicy"] = str(v).upper()
+            elif k == "sku":
+                inventory_item["sku"] = v
+            elif k == "inventory_management":
+                inventory_item["tracked"] = str(v or "").lower() == "shopify"
+            else:
+                return None
+        if inventory_item:
+            out["inventoryItem"] = inventory_item
+        return out
+
+    def _graphql_variant_to_rest(self, node: dict) -> dict:
+        """ProductVariant GraphQL (GRAPHQL_VARIANT_SELECTION) -> dict con llaves REST."""
+        node = node or {}
+        inv = node.get("inventoryItem") or {}
+        out = {
+            "id": SHOPIFY_GRAPHQL.numeric_id(node.get("id")),
+            "price": node.get("price"),
+            "compare_at_price": node.get("compareAtPrice"),
+            "barcode": node.get("barcode"),
+            "taxable": node.get("taxable"),
+            "sku": inv.get("sku"),
+        }
+        if node.get("inventoryPolicy") is not None:
+            out["inventory_policy"] = str(node["inventoryPolicy"]).lower()
+        if "tracked" in inv:
+            out["inventory_management"] = "shopify" if inv.get("tracked") else None
+        return out
+
+    def _graphql_product_to_rest(self, node: dict) -> dict:
+        """Producto GraphQL (GRAPHQL_PRODUCT_SELECTION) -> dict con llaves REST para comparar/loguear."""
+        node = node or {}
+        out = {"id": SHOPIFY_GRAPHQL.numeric_id(node.get("id"))}
+        for rest_key, gql_key in self.GRAPHQL_PRODUCT_FIELDS.items():
+            if gql_key in node:
+                out[rest_key] = node.get(gql_key)
+        if isinstance(out.get("status"), str):
+            out["status"] = out["status"].lower()
+        return out
+
+    def _shopify_request(self, session, limiter, method: str, url: str, max_retries: int = 4, **kwargs):
+        """
+        Llamada REST que respeta el leaky bucket de la tienda.
+        - Reserva cupo en el limiter antes de cada intento.
+        - Sincroniza el limiter con X-Shopify-Shop-Api-Call-Limit.
+        - Reintenta 429 respetando Retry-After.
+        """
+        kwargs.setdefault("timeout", 60)
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            r = session.request(method, url, **kwargs)
+            limiter.update_from_header(r.headers.get("X-Shopify-Shop-Api-Call-Limit"))
+            if r.status_code != 429 or attempt == max_retries:
+                return r
+            try:
+                retry_after = float(r.headers.get("Retry-After", 2.0))
+            except ValueError:
+                retry_after = 2.0
+            limiter.penalize(retry_after)
+        return r
+
+    def send_workload_to_shopify_api(
+        self,
+        products_to_update: list[dict],
+        store: str,
+        logger=None,
+        max_workers: int | None = None,
+        verify_mode: str | None = None,
+        sample_pct: float | None = None,
+        use_graphql: bool | None = None,
+        use_journal: bool | None = None,
+        plan_id: str | None = None,
+    ) -> list[dict]:
         """
         products_to_update: lista como la que ya generas:
         [{
@@ -511,12 +660,34 @@ class INVENTORY_AUTOMATIZATION:
             "payload": {"product": {...}}
         }, ...]
         store: "managed_store_one" | "managed_store_two" (key en tu YAML)
+
+        Los jobs se ejecutan en un pool acotado de workers por tienda (max_workers o
+        'max_workers' en el YAML de la tienda, default 4) que comparte el leaky bucket
+        de la tienda. El resultado conserva el orden de products_to_update.
+
+        verify_mode (o 'verify_mode' en el YAML de la tienda, default "response"):
+        - "none": solo PUT, no se verifica.
+        - "response": compara el payload contra el producto que regresa el PUT.
+        - "sample": vuelve a consultar (GET) ~sample_pct % de los productos; el resto por "response".
+        - "full": GET después de cada PUT (comportamiento anterior).
+        Los valores BEFORE salen del espejo {store}.products en Mongo.
+
+        use_graphql (o 'graphql_header_updates' en el YAML, default True): los updates que solo
+        tocan el header (title, body_html, vendor, product_type, status; p.ej. los archivados)
+        se agrupan en mutations productUpdate con alias, con tantos alias por request como
+        permita el presupuesto de costo. Los userErrors se regresan en el resultado de cada job.
+        Los updates que solo tocan variantes (p.ej. cambios de precio/sku) van por
+        productVariantsBulkUpdate: una mutation ligera por producto en lugar del PUT completo
+        ('graphql_variant_updates' en el YAML, default True).
+
+        use_journal (o 'job_journal' en el YAML, default True): cada job se registra en
+        management.shopify_job_journal con su estado, idempotency key y número de intentos.
+        Cada llamada es un plan nuevo (plan_id) salvo que se pase el de un plan anterior para
+        reanudarlo: solo entonces los jobs que ya quedaron "done" en ese plan no se vuelven a
+        mandar y se regresa su resultado guardado (con "from_journal": True). Ver
+        resume_pending_jobs para reanudar tras una caída.
         """
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))
+        _log = self.log.bind(logger, "send_workload_to_shopify_api")
 
         if not products_to_update:
             _log("ℹ️ No hay productos para actualizar.")
@@ -534,6 +705,11 @@ class INVENTORY_AUTOMATIZATION:
             "X-Shopify-Access-Token": shop_conf["access_token"],
         }
 
+        limiter = SHOPIFY_RATE_LIMITER.for_store(store, shop_conf)
+        if max_workers is None:
+            max_workers = int(shop_conf.get("max_workers", 4))
+        max_workers = max(1, min(int(max_workers), len(products_to_update)))
+
         # ===== comparadores equivalentes (SIN helpers de clase) =====
         def _norm_price_2dp(v):
             if v is None:
@@ -602,12 +778,72 @@ class INVENTORY_AUTOMATIZATION:
 
             return mismatches
 
-        session = requests.Session()
-        session.headers.update(headers)
+        # ===== modo de verificación =====
+        if verify_mode is None:
+            verify_mode = shop_conf.get("verify_mode", "response")
+        if verify_mode not in self.VERIFY_MODES:
+            raise ValueError(f"verify_mode inválido: {verify_mode!r}. Válidos: {self.VERIFY_MODES}")
+        if sample_pct is None:
+            sample_pct = float(shop_conf.get("verify_sample_pct", 10))
+
+        # ===== BEFORE desde el espejo Mongo (una sola consulta para todo el workload) =====
+        before_by_id = {}
+        update_pids = [
+            ID_NORMALIZER.to_int64(job.get("shopify_product_id") or job.get("product_id"))
+            for job in products_to_update
+            if job.get("shopify_product_id") or job.get("product_id")
+        ]
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+        if update_pids:
+            try:
+                for doc in client[store]["products"].find(
+                    {"id": {"$in": update_pids}},
+                    {"_id": 0, "id": 1, "title": 1, "body_html": 1, "vendor": 1, "product_type": 1, "status": 1, "variants": 1},
+                ):
+                    before_by_id[str(doc.get("id"))] = doc
+            except Exception as e:
+                _log(f"⚠️ No pude leer BEFORE desde Mongo ({store}.products): {repr(e)}")
+
+        # ===== write-through al espejo {store}.products =====
+        # Los workers juntan aquí lo que Shopify regresó de cada escritura exitosa y al final
+        # se aplica con un bulk_write (sin volver a rastrear toda la tienda).
+        mirror_ops: list = []
+        mirror_variant_pids: list = []
+
+        def _mirror_product(pid, rest_product: dict):
+            rec = ID_NORMALIZER.normalize_shopify_record("products", dict(rest_product or {}))
+            rec.pop("id", None)
+            if rec and ID_NORMALIZER.to_int64(pid) is not None:
+                mirror_ops.append(UpdateOne({"id": ID_NORMALIZER.to_int64(pid)}, {"$set": rec}))
+                if "variants" in rec:
+                    mirror_variant_pids.append(ID_NORMALIZER.to_int64(pid))
+
+        def _mirror_variants(pid, rest_variants: list):
+            pid64 = ID_NORMALIZER.to_int64(pid)
+            for v in rest_variants or []:
+                vid = ID_NORMALIZER.to_int64(v.get("id"))
+                fields = {f"variants.$.{k}": val for k, val in v.items() if k != "id"}
+                if pid64 is None or vid is None or not fields:
+                    continue
+                mirror_ops.append(UpdateOne({"id": pid64, "variants.id": vid}, {"$set": fields}))
+            mirror_variant_pids.append(pid64)
 
-        results = []
+        # una entrada por request HTTP real ("rest" | "graphql"), para la bitácora de estrategia
+        sent_requests: list = []
+
+        # requests.Session no es seguro entre hilos: una sesión por worker
+        thread_state = threading.local()
+
+        def _session():
+            session = getattr(thread_state, "session", None)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(headers)
+                thread_state.session = session
+            return session
 
-        for job in products_to_update:
+        def _run_job(job: dict, _log) -> dict:
+            session = _session()
             pid = job.get("shopify_product_id") or job.get("product_id")
             payload = job.get("payload")
             zoho_item_id = job.get("zoho_item_id")  # 👈 nuevo (para linkeo)
@@ -615,136 +851,572 @@ class INVENTORY_AUTOMATIZATION:
 
             if not isinstance(payload, dict) or "product" not in payload:
                 _log(f"⚠️ Job inválido, lo salto: pid={repr(pid)} keys={list(job.keys())}")
-                results.append({"product_id": pid, "ok": False, "error": "invalid_job", "job": job})
-                continue
+                return {"product_id": pid, "ok": False, "error": "invalid_job", "job": job}
             if not pid:
                 post_url = f"{base_url}/products.json"
                 try:
-                    r = session.post(post_url, json=payload, timeout=60)
+                    sent_requests.append("rest")
+                    r = self._shopify_request(session, limiter, "POST", post_url, json=payload)
                 except Exception as e:
                     _log(f"❌ POST error (create) zoho_item_id={repr(zoho_item_id)}: {repr(e)}")
-                    results.append({"zoho_item_id": zoho_item_id, "product_id": None, "ok": False, "created": False, "error": str(e)})
-                    continue
+                    return {"zoho_item_id": zoho_item_id, "product_id": None, "ok": False, "created": False, "error": str(e)}
 
                 if not r.ok:
                     _log(f"❌ POST failed (create) zoho_item_id={repr(zoho_item_id)} status={r.status_code}")
                     _log(f"   response: {getattr(r, 'text', '')[:2000]}")
-                    results.append({"zoho_item_id": zoho_item_id, "product_id": None, "ok": False, "created": False, "status": r.status_code, "response": getattr(r, "text", "")})
-                    continue
+                    return {"zoho_item_id": zoho_item_id, "product_id": None, "ok": False, "created": False, "status": r.status_code, "response": getattr(r, "text", "")}
 
                 created_product = (r.json() or {}).get("product", {}) or {}
                 created_id = created_product.get("id")
-                _log(f"✅ Creado product_id={created_id} (zoho_item_id={repr(zoho_item_id)})")
+                _log.debug("✅ Creado product_id={pid} (zoho_item_id={zid!r})", category="job", pid=created_id, zid=zoho_item_id)
 
-                results.append({
+                return {
                     "zoho_item_id": zoho_item_id,
                     "product_id": created_id,
                     "ok": True,
                     "created": True,
                     "product": created_product,
-                })
-                continue
+                }
 
             put_url = f"{base_url}/products/{pid}.json"
 
-            # ===== GET BEFORE (confirmación por API, no por Mongo) =====
-            before = {}
-            try:
-                gb = session.get(f"{base_url}/products/{pid}.json", timeout=60)
-                if gb.ok:
-                    before = gb.json().get("product", {}) or {}
-                else:
-                    _log(f"⚠️ GET BEFORE status={gb.status_code} product_id={pid}")
-            except Exception as e:
-                _log(f"⚠️ GET BEFORE falló product_id={pid}: {repr(e)}")
+            # ===== BEFORE (desde el espejo en Mongo, sin llamada extra a la API) =====
+            before = before_by_id.get(str(pid), {})
 
             # ===== PUT =====
             try:
-                r = session.put(put_url, json=payload, timeout=60)
+                sent_requests.append("rest")
+                r = self._shopify_request(session, limiter, "PUT", put_url, json=payload)
             except Exception as e:
                 _log(f"❌ PUT error product_id={pid}: {repr(e)}")
-                results.append({"product_id": pid, "ok": False, "error": str(e)})
-                continue
+                return {"product_id": pid, "ok": False, "error": str(e)}
 
             if not r.ok:
                 _log(f"❌ PUT failed product_id={pid} status={r.status_code}")
                 _log(f"   response: {getattr(r, 'text', '')[:2000]}")
-                results.append({"product_id": pid, "ok": False, "status": r.status_code, "response": getattr(r, "text", "")})
-                continue
-            # ===== verificación GET =====
-            get_url = f"{base_url}/products/{pid}.json"
-            try:
-                g = session.get(get_url, timeout=60)
-            except Exception as e:
-                _log(f"⚠️ GET verify error product_id={pid}: {repr(e)}")
-                results.append({"product_id": pid, "ok": True, "verified": False, "verify_error": str(e)})
-                continue
+                return {"product_id": pid, "ok": False, "status": r.status_code, "response": getattr(r, "text", "")}
 
-            if not g.ok:
-                _log(f"⚠️ GET verify failed product_id={pid} status={g.status_code}")
-                results.append({"product_id": pid, "ok": True, "verified": False, "verify_status": g.status_code})
-                continue
+            _mirror_product(pid, (r.json() or {}).get("product"))
 
-            fetched_product = g.json().get("product", {})
+            if verify_mode == "none":
+                _log.debug("✅ Actualizado (sin verificación) product_id={pid}", category="job", pid=pid)
+                return {"product_id": pid, "ok": True, "verified": None}
+
+            # ===== verificación =====
+            refetch = verify_mode == "full" or (verify_mode == "sample" and random.random() * 100 < sample_pct)
+            if refetch:
+                get_url = f"{base_url}/products/{pid}.json"
+                try:
+                    sent_requests.append("rest")
+                    g = self._shopify_request(session, limiter, "GET", get_url)
+                except Exception as e:
+                    _log(f"⚠️ GET verify error product_id={pid}: {repr(e)}")
+                    return {"product_id": pid, "ok": True, "verified": False, "verify_error": str(e)}
+
+                if not g.ok:
+                    _log(f"⚠️ GET verify failed product_id={pid} status={g.status_code}")
+                    return {"product_id": pid, "ok": True, "verified": False, "verify_status": g.status_code}
+
+                fetched_product = g.json().get("product", {})
+            else:
+                # el PUT ya regresa el producto actualizado
+                fetched_product = (r.json() or {}).get("product", {}) or {}
+            verified_by = "get" if refetch else "response"
             payload_product = payload.get("product", {})
 
             # header
             for k in payload_product.keys():
                 if k in ("id", "variants"):
                     continue
-                _log(f"   {k}: BEFORE={repr(before.get(k))} AFTER={repr(fetched_product.get(k))}")
+                _log.debug("   {k}: BEFORE={b!r} AFTER={a!r}", category="verify", k=k, b=before.get(k), a=fetched_product.get(k))
 
             # variants (por id)
             pv_list = payload_product.get("variants") or []
             fv_list = fetched_product.get("variants") or []
             fv_by_id = {str(v.get("id")): v for v in fv_list if v.get("id") is not None}
+            bv_by_id = {str(v.get("id")): v for v in (before.get("variants") or []) if v.get("id") is not None}
 
             for pv in pv_list:
                 vid = pv.get("id")
                 fv = fv_by_id.get(str(vid)) if vid is not None else None
                 if not fv:
                     continue
+                bv = bv_by_id.get(str(vid), {})
                 for kk in pv.keys():
                     if kk == "id":
                         continue
-                    _log(f"   variants[{vid}].{kk}: BEFORE=<unknown> AFTER={repr(fv.get(kk))}")            
+                    _log.debug("   variants[{vid}].{kk}: BEFORE={b!r} AFTER={a!r}", category="verify", vid=vid, kk=kk, b=bv.get(kk, "<unknown>"), a=fv.get(kk))
             mismatches = _payload_mismatches(payload_product, fetched_product)
 
             if mismatches:
                 _log(f"⚠️ Actualizado pero NO coincide verificación product_id={pid}")
                 for mm in mismatches:
                     _log(f"   - {mm['path']} | expected={repr(mm['expected'])} | actual={repr(mm['actual'])}")
-                results.append({"product_id": pid, "ok": True, "verified": False, "mismatches": mismatches})
+                return {"product_id": pid, "ok": True, "verified": False, "verified_by": verified_by, "mismatches": mismatches}
+
+            _log.debug("✅ Actualización verificada product_id={pid} ({by})", category="job", pid=pid, by=verified_by)
+            return {"product_id": pid, "ok": True, "verified": True, "verified_by": verified_by}
+
+        # ===== GraphQL: updates de solo header agrupados con alias =====
+        # write_strategy (YAML, default "auto"): SYNC_STRATEGY_SELECTOR estima rest vs graphql con
+        # el tamaño del lote y el margen de los límites; 'graphql_header_updates' explícito manda.
+        write_strategy = None
+        if use_graphql is None:
+            if "graphql_header_updates" in shop_conf:
+                use_graphql = bool(shop_conf["graphql_header_updates"])
             else:
-                _log(f"✅ Actualización verificada product_id={pid}")
-                results.append({"product_id": pid, "ok": True, "verified": True})
+                write_strategy = str(shop_conf.get("write_strategy", "auto")).lower()
+                if write_strategy not in ("auto", "rest", "graphql"):
+                    raise ValueError(f"write_strategy inválido: {write_strategy!r}. Opciones: ('auto', 'rest', 'graphql')")
+                use_graphql = write_strategy != "rest"
 
-        return results
+        allow_variants_bulk = bool(shop_conf.get("graphql_variant_updates", True))
 
-    # Constructor de dos diccionarios idénticos basados en el template, para comparar
-    def shopify_update_items(self, store: str, logger=None):
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
+        def _is_variant_only(payload_product) -> bool:
+            if not isinstance(payload_product, dict) or set(payload_product.keys()) != {"id", "variants"}:
+                return False
+            variants = payload_product.get("variants") or []
+            return bool(variants) and all(self._rest_variant_to_graphql_input(v) is not None for v in variants)
+
+        header_ok, variants_ok, rest_only = [], [], []
+        for idx, job in enumerate(products_to_update):
+            pid = job.get("shopify_product_id") or job.get("product_id")
+            payload = job.get("payload")
+            payload_product = payload.get("product") if isinstance(payload, dict) else None
+            if pid and self._rest_product_to_graphql_input(payload_product) is not None:
+                header_ok.append(idx)
+            elif allow_variants_bulk and pid and _is_variant_only(payload_product):
+                variants_ok.append(idx)
             else:
-                print(str(msg))
+                rest_only.append(idx)
+
+        per_op_cost = float(shop_conf.get("graphql_product_update_cost", 11))
+        gql = SHOPIFY_GRAPHQL.for_store(store, shop_conf) if (use_graphql and (header_ok or variants_ok)) else None
+        graphql_batch_size = 1
+        if gql is not None:
+            budget = min(gql.MAX_SINGLE_QUERY_COST, gql.maximum_available * 0.9)
+            graphql_batch_size = max(1, min(int(shop_conf.get("graphql_max_aliases", 50)), int(budget // per_op_cost)))
+
+        strategy_selector, strategy_estimates, strategy_inputs = None, None, None
+        if write_strategy == "auto" and gql is not None:
+            strategy_selector = SYNC_STRATEGY_SELECTOR(client, store, shop_conf)
+            strategy_inputs = {
+                "jobs": len(products_to_update), "header": len(header_ok), "variants": len(variants_ok),
+                "rest_only": len(rest_only), "workers": max_workers, "verify_mode": verify_mode,
+                "rest_headroom": round(limiter.headroom(), 2), "graphql_available": round(gql.available(), 1),
+                "graphql_batch_size": graphql_batch_size,
+            }
+            strategy_estimates = strategy_selector.estimate_writes(
+                len(header_ok), len(variants_ok), len(rest_only),
+                limiter=limiter, gql=gql, workers=max_workers,
+                verify_mode=verify_mode, sample_pct=sample_pct,
+                graphql_batch_size=graphql_batch_size, per_op_cost=per_op_cost,
+                variant_op_cost=float(shop_conf.get("graphql_variant_update_cost", per_op_cost)),
+            )
+            write_strategy = strategy_selector.pick(strategy_estimates)
+            use_graphql = write_strategy == "graphql"
+            _log(
+                f"🧮 Estrategia de escritura {store}: {write_strategy} | "
+                + " | ".join(f"{k}: {v['calls']} llamadas ~{v['seconds']}s" for k, v in strategy_estimates.items())
+            )
+
+        use_variants_bulk = use_graphql and allow_variants_bulk
+        graphql_idx = header_ok if use_graphql else []
+        variants_idx = variants_ok if use_variants_bulk else []
+        routed = set(graphql_idx) | set(variants_idx)
+        rest_idx = sorted(rest_only + [i for i in header_ok + variants_ok if i not in routed])
+        if not use_graphql:
+            gql = None
+        throttled_before = gql.throttled_count if gql is not None else 0
+
+        def _fetch_products_graphql(gids: list[str]) -> dict:
+            query = (
+                "query VerifyProducts($ids: [ID!]!) {\n"
+                f"  nodes(ids: $ids) {{ ... on Product {{ {self.GRAPHQL_PRODUCT_SELECTION} }} }}\n"
+                "}"
+            )
+            sent_requests.append("graphql")
+            body = gql.execute(query, {"ids": gids}, estimated_cost=len(gids) + 1)
+            nodes = (body.get("data") or {}).get("nodes") or []
+            return {n.get("id"): n for n in nodes if isinstance(n, dict) and n.get("id")}
+
+        def _run_graphql_batch(batch: list[int], _log) -> list[tuple[int, dict]]:
+            var_defs, fields, variables, gids = [], [], {}, []
+            for n, idx in enumerate(batch):
+                job = products_to_update[idx]
+                pid = job.get("shopify_product_id") or job.get("product_id")
+                gid = job.get("shopify_admin_graphql_api_id") or SHOPIFY_GRAPHQL.gid("Product", pid)
+                gql_input = self._rest_product_to_graphql_input(job["payload"]["product"])
+                gql_input["id"] = gid
+                gids.append(gid)
+                var_defs.append(f"$p{n}: ProductInput!")
+                fields.append(
+                    f"  p{n}: productUpdate(input: $p{n}) {{ product {{ {self.GRAPHQL_PRODUCT_SELECTION} }} userErrors {{ field message }} }}"
+                )
+                variables[f"p{n}"] = gql_input
 
-        mongo_db_url = self.data["non_sql_database"]["url"]
-        client = MongoClient(mongo_db_url)
+            mutation = "mutation BatchProductUpdate(" + ", ".join(var_defs) + ") {\n" + "\n".join(fields) + "\n}"
 
-        zoho_items = list(client["Zoho_Inventory"]["items"].find({}))
-        store_items = list(client[store]["products"].find({}))
-        items_per_store_doc = client["Zoho_Inventory"]["items_per_store"].find_one({"store": store})
+            def _fail_all(**extra) -> list[tuple[int, dict]]:
+                return [
+                    (idx, {
+                        "product_id": products_to_update[idx].get("shopify_product_id") or products_to_update[idx].get("product_id"),
+                        "ok": False,
+                        "via": "graphql",
+                        **extra,
+                    })
+                    for idx in batch
+                ]
 
-        if not items_per_store_doc:
-            _log(f"❌ No existe items_per_store para store={store}")
-            return []
+            try:
+                sent_requests.append("graphql")
+                body = gql.execute(mutation, variables, estimated_cost=per_op_cost * len(batch))
+            except Exception as e:
+                _log(f"❌ GraphQL productUpdate batch ({len(batch)} jobs) error: {repr(e)}")
+                return _fail_all(error=str(e))
+
+            data = body.get("data") or {}
+            if body.get("errors") and not data:
+                _log(f"❌ GraphQL productUpdate batch ({len(batch)} jobs) errors={body.get('errors')}")
+                return _fail_all(error="graphql_errors", errors=body.get("errors"))
+
+            # productos devueltos por la mutation (o re-consultados si el modo lo pide)
+            returned = {}
+            for n, idx in enumerate(batch):
+                node = data.get(f"p{n}") or {}
+                returned[n] = node
+
+            refetch_n = []
+            if verify_mode == "full":
+                refetch_n = list(range(len(batch)))
+            elif verify_mode == "sample":
+                refetch_n = [n for n in range(len(batch)) if random.random() * 100 < sample_pct]
+            refetched = {}
+            if refetch_n:
+                try:
+                    refetched = _fetch_products_graphql([gids[n] for n in refetch_n])
+                except Exception as e:
+                    _log(f"⚠️ GraphQL verify error ({len(refetch_n)} productos): {repr(e)}")
+
+            out = []
+            for n, idx in enumerate(batch):
+                job = products_to_update[idx]
+                pid = job.get("shopify_product_id") or job.get("product_id")
+                node = returned[n]
+                user_errors = node.get("userErrors") or []
+                if user_errors or not node.get("product"):
+                    _log(f"❌ productUpdate failed product_id={pid} userErrors={user_errors}")
+                    out.append((idx, {"product_id": pid, "ok": False, "via": "graphql", "user_errors": user_errors}))
+                    continue
 
-        # índices
-        zoho_by_id = {str(x.get("item_id")): x for x in zoho_items if x.get("item_id") is not None}
-        shopify_by_id = {str(x.get("id")): x for x in store_items if x.get("id") is not None}
+                _mirror_product(pid, self._graphql_product_to_rest(node["product"]))
 
-        bridge_items = items_per_store_doc.get("items", [])
+                if verify_mode == "none":
+                    _log.debug("✅ Actualizado (sin verificación) product_id={pid}", category="job", pid=pid)
+                    out.append((idx, {"product_id": pid, "ok": True, "verified": None, "via": "graphql"}))
+                    continue
+
+                if n in refetch_n:
+                    if gids[n] not in refetched:
+                        out.append((idx, {"product_id": pid, "ok": True, "verified": False, "via": "graphql", "verify_error": "not_fetched"}))
+                        continue
+                    fetched_product = self._graphql_product_to_rest(refetched[gids[n]])
+                    verified_by = "get"
+                else:
+                    fetched_product = self._graphql_product_to_rest(node["product"])
+                    verified_by = "response"
+
+                payload_product = job["payload"]["product"]
+                before = before_by_id.get(str(pid), {})
+                for k in payload_product.keys():
+                    if k == "id":
+                        continue
+                    _log.debug("   {k}: BEFORE={b!r} AFTER={a!r}", category="verify", k=k, b=before.get(k), a=fetched_product.get(k))
+
+                mismatches = _payload_mismatches(payload_product, fetched_product)
+                if mismatches:
+                    _log(f"⚠️ Actualizado pero NO coincide verificación product_id={pid}")
+                    for mm in mismatches:
+                        _log(f"   - {mm['path']} | expected={repr(mm['expected'])} | actual={repr(mm['actual'])}")
+                    out.append((idx, {"product_id": pid, "ok": True, "verified": False, "verified_by": verified_by, "via": "graphql", "mismatches": mismatches}))
+                else:
+                    _log.debug("✅ Actualización verificada product_id={pid} ({by}, graphql)", category="job", pid=pid, by=verified_by)
+                    out.append((idx, {"product_id": pid, "ok": True, "verified": True, "verified_by": verified_by, "via": "graphql"}))
+            return out
+
+        mutation_variants = f"""
+        mutation VariantsBulkUpdate($productId: ID!, $variants: [ProductVariantsBulkInput!]!) {{
+          productVariantsBulkUpdate(productId: $productId, variants: $variants) {{
+            productVariants {{ {self.GRAPHQL_VARIANT_SELECTION} }}
+            userErrors {{ field message }}
+          }}
+        }}
+        """
+
+        def _run_variants_job(job: dict, _log) -> dict:
+            pid = job.get("shopify_product_id") or job.get("product_id")
+            payload_product = job["payload"]["product"]
+            variables = {
+                "productId": job.get("shopify_admin_graphql_api_id") or SHOPIFY_GRAPHQL.gid("Product", pid),
+                "variants": [self._rest_variant_to_graphql_input(v) for v in payload_product["variants"]],
+            }
+            try:
+                sent_requests.append("graphql")
+                body = gql.execute(mutation_variants, variables, estimated_cost=per_op_cost)
+            except Exception as e:
+                _log(f"❌ productVariantsBulkUpdate error product_id={pid}: {repr(e)}")
+                return {"product_id": pid, "ok": False, "via": "graphql_variants", "error": str(e)}
+
+            node = (body.get("data") or {}).get("productVariantsBulkUpdate") or {}
+            user_errors = node.get("userErrors") or []
+            if body.get("errors") or user_errors or node.get("productVariants") is None:
+                _log(f"❌ productVariantsBulkUpdate failed product_id={pid} userErrors={user_errors} errors={body.get('errors')}")
+                return {"product_id": pid, "ok": False, "via": "graphql_variants", "user_errors": user_errors, "errors": body.get("errors")}
+
+            _mirror_variants(pid, [self._graphql_variant_to_rest(v) for v in node["productVariants"]])
+
+            if verify_mode == "none":
+                _log.debug("✅ Variantes actualizadas (sin verificación) product_id={pid}", category="job", pid=pid)
+                return {"product_id": pid, "ok": True, "verified": None, "via": "graphql_variants"}
+
+            refetch = verify_mode == "full" or (verify_mode == "sample" and random.random() * 100 < sample_pct)
+            if refetch:
+                try:
+                    sent_requests.append("rest")
+                    g = self._shopify_request(_session(), limiter, "GET", f"{base_url}/products/{pid}.json")
+                except Exception as e:
+                    _log(f"⚠️ GET verify error product_id={pid}: {repr(e)}")
+                    return {"product_id": pid, "ok": True, "verified": False, "via": "graphql_variants", "verify_error": str(e)}
+                if not g.ok:
+                    _log(f"⚠️ GET verify failed product_id={pid} status={g.status_code}")
+                    return {"product_id": pid, "ok": True, "verified": False, "via": "graphql_variants", "verify_status": g.status_code}
+                fetched_product = g.json().get("product", {})
+            else:
+                fetched_product = {"variants": [self._graphql_variant_to_rest(v) for v in node["productVariants"]]}
+            verified_by = "get" if refetch else "response"
+
+            before = before_by_id.get(str(pid), {})
+            bv_by_id = {str(v.get("id")): v for v in (before.get("variants") or []) if v.get("id") is not None}
+            fv_by_id = {str(v.get("id")): v for v in (fetched_product.get("variants") or []) if v.get("id") is not None}
+            for pv in payload_product["variants"]:
+                vid = str(pv.get("id"))
+                for kk in pv.keys():
+                    if kk == "id":
+                        continue
+                    _log.debug(
+                        "   variants[{vid}].{kk}: BEFORE={b!r} AFTER={a!r}", category="verify",
+                        vid=vid, kk=kk, b=bv_by_id.get(vid, {}).get(kk, "<unknown>"), a=fv_by_id.get(vid, {}).get(kk),
+                    )
+
+            mismatches = _payload_mismatches(payload_product, fetched_product)
+            if mismatches:
+                _log(f"⚠️ Actualizado pero NO coincide verificación product_id={pid}")
+                for mm in mismatches:
+                    _log(f"   - {mm['path']} | expected={repr(mm['expected'])} | actual={repr(mm['actual'])}")
+                return {"product_id": pid, "ok": True, "verified": False, "verified_by": verified_by, "via": "graphql_variants", "mismatches": mismatches}
+
+            _log.debug("✅ Variantes verificadas product_id={pid} ({by}, productVariantsBulkUpdate)", category="job", pid=pid, by=verified_by)
+            return {"product_id": pid, "ok": True, "verified": True, "verified_by": verified_by, "via": "graphql_variants"}
+
+        def _run_task(kind: str, indices: list[int]):
+            # Los workers no escriben directo al logger (Streamlit solo acepta el hilo principal):
+            # acumulan sus registros y el hilo principal los emite al terminar cada tarea.
+            lines = _log.buffered()
+            try:
+                if kind == "graphql":
+                    return _run_graphql_batch(indices, lines), lines
+                if kind == "variants":
+                    job = products_to_update[indices[0]]
+                    return [(indices[0], _run_variants_job(job, lines))], lines
+                job = products_to_update[indices[0]]
+                return [(indices[0], _run_job(job, lines))], lines
+            except Exception as e:
+                lines.error(f"❌ Error inesperado ({kind}): {repr(e)}")
+                return [
+                    (idx, {
+                        "product_id": products_to_update[idx].get("shopify_product_id") or products_to_update[idx].get("product_id"),
+                        "zoho_item_id": products_to_update[idx].get("zoho_item_id"),
+                        "ok": False,
+                        "error": str(e),
+                    })
+                    for idx in indices
+                ], lines
+
+        # ===== bitácora de jobs (reanudable) =====
+        results: list[dict | None] = [None] * len(products_to_update)
+        if use_journal is None:
+            use_journal = bool(shop_conf.get("job_journal", True))
+        journal, journal_keys = None, []
+        if use_journal:
+            try:
+                journal = SHOPIFY_JOB_JOURNAL(
+                    client, store,
+                    max_attempts=shop_conf.get("journal_max_attempts", 5),
+                    ttl_hours=shop_conf.get("journal_ttl_hours", 24),
+                )
+                journal.ensure_indexes()
+                journal_keys, done = journal.plan(products_to_update, plan_id or SHOPIFY_JOB_JOURNAL.new_plan_id())
+            except Exception as e:
+                _log(f"⚠️ Bitácora de jobs no disponible, se continúa sin ella: {repr(e)}")
+                journal, done = None, {}
+            if done:
+                for idx, key in enumerate(journal_keys):
+                    if key in done:
+                        results[idx] = {**done[key], "from_journal": True}
+                skip = {idx for idx, r in enumerate(results) if r is not None}
+                rest_idx = [i for i in rest_idx if i not in skip]
+                variants_idx = [i for i in variants_idx if i not in skip]
+                graphql_idx = [i for i in graphql_idx if i not in skip]
+                _log(f"📒 {len(skip)} jobs ya aplicados según la bitácora; no se reenvían.")
+
+        def _run_task_journaled(kind: str, indices: list[int]):
+            if journal is not None:
+                try:
+                    journal.mark_in_progress([journal_keys[i] for i in indices])
+                except Exception:
+                    pass
+            pairs, lines = _run_task(kind, indices)
+            if journal is not None:
+                try:
+                    journal.mark_results([(journal_keys[idx], result) for idx, result in pairs])
+                except Exception as e:
+                    lines.warning(f"⚠️ No pude registrar resultado en la bitácora: {repr(e)}")
+            return pairs, lines
+
+        tasks = [("rest", [idx]) for idx in rest_idx]
+        tasks += [("variants", [idx]) for idx in variants_idx]
+        tasks += [
+            ("graphql", graphql_idx[i:i + graphql_batch_size])
+            for i in range(0, len(graphql_idx), graphql_batch_size)
+        ]
+        if not tasks:
+            return results
+
+        _log(
+            f"🚚 Enviando {len(products_to_update)} jobs a {store} con {max_workers} workers "
+            f"(rest={len(rest_idx)}, variants_bulk={len(variants_idx)}, "
+            f"graphql={len(graphql_idx)} en lotes de {graphql_batch_size})"
+        )
+
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"shopify-{store}") as pool:
+            futures = [pool.submit(_run_task_journaled, kind, indices) for kind, indices in tasks]
+            for fut in as_completed(futures):
+                pairs, lines = fut.result()
+                lines.flush()
+                for idx, result in pairs:
+                    results[idx] = result
+
+        self._apply_mirror_writes(store, mirror_ops, mirror_variant_pids, client, _log)
+
+        sent = [r for r in results if r is not None and not r.get("from_journal")]
+        _log(
+            f"📊 Resultado {store}: ok={sum(1 for r in sent if r.get('ok'))} | "
+            f"fallidos={sum(1 for r in sent if not r.get('ok'))} | "
+            f"sin verificar={sum(1 for r in sent if r.get('ok') and not r.get('verified'))}"
+        )
+
+        if strategy_selector is not None:
+            strategy_selector.record("writes", write_strategy, strategy_estimates, {
+                "calls": len(sent_requests),
+                "requests": {kind: sent_requests.count(kind) for kind in ("rest", "graphql")},
+                "seconds": round(time.monotonic() - started_at, 3),
+                "tasks": {"rest": len(rest_idx), "variants": len(variants_idx), "graphql_batches": len(tasks) - len(rest_idx) - len(variants_idx)},
+                "throttled": (gql.throttled_count - throttled_before) if gql is not None else 0,
+                "ok": sum(1 for r in sent if r.get("ok")),
+                "failed": sum(1 for r in sent if not r.get("ok")),
+            }, inputs=strategy_inputs)
+
+        return results
+
+    def _apply_mirror_writes(self, store: str, ops: list, variant_pids: list, client, _log) -> int:
+        """Aplica al espejo {store}.products lo que regresó Shopify y refresca inventory_map si cambiaron variantes."""
+        if not ops:
+            return 0
+        try:
+            res = client[store]["products"].bulk_write(ops, ordered=False)
+        except Exception as e:
+            _log(f"⚠️ No pude actualizar el espejo {store}.products: {repr(e)}")
+            return 0
+        if variant_pids:
+            INVENTORY_MAP(client).refresh(store, product_ids=list({pid for pid in variant_pids if pid is not None}))
+        _log(f"🪞 Espejo {store}.products actualizado con las respuestas de Shopify: {res.modified_count}/{len(ops)}")
+        return res.modified_count
+
+    def _mirror_inventory_levels(self, store: str, location_id: int, confirmed: dict, client, _log) -> int:
+        """Escribe en {store}.inventory_levels las cantidades que el verificador confirmó."""
+        if not confirmed:
+            return 0
+        now = datetime.now(timezone.utc).isoformat()
+        ops = [
+            UpdateOne(
+                {"inventory_item_id": ID_NORMALIZER.to_int64(SHOPIFY_GRAPHQL.numeric_id(gid))},
+                {"$set": {"location_id": ID_NORMALIZER.to_int64(location_id), "available": int(qty), "updated_at": now}},
+                upsert=True,
+            )
+            for gid, qty in confirmed.items()
+        ]
+        try:
+            client[store]["inventory_levels"].bulk_write(ops, ordered=False)
+        except Exception as e:
+            _log(f"⚠️ No pude actualizar el espejo {store}.inventory_levels: {repr(e)}")
+            return 0
+        _log(f"🪞 Espejo {store}.inventory_levels actualizado: {len(ops)} niveles")
+        return len(ops)
+
+    @staticmethod
+    def _zoho_items_by_id(client, query: dict | None = None) -> dict:
+        """item_id (str) → documento de Zoho_Inventory.items."""
+        return {
+            x["item_id"]: x
+            for x in client["Zoho_Inventory"]["items"].find(query or {})
+            if x.get("item_id") is not None
+        }
+
+    @staticmethod
+    def _store_products_by_id(client, store: str, query: dict | None = None, projection: dict | None = None) -> dict:
+        """id (Int64) → producto del espejo {store}.products."""
+        return {x["id"]: x for x in client[store]["products"].find(query or {}, projection) if x.get("id") is not None}
+
+    @staticmethod
+    def _archive_body(product: ShopifyProductView, reason: str) -> dict:
+        """Job de archivado (status=archived) para send_workload_to_shopify_api."""
+        return {
+            "shopify_product_id": product.id,
+            "shopify_admin_graphql_api_id": product.gid,
+            "zoho_item_id": None,
+            "diff_count": 1,
+            "payload": {"product": {"id": product.id, "status": "archived"}},
+            "reason": reason,
+        }
+
+    # Constructor de dos diccionarios idénticos basados en el template, para comparar
+    def shopify_update_items(self, store: str, logger=None, bridge_items: list | None = None,
+                             zoho_by_id: dict | None = None, shopify_by_id: dict | None = None,
+                             archive_unlisted: bool = True):
+        """
+        Planea las actualizaciones (y archivados) de la tienda.
+        bridge_items / zoho_by_id / shopify_by_id: datos ya cargados (run_full_sync); si no
+        se dan, se leen de Mongo.
+        archive_unlisted=False: no se archivan los productos de shopify_by_id que no estén en
+        bridge_items (planeación por ventanas: esa pasada se hace aparte).
+        """
+        _log = self.log.bind(logger, "shopify_update_items")
+
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+
+        store_links = STORE_LINKS(client)
+        if bridge_items is None and not store_links.exists(store):
+            _log(f"❌ No existen vínculos en store_links para store={store}")
+            return []
+
+        # índices (ids canónicos desde la ingesta: item_id str, id Int64)
+        if zoho_by_id is None:
+            zoho_by_id = self._zoho_items_by_id(client)
+        if shopify_by_id is None:
+            shopify_by_id = self._store_products_by_id(client, store)
+        if bridge_items is None:
+            bridge_items = store_links.get_links(store)
 
         missing_zoho, missing_shopify = [], []
         broken_links = 0
@@ -754,54 +1426,38 @@ class INVENTORY_AUTOMATIZATION:
         update_bodies = []
         not_listed_archives = 0
 
-        for i, link in enumerate(bridge_items):
-            zoho_id = self._safe_str(link.get("item_id"))
-            shopify_id = self._safe_str(link.get("shopify_id"))
-            print(f"{i} Producto procesado: ID_zoho {zoho_id}, shopify_id {shopify_id}")
+        for i, raw_link in enumerate(bridge_items):
+            link = raw_link if isinstance(raw_link, Link) else Link.from_doc(raw_link)
+            zoho_id = link.item_id
+            shopify_id = link.shopify_id
+            _log.debug("{i} Producto procesado: ID_zoho {zoho_id}, shopify_id {shopify_id}", category="item", i=i, zoho_id=zoho_id, shopify_id=shopify_id)
             # ✅ vínculo roto
             if not shopify_id:
                 broken_links += 1
-                _log("⚠️ VÍNCULO INCOMPLETO en Zoho_Inventory.items_per_store")
-                _log(f"   store: {store} | index: {i}")
-                _log(f"   item_id (zoho): {repr(link.get('item_id'))}")
-                _log(f"   shopify_id    : {repr(link.get('shopify_id'))}")
-                _log(f"   name          : {repr(link.get('name'))}")
-                _log(f"   link completo : {link}")
+                _log.warning("⚠️ VÍNCULO INCOMPLETO en Zoho_Inventory.store_links | store: {store} | index: {i}", store=store, i=i)
+                _log.debug("   item_id (zoho): {v!r}", category="item", v=link.item_id)
+                _log.debug("   shopify_id    : {v!r}", category="item", v=link.shopify_id)
+                _log.debug("   name          : {v!r}", category="item", v=link.name)
+                _log.debug("   link completo : {v}", category="item", v=raw_link)
                 continue
 
             zoho_doc = zoho_by_id.get(zoho_id)
             shopify_doc = shopify_by_id.get(shopify_id)
 
             # ✅ CASO NUEVO: hay shopify_id pero NO hay zoho_id → archivar en Shopify
-            if zoho_id is None or zoho_id == "":
-                shopify_doc = shopify_by_id.get(shopify_id)
+            if zoho_id is None:
                 if not shopify_doc:
                     missing_shopify.append(shopify_id)
                     _log(f"⚠️ No encontré shopify_doc para product_id={shopify_id} (index={i})")
                     continue
 
-                current_status = (shopify_doc.get("status") or "").lower()
-                if current_status == "archived":
-                    _log(f"✅ Ya estaba archived | product_id={shopify_doc.get('id')}")
+                product = shopify_doc if isinstance(shopify_doc, ShopifyProductView) else ShopifyProductView.from_doc(shopify_doc)
+                if product.archived:
+                    _log.debug("✅ Ya estaba archived | product_id={pid}", category="item", pid=product.id)
                     continue
 
-                payload = {
-                    "product": {
-                        "id": shopify_doc.get("id"),
-                        "status": "archived",
-                    }
-                }
-
-                update_bodies.append({
-                    "shopify_product_id": shopify_doc.get("id"),
-                    "shopify_admin_graphql_api_id": shopify_doc.get("admin_graphql_api_id"),
-                    "zoho_item_id": None,
-                    "diff_count": 1,
-                    "payload": payload,
-                    "reason": "missing_zoho_id_in_items_per_store",
-                })
-
-                _log(f"🗄️ Archivando en Shopify (sin zoho_id) | product_id={shopify_doc.get('id')} | link_index={i}")
+                update_bodies.append(self._archive_body(product, "missing_zoho_id_in_store_links"))
+                _log(f"🗄️ Archivando en Shopify (sin zoho_id) | product_id={product.id} | link_index={i}")
                 continue
 
             if not shopify_doc:
@@ -817,17 +1473,15 @@ class INVENTORY_AUTOMATIZATION:
             # ✅ si algo salió raro (None), NO crashear: log y seguir
             if not isinstance(item_zoho_version, dict):
                 bad_templates += 1
-                _log("⚠️ item_zoho_version inválido (no es dict).")
-                _log(f"   store: {store} | index: {i} | zoho_id={zoho_id} | shopify_id={shopify_id}")
-                _log(f"   item_zoho_version: {repr(item_zoho_version)}")
-                _log(f"   zoho_doc.name: {repr(zoho_doc.get('name'))}")
+                _log.warning(f"⚠️ item_zoho_version inválido (no es dict) | store: {store} | index: {i} | zoho_id={zoho_id} | shopify_id={shopify_id}")
+                _log.debug("   item_zoho_version: {v!r}", category="item", v=item_zoho_version)
+                _log.debug("   zoho_doc.name: {v!r}", category="item", v=zoho_doc.get("name"))
                 continue
 
             if not isinstance(item_shopif_version, dict):
                 bad_templates += 1
-                _log("⚠️ item_shopif_version inválido (no es dict).")
-                _log(f"   store: {store} | index: {i} | zoho_id={zoho_id} | shopify_id={shopify_id}")
-                _log(f"   item_shopif_version: {repr(item_shopif_version)}")
+                _log.warning(f"⚠️ item_shopif_version inválido (no es dict) | store: {store} | index: {i} | zoho_id={zoho_id} | shopify_id={shopify_id}")
+                _log.debug("   item_shopif_version: {v!r}", category="item", v=item_shopif_version)
                 continue
 
             # 2) diff
@@ -838,15 +1492,14 @@ class INVENTORY_AUTOMATIZATION:
             diffs = self._deep_diff(zoho_cmp, shopify_cmp)            
 
             if not diffs:
-                _log(f"✅ Sin diferencias | product_id={shopify_doc.get('id')} | zoho_id={zoho_id}")
+                _log.debug("✅ Sin diferencias | product_id={pid} | zoho_id={zoho_id}", category="item", pid=shopify_doc.get("id"), zoho_id=zoho_id)
                 continue
 
             # 3) imprimir diff claro
-            _log(f"🧾 DIFERENCIAS DETECTADAS | product_id={shopify_doc.get('id')} | zoho_id={zoho_id}")
-            for p, a, b in diffs:
-                _log(f" - {p}")
-                _log(f"   desired: {repr(a)}")
-                _log(f"   current: {repr(b)}")
+            _log.debug("🧾 DIFERENCIAS DETECTADAS | product_id={pid} | zoho_id={zoho_id}", category="diff", pid=shopify_doc.get("id"), zoho_id=zoho_id)
+            if _log.enabled("debug"):
+                for p, a, b in diffs:
+                    _log.debug(" - {p}\n   desired: {a!r}\n   current: {b!r}", category="diff", p=p, a=a, b=b)
 
             # 4) payload
             payload = self._build_shopify_update_payload(
@@ -870,16 +1523,15 @@ class INVENTORY_AUTOMATIZATION:
 
         # =========================================================
         # 2) EXTRA: Archivar productos que están en Shopify (store_items)
-        #    pero NO están listados en items_per_store (bridge_items)
+        #    pero NO están listados en store_links (bridge_items)
         # =========================================================
 
         bridge_shopify_ids = {
-            self._safe_str(x.get("shopify_id"))
+            x.shopify_id if isinstance(x, Link) else x.get("shopify_id")
             for x in bridge_items
-            if self._safe_str(x.get("shopify_id"))
-        }
+        } - {None}
 
-        store_shopify_ids = set(shopify_by_id.keys())  # ya son str(id)
+        store_shopify_ids = set(shopify_by_id.keys()) if archive_unlisted else set()
 
         not_listed_shopify_ids = store_shopify_ids - bridge_shopify_ids
 
@@ -893,29 +1545,14 @@ class INVENTORY_AUTOMATIZATION:
                 _log(f"⚠️ No encontré shopify_doc para product_id={shopify_id} (not_listed)")
                 continue
 
-            current_status = (shopify_doc.get("status") or "").lower()
-            if current_status == "archived":
-                _log(f"✅ Ya estaba archived | product_id={shopify_doc.get('id')} (not_listed)")
+            product = shopify_doc if isinstance(shopify_doc, ShopifyProductView) else ShopifyProductView.from_doc(shopify_doc)
+            if product.archived:
+                _log.debug("✅ Ya estaba archived | product_id={pid} (not_listed)", category="item", pid=product.id)
                 continue
 
-            payload = {
-                "product": {
-                    "id": shopify_doc.get("id"),
-                    "status": "archived",
-                }
-            }
-
-            update_bodies.append({
-                "shopify_product_id": shopify_doc.get("id"),
-                "shopify_admin_graphql_api_id": shopify_doc.get("admin_graphql_api_id"),
-                "zoho_item_id": None,
-                "diff_count": 1,
-                "payload": payload,
-                "reason": "not_listed_in_items_per_store",
-            })
-
+            update_bodies.append(self._archive_body(product, "not_listed_in_store_links"))
             not_listed_archives += 1
-            _log(f"🗄️ Archivando en Shopify (no listado en items_per_store) | product_id={shopify_doc.get('id')}")
+            _log(f"🗄️ Archivando en Shopify (no listado en store_links) | product_id={product.id}")
 
         # resumen final
         _log(
@@ -927,34 +1564,123 @@ class INVENTORY_AUTOMATIZATION:
 
         # ✅ esto alimenta products_to_update
         return update_bodies
-    
+
+    def _query_plan_windows(self, client, store_links, store: str, chunk_size: int):
+        """(links, zoho_by_id, shopify_by_id) por ventana con dos $in de documentos completos."""
+        for window in store_links.iter_windows(store, chunk_size, {"shopify_id": {"$ne": None}}):
+            item_ids = [link["item_id"] for link in window if link.get("item_id") not in (None, "")]
+            shopify_ids = [link["shopify_id"] for link in window]
+            zoho_by_id = self._zoho_items_by_id(client, {"item_id": {"$in": item_ids}}) if item_ids else {}
+            shopify_by_id = self._store_products_by_id(client, store, {"id": {"$in": shopify_ids}})
+            yield window, zoho_by_id, shopify_by_id
+
+    def shopify_update_items_chunked(self, store: str, logger=None, chunk_size: int | None = None,
+                                     plan_source: str | None = None, modified_since=None) -> dict:
+        """
+        Planea y envía las actualizaciones por ventanas de store_links.
+        shopify_update_items carga todos los items de Zoho, todos los productos y todos los
+        vínculos, y hasta terminar de planear manda algo a Shopify. Aquí, por cada ventana
+        de chunk_size vínculos (o 'plan_chunk_size' en el YAML de la tienda):
+        - se leen solo sus items de Zoho y sus productos ($in),
+        - se planea con shopify_update_items y se envía en cuanto termina la ventana.
+        La memoria queda acotada a una ventana y los primeros envíos salen en segundos.
+        Al final, una pasada de solo ids archiva los productos que no están en store_links.
+
+        plan_source (o 'plan_source' en el YAML de la tienda, default "queries"):
+        - "queries": dos $in por ventana con documentos completos.
+        - "aggregation": CATALOG_PLAN_SOURCE ($lookup en el servidor, solo campos comparados);
+          acepta modified_since (datetime) para planear solo items modificados en Zoho.
+        """
+        _log = self.log.bind(logger, "shopify_update_items_chunked")
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+
+        store_links = STORE_LINKS(client)
+        if not store_links.exists(store):
+            _log(f"❌ No existen vínculos en store_links para store={store}")
+            return {"windows": 0, "planned": 0, "sent": 0}
+
+        if chunk_size is None:
+            chunk_size = self.data[store].get("plan_chunk_size", 1000)
+        chunk_size = max(1, int(chunk_size))
+
+        if plan_source is None:
+            plan_source = self.data[store].get("plan_source", "queries")
+        if plan_source == "aggregation":
+            source = CATALOG_PLAN_SOURCE(client, store, self.product_payload, self._template_to_schema(self.product_payload))
+            window_iter = source.windows(chunk_size, modified_since=modified_since)
+        elif plan_source == "queries":
+            window_iter = self._query_plan_windows(client, store_links, store, chunk_size)
+        else:
+            raise ValueError(f"plan_source inválido: {plan_source!r}. Opciones: ('queries', 'aggregation')")
+
+        windows = planned = sent = 0
+        for window, zoho_by_id, shopify_by_id in window_iter:
+            windows += 1
+            _log(f"🪟 Ventana {windows}: links={len(window)} zoho_items={len(zoho_by_id)} shopify_products={len(shopify_by_id)}")
+            update_bodies = self.shopify_update_items(
+                store,
+                logger=logger,
+                bridge_items=window,
+                zoho_by_id=zoho_by_id,
+                shopify_by_id=shopify_by_id,
+                archive_unlisted=False,
+            )
+            planned += len(update_bodies)
+            if update_bodies:
+                sent += len(self.send_workload_to_shopify_api(update_bodies, store, logger=logger))
+
+        # productos del espejo que ya no están en store_links → archivar (solo ids y status)
+        linked = store_links.linked_shopify_ids(store)
+        unlisted = {}
+        for doc in client[store]["products"].find(
+            {"id": {"$ne": None}}, {"_id": 0, "id": 1, "status": 1, "admin_graphql_api_id": 1}
+        ):
+            product = ShopifyProductView.from_doc(doc)
+            if product.id not in linked and not product.archived:
+                unlisted[product.id] = product
+        if unlisted:
+            archive_bodies = self.shopify_update_items(store, logger=logger, bridge_items=[], zoho_by_id={}, shopify_by_id=unlisted)
+            planned += len(archive_bodies)
+            if archive_bodies:
+                sent += len(self.send_workload_to_shopify_api(archive_bodies, store, logger=logger))
+
+        summary = {"windows": windows, "planned": planned, "sent": sent}
+        _log(f"🏁 Planeación por ventanas {store}: {summary}")
+        return summary
+
 
     ###################################    
     ## SECCIÓN PARA CREAR INVENTARIO ##
     ###################################
  
-    def shopify_create_items(self, store: str, logger=None):
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))
-
-        mongo_db_url = self.data["non_sql_database"]["url"]
-        client = MongoClient(mongo_db_url)
-
-        zoho_items = list(client["Zoho_Inventory"]["items"].find({}))
-        store_items = list(client[store]["products"].find({}))
-        items_per_store_doc = client["Zoho_Inventory"]["items_per_store"].find_one({"store": store})
+    def shopify_create_items(self, store: str, logger=None, bridge_items: list | None = None, zoho_by_id: dict | None = None,
+                             skip_item_ids: set | None = None):
+        """
+        Crea en Shopify los items vinculados sin shopify_id y guarda los vínculos.
+        bridge_items / zoho_by_id: datos ya cargados (run_full_sync); si no se dan, se leen
+        de Mongo solo los vínculos pendientes y sus items de Zoho.
+        skip_item_ids: zoho_item_id que resume_pending_jobs acaba de reenviar en esta corrida
+        (si fallaron, se reintentan en la siguiente con su plan original, no en uno nuevo).
+        """
+        _log = self.log.bind(logger, "shopify_create_items")
 
-        if not items_per_store_doc:
-            _log(f"❌ No existe items_per_store para store={store}")
-            return []
+        client = MONGO_CLIENT_POOL.get_client(self.data)
 
-        zoho_by_id = {str(x.get("item_id")): x for x in zoho_items if x.get("item_id") is not None}
-        shopify_by_id = {str(x.get("id")): x for x in store_items if x.get("id") is not None}
+        store_links = STORE_LINKS(client)
+        if bridge_items is None:
+            if not store_links.exists(store):
+                _log(f"❌ No existen vínculos en store_links para store={store}")
+                return []
+            # solo los vínculos sin shopify_id (índice store + shopify_id) y sus items de Zoho
+            bridge_items = list(store_links.find(store, {"shopify_id": None, "item_id": {"$exists": True}}))
+        else:
+            bridge_items = [link for link in bridge_items if link.get("shopify_id") is None and link.get("item_id") is not None]
+        if skip_item_ids:
+            bridge_items = [link for link in bridge_items if ID_NORMALIZER.to_item_id(link.get("item_id")) not in skip_item_ids]
 
-        bridge_items = items_per_store_doc.get("items", [])
+        if zoho_by_id is None:
+            pending_ids = [link["item_id"] for link in bridge_items]
+            zoho_by_id = self._zoho_items_by_id(client, {"item_id": {"$in": pending_ids}}) if pending_ids else {}
 
         broken_links = 0
         create_jobs = []  # 👈 jobs (no dict suelto)
@@ -987,257 +1713,322 @@ class INVENTORY_AUTOMATIZATION:
 
         _log(f"🧩 create_jobs → {len(create_jobs)} (links sin shopify_id) | broken_links={broken_links}")
 
-        # ✅ crea en Shopify (POST) usando tu función existente ya extendida
-        results = self.send_workload_to_shopify_api(create_jobs, store, logger=logger)
-
-        # ✅ inyecta shopify_id en items_per_store + upsert producto en store.products
+        # ✅ crea en Shopify (POST) por lotes; al final de cada lote se linkea con dos bulk_write
+        batch_size = max(1, int(self.data[store].get("create_batch_size", 250)))
+        results = []
         updated = 0
+        for start in range(0, len(create_jobs), batch_size):
+            batch = create_jobs[start:start + batch_size]
+            batch_results = self.send_workload_to_shopify_api(batch, store, logger=logger)
+
+            # ✅ inyecta shopify_id en store_links + upsert producto en store.products
+            updated += self._link_created_products(store, batch_results, client, _log)
+            results.extend(batch_results)
+
+        _log(f"🎉 Creación terminada. Links actualizados: {updated}/{len(results)}")
+        return results
+
+    def _link_created_products(self, store: str, results: list[dict], client, _log) -> int:
+        """
+        Guarda el shopify_id de los productos creados en store_links y el producto en store.products.
+        Se acumulan las escrituras y se mandan en dos bulk_write (uno por colección) en vez de
+        dos round trips por producto.
+        """
+        store_links = STORE_LINKS(client)
+        link_ops = []
+        product_ops = []
+        created_ids = []
+        linked_at = datetime.utcnow()
         for r in results:
             if not r.get("ok") or not r.get("created"):
                 continue
 
             zoho_item_id_raw = r.get("zoho_item_id")
-            shopify_new_id = r.get("product_id")
-            created_product = r.get("product", {})
+            shopify_new_id = ID_NORMALIZER.to_int64(r.get("product_id"))
+            created_product = ID_NORMALIZER.normalize_shopify_record("products", dict(r.get("product") or {}))
 
             if not zoho_item_id_raw or not shopify_new_id:
                 continue
 
-            # 1) linkeo en Zoho_Inventory.items_per_store (array items)
-            client["Zoho_Inventory"]["items_per_store"].update_one(
-                {"store": store, "items.item_id": zoho_item_id_raw},
-                {"$set": {
-                    "items.$.shopify_id": shopify_new_id,
-                    "items.$.linked_at": datetime.utcnow(),
-                }}
-            )
+            # 1) linkeo en Zoho_Inventory.store_links (un documento por vínculo)
+            link_ops.append(store_links.link_op(store, zoho_item_id_raw, shopify_new_id, linked_at))
 
             # 2) guardar el producto creado en la colección store.products
-            client[store]["products"].update_one(
-                {"id": shopify_new_id},
-                {"$set": created_product},
-                upsert=True
-            )
+            #    (los recuperados de la bitácora no traen el producto; el siguiente sync lo refleja)
+            if created_product:
+                product_ops.append(UpdateOne(
+                    {"id": shopify_new_id},
+                    {"$set": created_product},
+                    upsert=True
+                ))
+                created_ids.append(shopify_new_id)
+
+            _log.debug("✅ Link actualizado: zoho_item_id={zid!r} → shopify_id={sid}", category="job", zid=zoho_item_id_raw, sid=shopify_new_id)
+
+        store_links.bulk_write(link_ops)
+        if product_ops:
+            client[store]["products"].bulk_write(product_ops, ordered=False)
+            # 3) mapeo item → inventory_item_id de los productos nuevos
+            INVENTORY_MAP(client).refresh(store, product_ids=created_ids)
+        return len(link_ops)
+
+    def _find_product_id_by_sku(self, store: str, sku) -> int | None:
+        """Busca en Shopify (GraphQL) un producto con una variante de ese SKU."""
+        if sku is None or str(sku).strip() == "":
+            return None
+        gql = SHOPIFY_GRAPHQL.for_store(store, self.data[store])
+        query = """
+        query FindBySku($q: String!) {
+          productVariants(first: 1, query: $q) { nodes { product { id } } }
+        }
+        """
+        body = gql.execute(query, {"q": f"sku:{json.dumps(str(sku))}"}, estimated_cost=5)
+        nodes = ((body.get("data") or {}).get("productVariants") or {}).get("nodes") or []
+        if not nodes:
+            return None
+        return SHOPIFY_GRAPHQL.numeric_id((nodes[0].get("product") or {}).get("id"))
 
-            updated += 1
-            _log(f"✅ Link actualizado: zoho_item_id={repr(zoho_item_id_raw)} → shopify_id={shopify_new_id}")
+    def resume_pending_jobs(self, store: str, logger=None) -> list[dict]:
+        """
+        Reanuda los jobs que quedaron sin terminar en management.shopify_job_journal
+        (proceso caído, sesión de Streamlit cerrada a la mitad, etc.).
+
+        - Actualizaciones: no se reenvían. Se llama justo antes de re-planear y el plan nuevo
+          las recalcula contra Zoho y el espejo; reenviar el payload viejo podría pisar un
+          valor más nuevo. Se marcan "superseded".
+        - Creaciones: solo la entrada más nueva de cada zoho_item_id (las de planes anteriores
+          se marcan "superseded"; reenviar varias crearía productos duplicados). Se reanuda
+          con su plan_id original (lo "done" de ese plan no se repite). Una creación
+          "in_progress" o "failed" pudo haberse creado en Shopify (caída, o un POST que expiró
+          pero sí se aplicó): primero se busca su SKU en Shopify y, si ya existe, se marca
+          como hecha y se linkea en lugar de crear un duplicado.
+        Regresa los resultados; los zoho_item_id reenviados se pasan a shopify_create_items
+        (skip_item_ids) para no planearlos otra vez en la misma corrida.
+        """
+        _log = self.log.bind(logger, "resume_pending_jobs")
 
-        _log(f"🎉 Creación terminada. Links actualizados: {updated}/{len(results)}")
+        shop_conf = self.data[store]
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+        journal = SHOPIFY_JOB_JOURNAL(
+            client, store,
+            max_attempts=shop_conf.get("journal_max_attempts", 5),
+            ttl_hours=shop_conf.get("journal_ttl_hours", 24),
+        )
+        entries = journal.pending()
+        if not entries:
+            _log(f"📒 Sin jobs pendientes en la bitácora para {store}.")
+            return []
+
+        superseded = []
+        creates_by_item: dict = {}
+        for entry in entries:  # pending() viene ordenado por created_at: la última es la más nueva
+            job = entry.get("job") or {}
+            is_create = not (job.get("shopify_product_id") or job.get("product_id"))
+            if not is_create:
+                superseded.append(entry["key"])
+                continue
+            item_key = ID_NORMALIZER.to_item_id(job.get("zoho_item_id")) or entry["key"]
+            creates_by_item.setdefault(item_key, []).append(entry)
+
+        jobs_by_plan: dict = {}
+        recovered = []
+        for group in creates_by_item.values():
+            entry = group[-1]
+            superseded.extend(e["key"] for e in group[:-1])
+            job = entry.get("job") or {}
+            if any(e.get("state") in ("in_progress", "failed") for e in group):
+                variants = ((job.get("payload") or {}).get("product") or {}).get("variants") or [{}]
+                try:
+                    existing_id = self._find_product_id_by_sku(store, variants[0].get("sku"))
+                except Exception as e:
+                    _log(f"⚠️ No pude revisar SKU en Shopify, se reintenta la creación: {repr(e)}")
+                    existing_id = None
+                if existing_id:
+                    result = {
+                        "zoho_item_id": job.get("zoho_item_id"),
+                        "product_id": existing_id,
+                        "ok": True,
+                        "created": True,
+                        "recovered": True,
+                    }
+                    journal.mark_results([(entry["key"], result)])
+                    recovered.append(result)
+                    _log(f"♻️ Creación ya aplicada antes de la caída: zoho_item_id={repr(job.get('zoho_item_id'))} → {existing_id}")
+                    continue
+            if not entry.get("plan_id"):
+                # entrada anterior a los plan_id: su llave no se puede reproducir, se reenvía en un plan nuevo
+                superseded.append(entry["key"])
+            jobs_by_plan.setdefault(entry.get("plan_id"), []).append(job)
+
+        journal.supersede(superseded)
+        n_creates = sum(len(jobs) for jobs in jobs_by_plan.values())
+        n_dup_creates = sum(len(group) - 1 for group in creates_by_item.values())
+        _log(
+            f"📒 Bitácora {store}: {n_creates} creaciones por reanudar, {len(recovered)} recuperadas por SKU, "
+            f"{n_dup_creates} creaciones repetidas descartadas, "
+            f"{len(entries) - len(creates_by_item) - n_dup_creates} actualizaciones viejas descartadas (el plan nuevo las recalcula)"
+        )
+
+        results = []
+        for plan_id, jobs in jobs_by_plan.items():
+            results.extend(self.send_workload_to_shopify_api(jobs, store, logger=logger, plan_id=plan_id))
+        results = recovered + results
+        self._link_created_products(store, results, client, _log)
         return results
-    
-    def run_inventory_sync(self, store: str, logger=None):
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))
 
-        _log(f"📦 Sincronizando inventario para {store}...")
+    @staticmethod
+    def _resumed_item_ids(resumed: list[dict]) -> set:
+        """zoho_item_id de las creaciones que resume_pending_jobs ya mandó en esta corrida."""
+        return {
+            ID_NORMALIZER.to_item_id(r.get("zoho_item_id"))
+            for r in resumed or []
+            if r.get("zoho_item_id") is not None
+        }
 
+    @staticmethod
+    def zoho_available_stock(doc: dict) -> int:
+        """Stock a publicar de un item de Zoho: actual_available_stock, si no available_stock."""
+        return ZohoItemView.stock_of(doc)
+
+    def _inventory_location_id(self, store: str) -> int:
+        """location_id de inventario de la tienda: config (location_id) o el mapeo fijo."""
+        if store in self._location_id_cache:
+            return self._location_id_cache[store]
         # --- location_id mapping (simplified)
         location_map = {
             "managed_store_one": 108620087615,
             "managed_store_two": 80329703512,
         }
-        location_id = location_map.get(store)
+        location_id = ((self.data or {}).get(store) or {}).get("location_id") or location_map.get(store)
         if location_id is None:
             raise ValueError(
                 f"No tengo location_id para store='{store}'. "
                 f"Stores válidos: {list(location_map.keys())}"
             )
+        self._location_id_cache[store] = int(location_id)
+        return self._location_id_cache[store]
 
-        # --- resolve Shopify config (based on YOUR YAML)
-        if not isinstance(self.data, dict):
-            raise TypeError(f"self.data debe ser dict, recibí: {type(self.data)}")
-
-        store_conf = self.data.get(store)
-        if not isinstance(store_conf, dict):
-            raise KeyError(
-                f"No encontré config dict para store='{store}' en self.data. "
-                f"Keys disponibles: {list(self.data.keys())}"
-            )
-
-        token = store_conf.get("access_token")
-        api_version = store_conf.get("api_version", "2024-10")
-        store_name = store_conf.get("store_name")
-        if not token or not store_name:
-            raise ValueError(
-                f"Config incompleta para store='{store}'. Requerido: access_token, store_name. "
-                f"Recibí keys: {list(store_conf.keys())}"
-            )
+    def _activate_inventory_levels(self, gql, location_gid: str, inv_item_ids: list, store_conf: dict, _log) -> set:
+        """
+        Activa los inventory items en la ubicación (los que no tienen inventoryLevel ahí).
+        Mutations inventoryActivate agrupadas con alias (a0, a1, ...), con el tamaño del lote
+        ajustado por costo (GRAPHQL_BATCHER). Devuelve los inventory_item_id activados.
+        """
+        batcher = GRAPHQL_BATCHER(
+            gql,
+            max_size=store_conf.get("inventory_activate_max_aliases", self.INVENTORY_ACTIVATE_MAX_ALIASES),
+            initial=min(10, self.INVENTORY_ACTIVATE_MAX_ALIASES),
+        )
+        activated = set()
+        failed = 0
+        batch_no = 0
+
+        for batch in batcher.batches(list(inv_item_ids)):
+            batch_no += 1
+            var_defs, fields, variables = ["$locationId: ID!"], [], {"locationId": location_gid}
+            for n, inv_item_id in enumerate(batch):
+                var_defs.append(f"$i{n}: ID!")
+                fields.append(
+                    f"  a{n}: inventoryActivate(inventoryItemId: $i{n}, locationId: $locationId) "
+                    "{ inventoryLevel { id } userErrors { field message } }"
+                )
+                variables[f"i{n}"] = SHOPIFY_GRAPHQL.gid("InventoryItem", inv_item_id)
+            mutation = "mutation BatchInventoryActivate(" + ", ".join(var_defs) + ") {\n" + "\n".join(fields) + "\n}"
 
-        base = store_name.strip()
-        if not base.startswith("http"):
-            base = "https://" + base
-        base = base.rstrip("/")
+            try:
+                body = gql.execute(mutation, variables, estimated_cost=batcher.estimated_cost(len(batch)))
+            except Exception as e:
+                failed += len(batch)
+                _log(f"❌ Activate batch {batch_no}: error {repr(e)}")
+                continue
+            next_size = batcher.record(len(batch), body)
+
+            data = body.get("data") or {}
+            batch_failed = []
+            for n, inv_item_id in enumerate(batch):
+                node = data.get(f"a{n}") or {}
+                if node.get("inventoryLevel") and not node.get("userErrors"):
+                    activated.add(inv_item_id)
+                else:
+                    batch_failed.append((inv_item_id, node.get("userErrors") or body.get("errors")))
+            failed += len(batch_failed)
+            _log(f"🟢 Activate batch {batch_no}: activados {len(batch) - len(batch_failed)}/{len(batch)} (next_batch={next_size})")
+            for inv_item_id, errors in batch_failed[:5]:
+                _log(f"   - inventory_item_id={inv_item_id}: {errors}")
 
-        endpoint_set = f"{base}/admin/api/{api_version}/inventory_levels/set.json"
+        _log(f"   ✅ activated={len(activated)} activate_failed={failed}")
+        return activated
 
-        headers = store_conf.get("headers")
-        if not isinstance(headers, dict) or not headers:
-            headers = {
-                "Content-Type": "application/json",
-                "X-Shopify-Access-Token": token,
-            }
-        else:
-            headers = dict(headers)
-            headers["X-Shopify-Access-Token"] = token
-            headers.setdefault("Content-Type", "application/json")
-
-        # --- Mongo
-        mongo_db_url = self.data["non_sql_database"]["url"]
-        client = MongoClient(mongo_db_url)
-
-        zoho_db = client["Zoho_Inventory"]
-        store_db = client[store]
-
-        col_items_per_store = zoho_db["items_per_store"]
-        col_zoho_items = zoho_db["items"]
-        col_shopify_products = store_db["products"]
-        col_inventory_levels = store_db["inventory_levels"]
-        now_iso = datetime.now(timezone.utc).isoformat()
+    def _inventory_item_map(self, store: str, client, _log) -> dict:
+        """item_id de Zoho → inventory_item_id de la variante primaria (inventory_map)."""
         # =========================
-        # 1) Getting zoho item_id - shopify_id pair
+        # 1) Getting zoho item_id → inventory_item_id (mapeo materializado)
         # =========================
-        _log("🔎 Step: Getting zoho item_id - shopify_id pair")
+        _log("🔎 Step: Getting zoho item_id → inventory_item_id mapping (inventory_map)")
 
-        link_doc = col_items_per_store.find_one({"store": store}, {"items": 1})
-        if not link_doc or not link_doc.get("items"):
-            _log(f"⚠️ No encontré Zoho_Inventory.items_per_store para store='{store}' o está vacío.")
-            return
-
-        item_to_shopify = {}
-        invalid_links = 0
+        inventory_map = INVENTORY_MAP(client)
+        if not inventory_map.exists(store):
+            mapped = inventory_map.refresh(store)
+            _log(f"   🧱 inventory_map vacío para {store}; construido desde store_links + products: {mapped} variantes")
 
-        for it in link_doc["items"]:
-            item_id = it.get("item_id")
-            shopify_id = it.get("shopify_id")
-
-            if item_id is None or shopify_id is None:
-                invalid_links += 1
-                continue
-
-            item_id = str(item_id)
-
-            # shopify_id might come like {"$numberLong": "..."}
-            if isinstance(shopify_id, dict) and "$numberLong" in shopify_id:
-                try:
-                    shopify_id = int(shopify_id["$numberLong"])
-                except Exception:
-                    invalid_links += 1
-                    continue
-            else:
-                try:
-                    shopify_id = int(shopify_id)
-                except Exception:
-                    invalid_links += 1
-                    continue
-
-            item_to_shopify[item_id] = shopify_id
-
-        _log(f"   ✅ pairs_ok={len(item_to_shopify)} invalid_links={invalid_links}")
-
-        if not item_to_shopify:
-            _log("⚠️ items_per_store existe pero no pude extraer item_id/shopify_id válidos.")
-            return
+        item_to_inv = {
+            m["item_id"]: m["inventory_item_id"]
+            for m in inventory_map.find(store, projection={"item_id": 1, "inventory_item_id": 1})
+        }
+        _log(f"   ✅ mapped_items={len(item_to_inv)}")
 
-        item_ids = list(item_to_shopify.keys())
-        shopify_product_ids = list(set(item_to_shopify.values()))
+        if not item_to_inv:
+            _log(f"⚠️ No hay items con inventory_item_id en Zoho_Inventory.inventory_map para store='{store}'.")
+        return item_to_inv
 
+    def _zoho_stock_index(self, item_ids: list, client, _log, label: str = "") -> dict:
+        """item_id → stock a publicar, en una sola lectura de Zoho_Inventory.items."""
         # =========================
         # 2) Getting zoho items for listed shopify items at {store}
         # =========================
-        _log(f"🔎 Step: Getting zoho items for listed shopify items at {store}")
+        _log(f"🔎 Step: Getting zoho items for listed shopify items at {label}")
 
         item_to_stock = {}
         zoho_found = 0
-        for doc in col_zoho_items.find(
-            {"item_id": {"$in": item_ids}},
-            {"item_id": 1, "actual_available_stock": 1, "available_stock": 1},
-        ):
+        for doc in client["Zoho_Inventory"]["items"].find({"item_id": {"$in": item_ids}}, ZohoItemView.PROJECTION):
             zoho_found += 1
-            iid = str(doc.get("item_id"))
-            stock = doc.get("actual_available_stock", None)
-            if stock is None:
-                stock = doc.get("available_stock", 0)
-
-            try:
-                item_to_stock[iid] = int(stock)
-            except Exception:
-                item_to_stock[iid] = 0
+            item = ZohoItemView.from_doc(doc)
+            item_to_stock[item.item_id] = item.stock
 
         missing_zoho_items = [iid for iid in item_ids if iid not in item_to_stock]
         _log(f"   ✅ zoho_docs_found={zoho_found} missing_zoho_items={len(missing_zoho_items)}")
         if missing_zoho_items:
             _log(f"   ⚠️ sample missing item_ids: {missing_zoho_items[:5]}")
+        return item_to_stock
 
-        # =========================
-        # 3) Getting shopify products (to obtain inventory_item_id)
-        # =========================
-        _log(f"🔎 Step: Getting shopify products for the listed shopify items at {store}")
-
-        pid_to_inv_item = {}
-        products_found = 0
-        products_missing_variant_inv = 0
-
-        for p in col_shopify_products.find(
-            {"id": {"$in": shopify_product_ids}},
-            {"id": 1, "variants.inventory_item_id": 1},
-        ):
-            products_found += 1
-
-            pid = p.get("id")
-            try:
-                pid = int(pid) if not (isinstance(pid, dict) and "$numberLong" in pid) else int(pid["$numberLong"])
-            except Exception:
-                continue
-
-            variants = p.get("variants") or []
-            if not variants or not isinstance(variants, list):
-                products_missing_variant_inv += 1
-                continue
-
-            inv_item_id = variants[0].get("inventory_item_id")
-            if inv_item_id is None:
-                products_missing_variant_inv += 1
-                continue
-
-            if isinstance(inv_item_id, dict) and "$numberLong" in inv_item_id:
-                try:
-                    inv_item_id = int(inv_item_id["$numberLong"])
-                except Exception:
-                    products_missing_variant_inv += 1
-                    continue
-            else:
-                try:
-                    inv_item_id = int(inv_item_id)
-                except Exception:
-                    products_missing_variant_inv += 1
-                    continue
-
-            pid_to_inv_item[pid] = inv_item_id
-
-        missing_products = [pid for pid in shopify_product_ids if pid not in pid_to_inv_item]
-        _log(f"   ✅ shopify_products_found={products_found} inv_item_extracted={len(pid_to_inv_item)} missing_inv_item={len(missing_products)}")
-        if missing_products:
-            _log(f"   ⚠️ sample missing shopify product ids: {missing_products[:5]}")
+    def _plan_inventory_levels(self, store: str, item_to_inv: dict, item_to_stock: dict, client, _log) -> tuple[list, list, dict | None]:
+        """
+        Compara el stock deseado (Zoho) contra el espejo inventory_levels de la ubicación.
+        Devuelve (to_update, to_create, fingerprint) con los payloads en formato inventory_level;
+        fingerprint es la huella del estado deseado, para guardarla si el envío sale limpio.
+        Si la huella guardada es igual no se compara nada; si no, solo los buckets que cambiaron.
+        """
+        location_id = self._inventory_location_id(store)
+        store_conf = (self.data or {}).get(store)
+        fingerprints = INVENTORY_FINGERPRINT.from_store_conf(client, store_conf)
+        policy = INVENTORY_PUBLISH_POLICY.from_store_conf(store_conf)
 
         # =========================
-        # 4) Building templates
+        # 3) Building templates
         # =========================
         _log("🔎 Step: Building templates")
 
-        desired = {}  # inventory_item_id -> desired_qty
-        missing_inv_item_links = 0
-        for item_id, pid in item_to_shopify.items():
-            inv_item_id = pid_to_inv_item.get(pid)
-            if not inv_item_id:
-                missing_inv_item_links += 1
-                continue
+        desired = {}  # inventory_item_id -> desired_qty (ya con la política de publicación de la tienda)
+        for item_id, inv_item_id in item_to_inv.items():
             qty = item_to_stock.get(item_id, 0)
-            desired[inv_item_id] = int(qty)
+            desired[inv_item_id] = policy.publish(qty)
 
-        _log(f"   ✅ templates_built={len(desired)} missing_inv_item_links={missing_inv_item_links}")
+        _log(f"   ✅ templates_built={len(desired)}")
+        if not policy.is_exact:
+            _log(
+                f"   📏 publish policy: mode={policy.mode} exact_below={policy.exact_below} "
+                f"cap={policy.cap} bucket_size={policy.bucket_size} hysteresis={policy.hysteresis}"
+            )
         if desired:
             # show 3 examples
             sample = list(desired.items())[:3]
@@ -1245,52 +2036,47 @@ class INVENTORY_AUTOMATIZATION:
 
         if not desired:
             _log("⚠️ No hay templates que construir (desired vacío).")
-            return
+            return [], [], None
+
+        fingerprint = fingerprints.compute(desired)
+        stored = fingerprints.load(store, location_id)
+        if stored is not None:
+            if stored.get("global") == fingerprint["global"]:
+                _log(f"   ✅ fingerprint sin cambios ({fingerprint['items']} items): no change")
+                return [], [], None
+            changed = fingerprints.changed_buckets(stored, fingerprint)
+            desired = {k: v for k, v in desired.items() if fingerprints.bucket_of(k) in changed}
+            _log(f"   🧬 fingerprint: {len(changed)}/{fingerprints.buckets} buckets cambiaron → comparando {len(desired)} items")
+            if not desired:
+                # solo desaparecieron items (buckets vacíos): no hay nada que escribir
+                return [], [], fingerprint
 
         inv_item_ids = list(desired.keys())
 
         # =========================
-        # 5) Getting shopify inventory_levels for the listed shopify items at {store}
+        # 4) Getting shopify inventory_levels for the listed shopify items at {store}
         # =========================
         _log(f"🔎 Step: Getting shopify inventory_levels for the listed shopify items at {store} (Mongo cache)")
 
         current = {}  # inventory_item_id -> available
         levels_found = 0
 
-        for lvl in col_inventory_levels.find(
+        for lvl in client[store]["inventory_levels"].find(
             {"location_id": int(location_id), "inventory_item_id": {"$in": inv_item_ids}},
-            {"inventory_item_id": 1, "location_id": 1, "available": 1},
+            {"inventory_item_id": 1, "available": 1},
         ):
             levels_found += 1
-            inv_item_id = lvl.get("inventory_item_id")
-
-            if isinstance(inv_item_id, dict) and "$numberLong" in inv_item_id:
-                try:
-                    inv_item_id = int(inv_item_id["$numberLong"])
-                except Exception:
-                    continue
-            else:
-                try:
-                    inv_item_id = int(inv_item_id)
-                except Exception:
-                    continue
-
-            try:
-                current[inv_item_id] = int(lvl.get("available", 0))
-            except Exception:
-                current[inv_item_id] = 0
+            current[lvl["inventory_item_id"]] = int(lvl.get("available") or 0)
 
         _log(f"   ✅ inventory_levels_found={levels_found} current_indexed={len(current)}")
         if levels_found == 0:
             _log("   ⚠️ Ojo: tu cache inventory_levels está vacío para ese location_id. Eso haría que TODO parezca 'to_create'.")
 
         # =========================
-        # 6) Comparing both data + Building inventory_level-like payloads
+        # 5) Comparing both data + Building inventory_level-like payloads
         # =========================
         _log("🔎 Step: Comparing both data")
 
-        now_iso = datetime.now(timezone.utc).isoformat()
-
         to_create = []
         to_update = []
         no_change = []
@@ -1308,8 +2094,8 @@ class INVENTORY_AUTOMATIZATION:
                 # Shopify inventory level not found (in your cache) for this location
                 to_create.append(payload)
             else:
-                # Compare Shopify vs Zoho
-                if int(cur_qty) == int(desired_qty):
+                # Compare Shopify vs Zoho (la histéresis de la política puede dejarlo igual)
+                if not policy.needs_write(cur_qty, desired_qty):
                     no_change.append(payload)
                 else:
                     to_update.append(payload)
@@ -1327,11 +2113,143 @@ class INVENTORY_AUTOMATIZATION:
             _log(f"   🧪 sample to_update payloads: {to_update[:2]}")
         if no_change:
             _log(f"   🧪 sample no_change payloads: {no_change[:2]}")
-        pprint(to_update)
+        _log.debug(lambda: pformat(to_update), category="inventory")
+        return to_update, to_create, fingerprint
+
+    def _save_inventory_fingerprint(self, store: str, fingerprint: dict | None, result: dict, client):
+        """Guarda la huella solo si el envío salió limpio (sin userErrors ni discrepancias)."""
+        if fingerprint is None or not isinstance(result, dict) or result.get("error"):
+            return
+        if result.get("set_error_batches") or result.get("failed_items") or result.get("null_levels"):
+            return
+        if result.get("activated", 0) < result.get("to_create", 0):
+            return
+        INVENTORY_FINGERPRINT.from_store_conf(client, (self.data or {}).get(store)).save(
+            store, self._inventory_location_id(store), fingerprint
+        )
+
+    def run_inventory_sync(self, store: str, logger=None):
+        _log = self.log.bind(logger, "run_inventory_sync")
+        MONGO_INDEX_MANAGER.ensure_once(MONGO_CLIENT_POOL.get_client(self.data), self.data, logger=_log)
+        ID_NORMALIZER.ensure_migrated(MONGO_CLIENT_POOL.get_client(self.data), store, logger=_log)
+
+        _log(f"📦 Sincronizando inventario para {store}...")
+
+        # --- valida la config de Shopify antes de tocar Mongo (el envío la resuelve después)
+        if not isinstance(self.data, dict):
+            raise TypeError(f"self.data debe ser dict, recibí: {type(self.data)}")
+
+        store_conf = self.data.get(store)
+        if not isinstance(store_conf, dict):
+            raise KeyError(
+                f"No encontré config dict para store='{store}' en self.data. "
+                f"Keys disponibles: {list(self.data.keys())}"
+            )
+        if not store_conf.get("access_token") or not store_conf.get("store_name"):
+            raise ValueError(
+                f"Config incompleta para store='{store}'. Requerido: access_token, store_name. "
+                f"Recibí keys: {list(store_conf.keys())}"
+            )
+
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+
+        item_to_inv = self._inventory_item_map(store, client, _log)
+        if not item_to_inv:
+            return
+
+        item_to_stock = self._zoho_stock_index(list(item_to_inv.keys()), client, _log, label=store)
+        to_update, to_create, fingerprint = self._plan_inventory_levels(store, item_to_inv, item_to_stock, client, _log)
         # =========================
         # Send to Shopify GraphQL
         # =========================
-        graphql_endpoint = f"{base}/admin/api/{api_version}/graphql.json"
+        result = self.push_inventory_levels(store, to_update, to_create, logger=logger)
+        self._save_inventory_fingerprint(store, fingerprint, result, client)
+        return result
+
+    def run_inventory_sync_all(self, stores: list | None = None, logger=None) -> dict:
+        """
+        Inventario de varias tiendas en una sola pasada:
+        1) Mapeo inventory_map de cada tienda.
+        2) UNA lectura de stock de Zoho para la unión de items (índice compartido en memoria).
+        3) Plan por tienda contra su espejo inventory_levels.
+        4) Envío concurrente: un hilo por tienda (cada tienda tiene su propio bucket de costo).
+        Los logs de los hilos se acumulan y se emiten desde el hilo principal.
+        """
+        _log = self.log.bind(logger, "run_inventory_sync_all")
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+        MONGO_INDEX_MANAGER.ensure_once(client, self.data, logger=_log)
+        stores = stores or MONGO_INDEX_MANAGER.stores_from_config(self.data)
+
+        maps = {}
+        for store in stores:
+            ID_NORMALIZER.ensure_migrated(client, store, logger=_log)
+            _log(f"📦 Mapeo de inventario para {store}...")
+            item_to_inv = self._inventory_item_map(store, client, _log)
+            if item_to_inv:
+                maps[store] = item_to_inv
+        if not maps:
+            _log("⚠️ Ninguna tienda tiene items mapeados en inventory_map.")
+            return {}
+
+        all_item_ids = list({item_id for item_to_inv in maps.values() for item_id in item_to_inv})
+        item_to_stock = self._zoho_stock_index(all_item_ids, client, _log, label=f"{len(maps)} tiendas")
+
+        plans, fingerprints = {}, {}
+        for store, item_to_inv in maps.items():
+            _log(f"🧮 Plan de inventario para {store}")
+            to_update, to_create, fingerprints[store] = self._plan_inventory_levels(store, item_to_inv, item_to_stock, client, _log)
+            plans[store] = (to_update, to_create)
+
+        store_lines = {store: [] for store in plans}
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(plans)), thread_name_prefix="inventory-store") as pool:
+            futures = {
+                pool.submit(self.push_inventory_levels, store, to_update, to_create, store_lines[store].append): store
+                for store, (to_update, to_create) in plans.items()
+            }
+            pending = set(futures)
+            emitted = {store: 0 for store in plans}
+
+            def _emit_new_lines():
+                for store, lines in store_lines.items():
+                    new_lines = lines[emitted[store]:]
+                    emitted[store] += len(new_lines)
+                    for line in new_lines:
+                        _log(f"[{store}] {line}")
+
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                _emit_new_lines()
+                for fut in done:
+                    store = futures[fut]
+                    try:
+                        results[store] = fut.result()
+                        self._save_inventory_fingerprint(store, fingerprints[store], results[store], client)
+                    except Exception as e:
+                        results[store] = {"error": str(e)}
+                        _log.error(f"❌ {store}: {repr(e)}")
+            _emit_new_lines()
+
+        _log(f"🏁 Inventario multi-tienda: {results}")
+        return results
+
+    def push_inventory_levels(self, store: str, to_update: list, to_create: list | None = None, logger=None) -> dict:
+        """
+        Escribe cantidades "available" en la ubicación de inventario de la tienda.
+        - to_update: [{"inventory_item_id", "location_id", "available"}] con nivel existente.
+        - to_create: mismo formato, sin nivel en la ubicación (se activan antes).
+        Lotes de inventorySetQuantities ajustados por costo + verificación en segundo plano.
+        Lo usan run_inventory_sync y el propagador por change stream.
+        """
+        _log = self.log.bind(logger, "push_inventory_levels")
+        to_create = to_create or []
+        if not to_update and not to_create:
+            _log(f"ℹ️ Sin cantidades por enviar a {store}.")
+            return {"set": 0, "to_create": 0, "activated": 0, "set_error_batches": 0, "ok": 0, "null_levels": 0, "failed_items": 0, "failed_batches": 0}
+
+        store_conf = (self.data or {}).get(store) or {}
+        location_id = self._inventory_location_id(store)
+        gql = SHOPIFY_GRAPHQL.for_store(store, store_conf)
 
         mutation_set = """
         mutation InventorySet($input: InventorySetQuantitiesInput!) {
@@ -1345,201 +2263,191 @@ class INVENTORY_AUTOMATIZATION:
         }
         """
 
-        # We'll verify "available" after each batch
-        # NOTE: quantities(names:["available"]) returns the current value at that location.  [oai_citation:1‡Shopify](https://shopify.dev/docs/api/admin-graphql/latest/queries/inventoryLevel)
-        BATCH_SIZE = 50
+        # Tamaño de lote adaptativo: arranca en inventory_batch_size y se ajusta con el costo real
+        # y el throttleStatus de cada respuesta (hasta el máximo de la API).
+        batcher = GRAPHQL_BATCHER(
+            gql,
+            max_size=self.INVENTORY_SET_MAX_QUANTITIES,
+            initial=store_conf.get("inventory_batch_size", 50),
+        )
         location_gid = f"gid://shopify/Location/{int(location_id)}"
 
-        ok_count = 0
-        mismatch_count = 0
-        error_batches = 0
-
-        for i in range(0, len(to_update), BATCH_SIZE):
-            batch = to_update[i:i + BATCH_SIZE]
+        # Items sin inventoryLevel en la ubicación: primero se activan y luego reciben su
+        # cantidad en el mismo flujo de inventorySetQuantities que los to_update.
+        to_set = list(to_update)
+        activated = set()
+        if to_create:
+            _log(f"🔎 Step: Activating {len(to_create)} inventory items at location {location_id}")
+            activated = self._activate_inventory_levels(
+                gql, location_gid, [d["inventory_item_id"] for d in to_create], store_conf, _log
+            )
+            to_set.extend(d for d in to_create if d["inventory_item_id"] in activated)
+
+        # La verificación ("available" vía nodes(ids:)) corre en otro hilo detrás de las escrituras;
+        # sus mensajes se acumulan y se emiten aquí entre lotes.
+        verify_log = _log.buffered()
+        verifier = INVENTORY_VERIFIER(
+            gql,
+            location_gid,
+            verify_log,
+            max_attempts=store_conf.get("inventory_verify_attempts", 4),
+        )
 
-            # --- 1) Send mutation
-            quantities = [
-                {
-                    "inventoryItemId": f"gid://shopify/InventoryItem/{int(d['inventory_item_id'])}",
-                    "locationId": location_gid,
-                    "quantity": int(d["available"]),
-                }
-                for d in batch
-            ]
+        error_batches = 0
+        batch_no = 0
 
-            variables = {
-                "input": {
-                    "name": "available",
-                    "reason": "correction",
-                    "ignoreCompareQuantity": True,
-                    "quantities": quantities,
+        try:
+            for batch in batcher.batches(to_set):
+                batch_no += 1
+
+                quantities = [
+                    {
+                        "inventoryItemId": f"gid://shopify/InventoryItem/{int(d['inventory_item_id'])}",
+                        "locationId": location_gid,
+                        "quantity": int(d["available"]),
+                    }
+                    for d in batch
+                ]
+
+                variables = {
+                    "input": {
+                        "name": "available",
+                        "reason": "correction",
+                        "ignoreCompareQuantity": True,
+                        "quantities": quantities,
+                    }
                 }
-            }
 
-            resp = requests.post(
-                graphql_endpoint,
-                headers=headers,
-                json={"query": mutation_set, "variables": variables},
-                timeout=60
-            )
-            resp.raise_for_status()
-            j = resp.json()
+                j = gql.execute(mutation_set, variables, estimated_cost=batcher.estimated_cost(len(batch)))
+                next_size = batcher.record(len(batch), j)
+                verify_log.flush()
 
-            user_errors = (
-                j.get("data", {})
-                .get("inventorySetQuantities", {})
-                .get("userErrors", [])
-            )
-            if user_errors:
-                error_batches += 1
-                _log(f"❌ Set batch {(i//BATCH_SIZE)+1}: userErrors={user_errors}")
-                # You can continue or stop; I continue so you see all errors
-                continue
-
-            _log(f"✅ Set batch {(i//BATCH_SIZE)+1}: sent {len(batch)} quantities")
-
-            # --- 2) Verify by querying inventoryItem.inventoryLevel(locationId).  [oai_citation:2‡Shopify](https://shopify.dev/docs/api/admin-graphql/latest/queries/inventoryItem?utm_source=chatgpt.com)
-            # Build a single query with aliases i0, i1, ... so we verify the whole batch in one call.
-            desired_by_gid = {f"gid://shopify/InventoryItem/{int(d['inventory_item_id'])}": int(d["available"]) for d in batch}
-
-            # We’ll allow a tiny retry in case of short propagation delay
-            verified = False
-            last_result = None
-
-            for attempt in range(1, 4):
-                parts = []
-                for idx, inv_gid in enumerate(desired_by_gid.keys()):
-                    parts.append(f'''
-                    i{idx}: inventoryItem(id: "{inv_gid}") {{
-                        id
-                        inventoryLevel(locationId: "{location_gid}") {{
-                        updatedAt
-                        quantities(names: ["available"]) {{
-                            name
-                            quantity
-                        }}
-                        }}
-                    }}
-                    ''')
-
-                query_verify = "query VerifyBatch {\n" + "\n".join(parts) + "\n}"
-
-                vresp = requests.post(
-                    graphql_endpoint,
-                    headers=headers,
-                    json={"query": query_verify},
-                    timeout=60
+                user_errors = (
+                    j.get("data", {})
+                    .get("inventorySetQuantities", {})
+                    .get("userErrors", [])
                 )
-                vresp.raise_for_status()
-                vj = vresp.json()
-                last_result = vj
-
-                data = vj.get("data", {}) if isinstance(vj, dict) else {}
-                # If data is empty, retry
-                if not data:
-                    time.sleep(1 * attempt)
+                if user_errors:
+                    error_batches += 1
+                    _log(f"❌ Set batch {batch_no}: userErrors={user_errors}")
+                    # You can continue or stop; I continue so you see all errors
                     continue
 
-                # Compare results
-                mismatches = []
-                null_levels = []
-                matches = 0
-
-                for idx, inv_gid in enumerate(desired_by_gid.keys()):
-                    node = data.get(f"i{idx}")
-                    if not node:
-                        mismatches.append((inv_gid, "missing_node", desired_by_gid[inv_gid]))
-                        continue
-
-                    lvl = node.get("inventoryLevel")
-                    if lvl is None:
-                        # This usually means not stocked/activated at that location -> you may need inventoryActivate.  [oai_citation:3‡Shopify](https://shopify.dev/docs/api/admin-graphql/latest/objects/InventoryLevel)
-                        null_levels.append(inv_gid)
-                        continue
-
-                    q_list = lvl.get("quantities") or []
-                    # find "available"
-                    got = None
-                    for q in q_list:
-                        if q.get("name") == "available":
-                            got = q.get("quantity")
-                            break
-
-                    want = desired_by_gid[inv_gid]
-                    if got is None:
-                        mismatches.append((inv_gid, "missing_available", want))
-                    elif int(got) == int(want):
-                        matches += 1
-                    else:
-                        mismatches.append((inv_gid, int(got), want))
-
-                if null_levels:
-                    _log(f"⚠️ Verify batch {(i//BATCH_SIZE)+1}: {len(null_levels)} items returned inventoryLevel=null (likely not activated at this location).")
+                cost = ((j.get("extensions") or {}).get("cost") or {}).get("actualQueryCost")
+                _log(f"✅ Set batch {batch_no}: sent {len(batch)} quantities (cost={cost}, next_batch={next_size})")
 
-                if mismatches:
-                    # retry a bit (sometimes values lag for a second)
-                    time.sleep(1 * attempt)
-                    continue
+                verifier.submit(batch_no, {q["inventoryItemId"]: q["quantity"] for q in quantities})
+        finally:
+            summary = verifier.close()
+            verify_log.flush()
 
-                # all good
-                verified = True
-                ok_count += matches
-                _log(f"✅ Verify batch {(i//BATCH_SIZE)+1}: ok={matches}/{len(batch)}")
-                break
+        # write-through: lo confirmado por el verificador pasa directo al espejo inventory_levels
+        self._mirror_inventory_levels(store, location_id, verifier.confirmed, MONGO_CLIENT_POOL.get_client(self.data), _log)
 
-            if not verified:
-                # On last attempt, report mismatches (small sample)
-                mismatch_count += len(batch)
-                _log(f"❌ Verify batch {(i//BATCH_SIZE)+1}: mismatches remain after retries. Sample:")
-                # Print at most 5 mismatches so logs are readable
-                try:
-                    # Recompute mismatches from last_result for printing (quick & safe)
-                    data = (last_result or {}).get("data", {})
-                    shown = 0
-                    for idx, inv_gid in enumerate(desired_by_gid.keys()):
-                        if shown >= 5:
-                            break
-                        node = data.get(f"i{idx}", {})
-                        lvl = node.get("inventoryLevel")
-                        want = desired_by_gid[inv_gid]
-                        if lvl is None:
-                            _log(f"   - {inv_gid}: inventoryLevel=null, want={want}")
-                            shown += 1
-                            continue
-                        got = None
-                        for q in (lvl.get("quantities") or []):
-                            if q.get("name") == "available":
-                                got = q.get("quantity")
-                                break
-                        _log(f"   - {inv_gid}: got={got} want={want}")
-                        shown += 1
-                except Exception:
-                    pass
+        _log(
+            f"🏁 Done: verified_ok={summary['ok']}, set_error_batches={error_batches}, "
+            f"verify_failed_batches={summary['failed_batches']}, verify_failed_items={summary['failed_items']}, "
+            f"inventory_level_null={summary['null_levels']}"
+        )
+        return {"set": len(to_set), "to_create": len(to_create), "activated": len(activated), "set_error_batches": error_batches, **summary}
 
-        _log(f"🏁 Done: verified_ok≈{ok_count}, verify_failed_batches={error_batches}, verify_failed_items≈{mismatch_count}")    
-        
     def run_product_sync(self, store: str, logger=None):
         """
         Orquesta:
+        0) Reanudar jobs pendientes de la bitácora.
         1) Construir payloads de creación/actualización/desactivación.
-        2) Enviar a Shopify.
+        2) Enviar a Shopify (por ventanas si la tienda tiene 'plan_chunk_size').
         3) Guardar vínculos Zoho <-> Shopify al crear.
         """
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))
+        _log = self.log.bind(logger, "run_product_sync")
+
+        MONGO_INDEX_MANAGER.ensure_once(MONGO_CLIENT_POOL.get_client(self.data), self.data, logger=_log)
+        ID_NORMALIZER.ensure_migrated(MONGO_CLIENT_POOL.get_client(self.data), store, logger=_log)
+
+        # 0) terminar lo que haya quedado a medias en una corrida anterior
+        resumed = self.resume_pending_jobs(store, logger=logger)
+
+        products_to_create = self.shopify_create_items(store, logger=logger, skip_item_ids=self._resumed_item_ids(resumed))
+
+        # catálogos grandes: 'plan_chunk_size' en el YAML → planear y enviar por ventanas
+        if self.data[store].get("plan_chunk_size"):
+            self.shopify_update_items_chunked(store, logger=logger)
+            return
 
-        products_to_create = self.shopify_create_items(store, logger=logger)
-        
         products_to_update = self.shopify_update_items(store, logger=logger)    
             
         if products_to_update:
             self.send_workload_to_shopify_api(products_to_update, store, logger=logger)
         else:
-            print("ℹ️ No hay actualizaciones por enviar.")
-            
+            _log("ℹ️ No hay actualizaciones por enviar.")
+
+    def run_full_sync(self, store: str, logger=None) -> dict:
+        """
+        Productos + inventario de una tienda con UNA sola carga de datos.
+        run_product_sync y run_inventory_sync leían cada uno store_links, Zoho items y los
+        productos de la tienda. Aquí:
+        0) Reanudar jobs pendientes de la bitácora.
+        1) Carga única: store_links + Zoho_Inventory.items + {store}.products.
+        2) Plan de catálogo (crear / actualizar / archivar) con esos datos.
+        3) Plan de stock con el mismo índice de Zoho (sin releer items).
+        4) Ejecución en un solo flujo: creación → actualizaciones → stock; todo pasa por el
+           limitador REST y el cliente GraphQL de la tienda (mismo presupuesto de costo).
+        """
+        _log = self.log.bind(logger, "run_full_sync")
+        client = MONGO_CLIENT_POOL.get_client(self.data)
+
+        MONGO_INDEX_MANAGER.ensure_once(client, self.data, logger=_log)
+        ID_NORMALIZER.ensure_migrated(client, store, logger=_log)
+
+        # 0) terminar lo que haya quedado a medias en una corrida anterior
+        resumed = self.resume_pending_jobs(store, logger=logger)
+
+        store_links = STORE_LINKS(client)
+        if not store_links.exists(store):
+            _log(f"❌ No existen vínculos en store_links para store={store}")
+            return {}
+
+        # 1) carga única
+        _log(f"📥 Carga única para {store}: store_links + Zoho items + productos")
+        bridge_items = store_links.get_links(store)
+        zoho_by_id = self._zoho_items_by_id(client)
+        shopify_by_id = self._store_products_by_id(client, store)
+        _log(f"   ✅ links={len(bridge_items)} zoho_items={len(zoho_by_id)} shopify_products={len(shopify_by_id)}")
+
+        # 2) catálogo: los creados se linkean (store_links, products, inventory_map) al terminar cada lote
+        created = self.shopify_create_items(
+            store, logger=logger, bridge_items=bridge_items, zoho_by_id=zoho_by_id,
+            skip_item_ids=self._resumed_item_ids(resumed),
+        )
+        products_to_update = self.shopify_update_items(
+            store,
+            logger=logger,
+            bridge_items=[link for link in bridge_items if link.get("shopify_id") is not None],
+            zoho_by_id=zoho_by_id,
+            shopify_by_id=shopify_by_id,
+        )
+        if products_to_update:
+            self.send_workload_to_shopify_api(products_to_update, store, logger=logger)
+        else:
+            _log("ℹ️ No hay actualizaciones por enviar.")
+
+        # 3) stock con el mismo índice de Zoho (incluye los productos recién creados)
+        item_to_inv = self._inventory_item_map(store, client, _log)
+        inventory_result = {}
+        if item_to_inv:
+            item_to_stock = {
+                item_id: self.zoho_available_stock(zoho_by_id[item_id])
+                for item_id in item_to_inv
+                if item_id in zoho_by_id
+            }
+            to_update, to_create, fingerprint = self._plan_inventory_levels(store, item_to_inv, item_to_stock, client, _log)
+            inventory_result = self.push_inventory_levels(store, to_update, to_create, logger=logger)
+            self._save_inventory_fingerprint(store, fingerprint, inventory_result, client)
+
+        summary = {"created": len(created), "updated": len(products_to_update), "inventory": inventory_result}
+        _log(f"🏁 Sync completo {store}: {summary}")
+        return summary
+
 
 
 if __name__ == "__main__":
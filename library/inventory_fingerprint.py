@@ -0,0 +1,109 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+
+class INVENTORY_FINGERPRINT:
+    """
+    Huella compacta de las cantidades deseadas de una tienda/ubicación.
+
+    La mayoría de las corridas programadas terminan en to_update=0 después de leer el
+    espejo inventory_levels y comparar todo. Aquí se guarda, tras cada corrida limpia
+    (sin userErrors ni discrepancias de verificación), un hash por bucket de inventory
+    items más un hash global:
+    - hash global igual → no hay nada que comparar ni enviar.
+    - hash global distinto → solo se comparan los items de los buckets cuyo hash cambió.
+
+    La huella describe lo que se publicó, no lo que hay en Shopify: si alguien cambia el
+    stock directo en Shopify no se detecta hasta que expira (max_age_hours) y se hace una
+    comparación completa.
+
+    Colección: management.inventory_fingerprints
+    {
+        "_id": "managed_store_one:108620087615",
+        "buckets_n": 256,
+        "global": "9f1c...",
+        "buckets": {"0": "a1b2...", "1": "...", ...},
+        "items": 1234,
+        "updated_at": datetime
+    }
+    """
+
+    DB_NAME = "management"
+    COLLECTION = "inventory_fingerprints"
+    DEFAULT_BUCKETS = 256
+    DEFAULT_MAX_AGE_HOURS = 24
+
+    def __init__(self, client, buckets: int = DEFAULT_BUCKETS, max_age_hours: float = DEFAULT_MAX_AGE_HOURS):
+        self.collection = client[self.DB_NAME][self.COLLECTION]
+        self.buckets = max(1, int(buckets))
+        self.max_age_hours = float(max_age_hours)
+
+    @classmethod
+    def from_store_conf(cls, client, store_conf: dict) -> "INVENTORY_FINGERPRINT":
+        store_conf = store_conf or {}
+        return cls(
+            client,
+            buckets=store_conf.get("inventory_fingerprint_buckets", cls.DEFAULT_BUCKETS),
+            max_age_hours=store_conf.get("inventory_fingerprint_max_age_hours", cls.DEFAULT_MAX_AGE_HOURS),
+        )
+
+    @staticmethod
+    def _key(store: str, location_id) -> str:
+        return f"{store}:{int(location_id)}"
+
+    def bucket_of(self, inv_item_id) -> int:
+        return int(inv_item_id) % self.buckets
+
+    def compute(self, desired: dict) -> dict:
+        """{inventory_item_id: qty} → {"global", "buckets": {str(bucket): hash}, "items"}."""
+        grouped: dict = {}
+        for inv_item_id, qty in desired.items():
+            grouped.setdefault(self.bucket_of(inv_item_id), []).append((int(inv_item_id), int(qty)))
+
+        buckets = {}
+        for bucket, pairs in grouped.items():
+            h = hashlib.blake2b(digest_size=8)
+            for inv_item_id, qty in sorted(pairs):
+                h.update(f"{inv_item_id}:{qty};".encode())
+            buckets[str(bucket)] = h.hexdigest()
+
+        g = hashlib.blake2b(digest_size=16)
+        for bucket in sorted(buckets, key=int):
+            g.update(f"{bucket}={buckets[bucket]};".encode())
+        return {"global": g.hexdigest(), "buckets": buckets, "items": len(desired)}
+
+    def load(self, store: str, location_id) -> dict | None:
+        """Huella guardada vigente (None si no hay, expiró o se cambió el número de buckets)."""
+        doc = self.collection.find_one({"_id": self._key(store, location_id)})
+        if not doc or doc.get("buckets_n") != self.buckets:
+            return None
+        updated_at = doc.get("updated_at")
+        if updated_at is not None:
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - updated_at > timedelta(hours=self.max_age_hours):
+                return None
+        return doc
+
+    @staticmethod
+    def changed_buckets(stored: dict, current: dict) -> set:
+        old, new = stored.get("buckets") or {}, current.get("buckets") or {}
+        return {int(b) for b in set(old) | set(new) if old.get(b) != new.get(b)}
+
+    def save(self, store: str, location_id, fingerprint: dict):
+        self.collection.update_one(
+            {"_id": self._key(store, location_id)},
+            {"$set": {
+                "store": store,
+                "location_id": int(location_id),
+                "buckets_n": self.buckets,
+                "global": fingerprint["global"],
+                "buckets": fingerprint["buckets"],
+                "items": fingerprint.get("items", 0),
+                "updated_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+
+    def clear(self, store: str, location_id):
+        self.collection.delete_one({"_id": self._key(store, location_id)})
@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+from library.store_links import STORE_LINKS
+from library.id_normalizer import ID_NORMALIZER
+from library.sync_models import ShopifyProductView
+
+
+class INVENTORY_MAP:
+    """
+    Mapeo materializado Zoho item → variante de Shopify → inventory_item_id.
+
+    run_inventory_sync re-derivaba en cada corrida la cadena
+    store_links → {store}.products → variants[0].inventory_item_id (tres consultas y
+    coerciones de ids). Aquí se guarda ya resuelta y se mantiene al ingerir:
+    - SHOPIFY_MONGODB.sync_shopify_to_mongo refresca los productos que trae de Shopify.
+    - _link_created_products refresca los productos recién creados y linkeados.
+    - Al retirar items de una tienda se borran sus filas (remove_items).
+
+    Colección: Zoho_Inventory.inventory_map (un documento por variante)
+    {
+        "store": "managed_store_one",
+        "item_id": "1072824000000295013",    # Zoho (str)
+        "product_id": 8123456789,            # Shopify (Int64, igual que variant_id e inventory_item_id)
+        "variant_id": 4412345678901,
+        "inventory_item_id": 4623456789012,
+        "sku": "ABC-123",
+        "position": 1,
+        "primary": True,                     # la variante que recibe el stock del item de Zoho
+        "updated_at": datetime
+    }
+    primary = la variante cuyo SKU coincide con el del item de Zoho (o la primera si ninguna coincide).
+    """
+
+    DB_NAME = "Zoho_Inventory"
+    COLLECTION = "inventory_map"
+    INDEXES = [
+        ([("store", ASCENDING), ("variant_id", ASCENDING)], {"unique": True}),
+        ([("store", ASCENDING), ("primary", ASCENDING), ("item_id", ASCENDING)], {}),
+        ([("store", ASCENDING), ("inventory_item_id", ASCENDING)], {}),
+        ([("store", ASCENDING), ("product_id", ASCENDING)], {}),
+    ]
+
+    def __init__(self, client):
+        self.client = client
+        self.collection = client[self.DB_NAME][self.COLLECTION]
+
+    def ensure_indexes(self):
+        for keys, options in self.INDEXES:
+            self.collection.create_index(keys, **options)
+
+    # -------------------------
+    # Lecturas
+    # -------------------------
+    def exists(self, store: str) -> bool:
+        return self.collection.count_documents({"store": store}, limit=1) > 0
+
+    def find(self, store: str, primary_only: bool = True, projection: dict | None = None):
+        query = {"store": store}
+        if primary_only:
+            query["primary"] = True
+        proj = {"_id": 0, **(projection or {})} if projection else {"_id": 0}
+        return self.collection.find(query, proj)
+
+    # -------------------------
+    # Mantenimiento
+    # -------------------------
+    def refresh(self, store: str, product_ids: list | None = None) -> int:
+        """
+        Reconstruye las filas de la tienda a partir de store_links + {store}.products.
+        - product_ids=None → toda la tienda (y borra filas de vínculos que ya no existen).
+        - product_ids=[...] → solo esos productos (incremental).
+        Devuelve cuántas variantes quedaron mapeadas.
+        """
+        link_filter = {"item_id": {"$exists": True}, "shopify_id": {"$ne": None}}
+        wanted = None
+        if product_ids is not None:
+            wanted = [pid for pid in (ID_NORMALIZER.to_int64(x) for x in product_ids) if pid is not None]
+            if not wanted:
+                return 0
+            link_filter["shopify_id"] = {"$in": wanted}
+
+        # ids canónicos (Int64 / str) desde la ingesta: sin coerciones aquí
+        pid_to_item = {
+            link["shopify_id"]: link["item_id"]
+            for link in STORE_LINKS(self.client).find(store, link_filter, {"item_id": 1, "shopify_id": 1})
+        }
+
+        item_to_sku = {}
+        if pid_to_item:
+            for doc in self.client["Zoho_Inventory"]["items"].find(
+                {"item_id": {"$in": list(set(pid_to_item.values()))}},
+                {"_id": 0, "item_id": 1, "sku": 1},
+            ):
+                item_to_sku[doc.get("item_id")] = doc.get("sku")
+
+        now = datetime.now(timezone.utc)
+        ops, seen_variants = [], []
+        products = self.client[store]["products"].find(
+            {"id": {"$in": list(pid_to_item.keys())}}, ShopifyProductView.PROJECTION,
+        ) if pid_to_item else []
+
+        for doc in products:
+            product = ShopifyProductView.from_doc(doc)
+            item_id = pid_to_item.get(product.id)
+            if item_id is None:
+                continue
+
+            primary = product.primary_variant(item_to_sku.get(item_id))
+            if primary is None:
+                continue
+
+            for v in product.variants:
+                if v.id is None or v.inventory_item_id is None:
+                    continue
+                seen_variants.append(v.id)
+                ops.append(UpdateOne(
+                    {"store": store, "variant_id": v.id},
+                    {"$set": {
+                        "variant_id": v.id,
+                        "inventory_item_id": v.inventory_item_id,
+                        "sku": v.sku,
+                        "position": v.position,
+                        "store": store,
+                        "item_id": item_id,
+                        "product_id": product.id,
+                        "primary": v is primary,
+                        "updated_at": now,
+                    }},
+                    upsert=True,
+                ))
+
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+        # filas viejas: variantes borradas, productos deslinkeados, vínculos retirados
+        stale = {"store": store, "variant_id": {"$nin": seen_variants}}
+        if wanted is not None:
+            stale["product_id"] = {"$in": wanted}
+        self.collection.delete_many(stale)
+        return len(seen_variants)
+
+    def remove_items(self, store: str, item_ids: list) -> int:
+        if not item_ids:
+            return 0
+        return self.collection.delete_many(
+            {"store": store, "item_id": {"$in": [ID_NORMALIZER.to_item_id(x) for x in item_ids]}}
+        ).deleted_count
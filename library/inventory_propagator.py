@@ -0,0 +1,256 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import yaml
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure, PyMongoError
+
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.index_manager import MONGO_INDEX_MANAGER
+from library.inventory_map import INVENTORY_MAP
+from library.inventory_automatization import INVENTORY_AUTOMATIZATION
+from library.inventory_publish_policy import INVENTORY_PUBLISH_POLICY
+from library.sync_logger import SYNC_LOGGER
+
+
+class INVENTORY_PROPAGATOR:
+    """
+    Propagación casi en tiempo real del stock de Zoho a las tiendas.
+
+    En lugar de esperar a que alguien corra el pipeline "NIVELES DE INVENTARIO" (pull
+    completo de Zoho + Shopify + comparación), este proceso de larga duración escucha un
+    change stream de Zoho_Inventory.items filtrado a cambios de actual_available_stock /
+    available_stock, junta los cambios durante una ventana corta (debounce) y manda solo
+    esos inventory items a cada tienda que los lista (inventory_map → push_inventory_levels).
+
+    - Requiere replica set (los change streams no existen en un mongod standalone).
+    - El resume token se guarda en management.change_stream_tokens después de cada envío,
+      así un reinicio continúa donde se quedó. Si el token ya no está en el oplog, se
+      arranca desde "ahora" y conviene correr un run_inventory_sync completo.
+    - Si una tienda falla (HTTP de Shopify, config incompleta...), el lote se conserva, el
+      token no avanza y se reintenta con espera creciente (retry_seconds, hasta
+      max_retry_seconds). Reenviar a las tiendas que sí pasaron es inofensivo: se manda la
+      cantidad absoluta.
+
+    Configuración opcional en el YAML:
+
+    inventory_propagator:
+      debounce_seconds: 2       # ventana para juntar cambios
+      max_pending: 1000         # envía antes si se juntan tantos items
+      retry_seconds: 5          # espera inicial tras un envío fallido (se duplica)
+      max_retry_seconds: 300
+      stores: [managed_store_one, managed_store_two]   # default: todas las tiendas del YAML
+    """
+
+    TOKEN_DB = "management"
+    TOKEN_COLLECTION = "change_stream_tokens"
+    TOKEN_ID = "inventory_propagator"
+    STOCK_FIELDS = ("actual_available_stock", "available_stock")
+
+    # códigos de Mongo: NotAReplicaSet... / ChangeStreamHistoryLost
+    CHANGE_STREAM_UNSUPPORTED = (40573,)
+    CHANGE_STREAM_HISTORY_LOST = (286, 280)
+
+    def __init__(self, working_folder, yaml_data):
+        self.working_folder = working_folder
+        self.data = yaml_data
+        self.log = SYNC_LOGGER.from_config(self.data)
+        conf = (self.data or {}).get("inventory_propagator") or {}
+        self.debounce_seconds = float(conf.get("debounce_seconds", 2.0))
+        self.max_pending = int(conf.get("max_pending", 1000))
+        self.retry_seconds = float(conf.get("retry_seconds", 5.0))
+        self.max_retry_seconds = float(conf.get("max_retry_seconds", 300.0))
+        self.stores = conf.get("stores") or MONGO_INDEX_MANAGER.stores_from_config(self.data)
+        self.client = MONGO_CLIENT_POOL.get_client(self.data)
+        self.inventory = INVENTORY_AUTOMATIZATION(working_folder, yaml_data)
+
+    @classmethod
+    def pipeline(cls) -> list:
+        """Solo inserts/replaces y updates que tocan algún campo de stock."""
+        return [{"$match": {"$or": [
+            {"operationType": {"$in": ["insert", "replace"]}},
+            *[
+                {"operationType": "update", f"updateDescription.updatedFields.{field}": {"$exists": True}}
+                for field in cls.STOCK_FIELDS
+            ],
+        ]}}]
+
+    # -------------------------
+    # Resume token
+    # -------------------------
+    def _tokens(self):
+        return self.client[self.TOKEN_DB][self.TOKEN_COLLECTION]
+
+    def _load_token(self):
+        doc = self._tokens().find_one({"_id": self.TOKEN_ID}, {"token": 1})
+        return (doc or {}).get("token")
+
+    def _save_token(self, token):
+        if token is None:
+            return
+        self._tokens().update_one(
+            {"_id": self.TOKEN_ID},
+            {"$set": {"token": token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    # -------------------------
+    # Envío
+    # -------------------------
+    def propagate(self, item_stock: dict, logger=None) -> dict:
+        """
+        {item_id: stock} → inventorySetQuantities en cada tienda que lista esos items.
+        Se manda todo lo que cambió en Zoho (el espejo inventory_levels puede ir atrasado);
+        solo se usa para saber qué items no tienen nivel en la ubicación (se activan).
+        Un error en una tienda no detiene a las demás: su resultado queda como
+        {"error": ..., "failed": True}.
+        """
+        _log = self.log.bind(logger, "propagate")
+        item_ids = list(item_stock.keys())
+        inventory_map = INVENTORY_MAP(self.client)
+        results = {}
+
+        for store in self.stores:
+            try:
+                results[store] = self._propagate_store(store, item_stock, item_ids, inventory_map, _log, logger)
+            except Exception as e:
+                _log.error(f"❌ {store}: no se pudo propagar el stock ({repr(e)})")
+                results[store] = {"error": repr(e), "failed": True}
+        return results
+
+    def _propagate_store(self, store: str, item_stock: dict, item_ids: list, inventory_map, _log, logger) -> dict | None:
+        policy = INVENTORY_PUBLISH_POLICY.from_store_conf((self.data or {}).get(store))
+        desired = {}
+        for row in inventory_map.collection.find(
+            {"store": store, "primary": True, "item_id": {"$in": item_ids}},
+            {"_id": 0, "item_id": 1, "inventory_item_id": 1},
+        ):
+            desired[row["inventory_item_id"]] = policy.publish(item_stock[row["item_id"]])
+        if not desired:
+            return None
+
+        location_id = self.inventory._inventory_location_id(store)
+        existing = {
+            lvl["inventory_item_id"]
+            for lvl in self.client[store]["inventory_levels"].find(
+                {"location_id": location_id, "inventory_item_id": {"$in": list(desired.keys())}},
+                {"_id": 0, "inventory_item_id": 1},
+            )
+        }
+
+        to_update, to_create = [], []
+        for inv_item_id, qty in desired.items():
+            payload = {"inventory_item_id": int(inv_item_id), "location_id": location_id, "available": int(qty)}
+            (to_update if inv_item_id in existing else to_create).append(payload)
+
+        _log(f"📤 {store}: {len(desired)} inventory items (update={len(to_update)}, activar={len(to_create)})")
+        return self.inventory.push_inventory_levels(store, to_update, to_create, logger=logger)
+
+    def _try_propagate(self, pending: dict, _log, logger) -> bool:
+        """propagate sin dejar escapar excepciones; False si alguna tienda falló."""
+        try:
+            results = self.propagate(pending, logger=logger)
+        except Exception as e:
+            _log.error(f"❌ Falló la propagación de {len(pending)} items ({repr(e)})")
+            return False
+        return not any(isinstance(r, dict) and r.get("failed") for r in results.values())
+
+    # -------------------------
+    # Loop principal
+    # -------------------------
+    def run(self, logger=None, stop_event: threading.Event | None = None):
+        """Escucha el change stream hasta que stop_event se active (o Ctrl+C)."""
+        _log = self.log.bind(logger, "inventory_propagator")
+        stop_event = stop_event or threading.Event()
+        items = self.client["Zoho_Inventory"]["items"]
+        token = self._load_token()
+        _log(f"👂 Escuchando cambios de stock en Zoho_Inventory.items → {self.stores} (debounce={self.debounce_seconds}s)")
+
+        while not stop_event.is_set():
+            try:
+                with items.watch(
+                    self.pipeline(),
+                    full_document="updateLookup",
+                    resume_after=token,
+                    max_await_time_ms=int(min(self.debounce_seconds, 1.0) * 1000),
+                ) as stream:
+                    token = self._consume(stream, token, stop_event, _log, logger)
+            except OperationFailure as e:
+                if e.code in self.CHANGE_STREAM_UNSUPPORTED:
+                    _log.error(f"❌ Change streams requieren replica set: {e}")
+                    raise
+                if e.code in self.CHANGE_STREAM_HISTORY_LOST and token is not None:
+                    _log.warning("⚠️ El resume token ya no está en el oplog; arranco desde ahora. Corre un run_inventory_sync completo.")
+                    token = None
+                    self._tokens().delete_one({"_id": self.TOKEN_ID})
+                    continue
+                raise
+            except PyMongoError as e:
+                # caída de red / elección de primario: se reanuda con el último token guardado
+                _log.warning(f"⚠️ Change stream interrumpido ({e}); reintento en 5s")
+                stop_event.wait(5)
+        _log("🛑 Propagador detenido.")
+
+    def _consume(self, stream, token, stop_event, _log, logger):
+        pending, first_at = {}, None
+        failures = 0
+        while not stop_event.is_set():
+            change = stream.try_next()
+            if change is not None:
+                doc = change.get("fullDocument") or {}
+                item_id = doc.get("item_id")
+                if item_id is not None:
+                    pending[str(item_id)] = self.inventory.zoho_available_stock(doc)
+                    first_at = first_at or time.monotonic()
+
+            if pending and (time.monotonic() - first_at >= self.debounce_seconds or len(pending) >= self.max_pending):
+                _log(f"🔄 {len(pending)} items de Zoho con stock nuevo")
+                if not self._try_propagate(pending, _log, logger):
+                    # se conserva el lote (y se le suman los cambios que lleguen) sin avanzar el token
+                    failures += 1
+                    wait = min(self.retry_seconds * 2 ** (failures - 1), self.max_retry_seconds)
+                    _log.warning(f"⚠️ Reintento de {len(pending)} items en {wait:g}s (intento {failures})")
+                    stop_event.wait(wait)
+                    continue
+                failures = 0
+                pending, first_at = {}, None
+                token = stream.resume_token
+                self._save_token(token)
+            elif not pending and change is None and stream.resume_token is not None:
+                # sin cambios pendientes: avanzar el token para no re-leer eventos filtrados
+                token = stream.resume_token
+
+        # al detener: lo pendiente se manda antes de salir (si falla, el token guardado lo re-lee al reiniciar)
+        if pending and self._try_propagate(pending, _log, logger):
+            token = stream.resume_token
+            self._save_token(token)
+        return token
+
+
+if __name__ == "__main__":
+    BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if BASE_PATH not in sys.path:
+        sys.path.insert(0, BASE_PATH)
+    env_file = os.path.join(BASE_PATH, ".env")
+    if os.path.exists(env_file):
+        load_dotenv(dotenv_path=env_file)
+    working_folder = os.getenv("MAIN_PATH") or os.getcwd()
+
+    yaml_data = {}
+    for path in (os.path.join(BASE_PATH, "config", "open_config.yml"), os.path.join(working_folder, "config.yml")):
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                yaml_data.update(yaml.safe_load(f) or {})
+            print(f"✅ Configuración cargada: {path}")
+    if not yaml_data:
+        print("❌ No se encontró ningún archivo de configuración.")
+        sys.exit(1)
+
+    propagator = INVENTORY_PROPAGATOR(working_folder, yaml_data)
+    try:
+        propagator.run()
+    except KeyboardInterrupt:
+        print("🛑 Interrumpido por el usuario.")
@@ -0,0 +1,73 @@
+class INVENTORY_PUBLISH_POLICY:
+    """
+    Política de publicación de stock por tienda.
+
+    Cada unidad que cambiaba en Zoho se volvía una escritura en Shopify, aunque al
+    escaparate le da igual si un SKU con mucho stock muestra 480 o 479. Con esta política:
+    - Por debajo de exact_below se publica la cantidad exacta.
+    - Por arriba, según mode:
+        cap    → se publica min(cantidad, cap)
+        bucket → se redondea hacia abajo a múltiplos de bucket_size (nunca por debajo de exact_below)
+    - hysteresis (opcional): arriba del umbral no se reescribe si el valor publicado y el
+      nuevo difieren en menos de hysteresis unidades.
+
+    Configuración opcional por tienda en el YAML (sin la llave = cantidades exactas):
+
+    managed_store_one:
+      inventory_publish:
+        exact_below: 20
+        mode: cap            # cap | bucket | exact
+        cap: 50
+        bucket_size: 10
+        hysteresis: 5
+    """
+
+    MODES = ("exact", "cap", "bucket")
+
+    def __init__(self, exact_below: int | None = None, mode: str = "exact", cap: int | None = None,
+                 bucket_size: int | None = None, hysteresis: int = 0):
+        mode = str(mode or "exact").lower()
+        if mode not in self.MODES:
+            raise ValueError(f"inventory_publish.mode inválido: {mode!r}. Opciones: {self.MODES}")
+        if mode == "cap" and cap is None:
+            raise ValueError("inventory_publish.mode=cap requiere 'cap'.")
+        if mode == "bucket" and not bucket_size:
+            raise ValueError("inventory_publish.mode=bucket requiere 'bucket_size'.")
+        self.mode = mode
+        self.exact_below = int(exact_below) if exact_below is not None else 0
+        self.cap = max(int(cap), self.exact_below) if cap is not None else None
+        self.bucket_size = int(bucket_size) if bucket_size else None
+        self.hysteresis = max(0, int(hysteresis or 0))
+
+    @classmethod
+    def from_store_conf(cls, store_conf: dict | None) -> "INVENTORY_PUBLISH_POLICY":
+        conf = (store_conf or {}).get("inventory_publish") or {}
+        return cls(
+            exact_below=conf.get("exact_below"),
+            mode=conf.get("mode", "exact"),
+            cap=conf.get("cap"),
+            bucket_size=conf.get("bucket_size"),
+            hysteresis=conf.get("hysteresis", 0),
+        )
+
+    @property
+    def is_exact(self) -> bool:
+        return self.mode == "exact" and not self.hysteresis
+
+    def publish(self, qty: int) -> int:
+        """Cantidad a publicar para el stock real qty."""
+        qty = int(qty)
+        if self.mode == "exact" or qty < self.exact_below:
+            return qty
+        if self.mode == "cap":
+            return min(qty, self.cap)
+        return max(self.exact_below, qty - qty % self.bucket_size)
+
+    def needs_write(self, current: int, desired: int) -> bool:
+        """¿Hay que escribir desired si Shopify muestra current? (aplica la histéresis)."""
+        current, desired = int(current), int(desired)
+        if current == desired:
+            return False
+        if self.hysteresis and current >= self.exact_below and desired >= self.exact_below:
+            return abs(current - desired) >= self.hysteresis
+        return True
@@ -0,0 +1,188 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class INVENTORY_VERIFIER:
+    """
+    Verificación de inventorySetQuantities en segundo plano.
+
+    Antes cada lote armaba una consulta con alias (i0 … i49) y el sync se quedaba en
+    time.sleep(1 * attempt) antes de mandar el siguiente lote. Ahora:
+    - Una sola consulta parametrizada nodes(ids:) (el texto no cambia entre llamadas).
+    - Un hilo verifica detrás del flujo de escritura: submit() regresa de inmediato.
+    - Solo se reintentan los items que no coinciden, con backoff exponencial con jitter;
+      mientras un lote espera su reintento se verifican los demás (cola por vencimiento).
+    - inventoryLevel=null no se reintenta: el item no está activado en la ubicación.
+
+    Los mensajes van a un logger buffered (el de Streamlit solo acepta el hilo principal);
+    el hilo principal llama log.flush() entre lotes y close() al final.
+    """
+
+    QUERY = """
+    query VerifyInventory($ids: [ID!]!, $locationId: ID!) {
+      nodes(ids: $ids) {
+        ... on InventoryItem {
+          id
+          inventoryLevel(locationId: $locationId) {
+            quantities(names: ["available"]) { name quantity }
+          }
+        }
+      }
+    }
+    """
+    MAX_IDS = 250  # límite de nodes(ids:)
+
+    def __init__(self, gql, location_gid: str, log, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 8.0):
+        self.gql = gql
+        self.location_gid = location_gid
+        self.log = log
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+        self.ok = 0
+        self.null_levels = 0
+        self.failed: dict = {}        # gid -> (got, want) tras agotar reintentos
+        self.confirmed: dict = {}     # gid -> cantidad leída igual a la esperada (para el espejo)
+        self.failed_batches = set()
+
+        self._heap: list = []         # (vence_en, seq, batch_no, {gid: want}, intento)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._worker, name="inventory-verifier", daemon=True)
+        self._thread.start()
+
+    # -------------------------
+    # API del hilo principal
+    # -------------------------
+    def submit(self, batch_no: int, desired_by_gid: dict):
+        """Encola un lote ya escrito: {gid de InventoryItem: cantidad esperada}."""
+        if not desired_by_gid:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic(), next(self._seq), batch_no, dict(desired_by_gid), 1))
+            self._cond.notify()
+
+    def close(self, timeout: float | None = None) -> dict:
+        """Espera a que se verifique todo lo encolado y regresa el resumen."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        return {
+            "ok": self.ok,
+            "null_levels": self.null_levels,
+            "failed_items": len(self.failed),
+            "failed_batches": len(self.failed_batches),
+        }
+
+    # -------------------------
+    # Hilo verificador
+    # -------------------------
+    def _backoff(self, attempt: int) -> float:
+        # equal jitter: la mitad fija + la mitad aleatoria, para no sincronizar reintentos
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _next_due(self) -> list | None:
+        """Saca los lotes vencidos (juntando hasta MAX_IDS ids); None si ya no hay nada."""
+        with self._cond:
+            while True:
+                if not self._heap:
+                    if self._closing:
+                        return None
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                due, n_ids = [], 0
+                while self._heap and self._heap[0][0] <= time.monotonic():
+                    if due and n_ids + len(self._heap[0][3]) > self.MAX_IDS:
+                        break
+                    entry = heapq.heappop(self._heap)
+                    due.append(entry)
+                    n_ids += len(entry[3])
+                return due
+
+    def _worker(self):
+        while True:
+            due = self._next_due()
+            if due is None:
+                return
+            ids = [gid for entry in due for gid in entry[3]]
+            try:
+                got = self._fetch(ids)
+            except Exception as e:
+                self.log.warning(f"⚠️ Verify: error consultando nodes ({len(ids)} ids): {e}", category="verify")
+                got = {}
+            for _, _, batch_no, pending, attempt in due:
+                self._check(batch_no, pending, attempt, got)
+
+    def _fetch(self, ids: list) -> dict:
+        """{gid: cantidad | None (nivel null)}; los gids ausentes no se pudieron leer."""
+        got = {}
+        for i in range(0, len(ids), self.MAX_IDS):
+            chunk = ids[i:i + self.MAX_IDS]
+            body = self.gql.execute(self.QUERY, {"ids": chunk, "locationId": self.location_gid})
+            for node in ((body or {}).get("data") or {}).get("nodes") or []:
+                if not node or not node.get("id"):
+                    continue
+                level = node.get("inventoryLevel")
+                if level is None:
+                    got[node["id"]] = None
+                    continue
+                available = next(
+                    (q.get("quantity") for q in level.get("quantities") or [] if q.get("name") == "available"),
+                    "missing_available",
+                )
+                got[node["id"]] = available
+        return got
+
+    def _check(self, batch_no: int, pending: dict, attempt: int, got: dict):
+        mismatched, matched, nulls = {}, 0, 0
+        for gid, want in pending.items():
+            if gid in got and got[gid] is None:
+                nulls += 1
+            elif gid in got and got[gid] != "missing_available" and int(got[gid]) == int(want):
+                matched += 1
+                self.confirmed[gid] = int(want)
+            else:
+                mismatched[gid] = want
+
+        self.ok += matched
+        if nulls:
+            self.null_levels += nulls
+            self.log.warning(
+                f"⚠️ Verify batch {batch_no}: {nulls} items returned inventoryLevel=null (likely not activated at this location).",
+                category="verify",
+            )
+
+        if not mismatched:
+            self.log.debug("✅ Verify batch {b}: ok={n} (intento {a})", category="verify", b=batch_no, n=matched, a=attempt)
+            return
+
+        if attempt < self.max_attempts:
+            self.log.debug(
+                "🔁 Verify batch {b}: {n} sin coincidir, reintento {a}", category="verify",
+                b=batch_no, n=len(mismatched), a=attempt + 1,
+            )
+            with self._cond:
+                heapq.heappush(
+                    self._heap,
+                    (time.monotonic() + self._backoff(attempt), next(self._seq), batch_no, mismatched, attempt + 1),
+                )
+                self._cond.notify()
+            return
+
+        self.failed_batches.add(batch_no)
+        for gid, want in mismatched.items():
+            self.failed[gid] = (got.get(gid, "missing_node"), want)
+        self.log.error(f"❌ Verify batch {batch_no}: {len(mismatched)} mismatches remain after retries. Sample:", category="verify")
+        for gid, want in list(mismatched.items())[:5]:
+            self.log.error(f"   - {gid}: got={got.get(gid, 'missing_node')} want={want}", category="verify")
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+
+class SHOPIFY_JOB_JOURNAL:
+    """
+    Bitácora persistente de los jobs de creación/actualización de productos.
+
+    Colección: management.shopify_job_journal (un documento por job planeado)
+    {
+        "key": sha256(store + plan_id + product_id/zoho_item_id + payload),   # idempotency key
+        "store": "managed_store_one",
+        "plan_id": "3f2a...",      # una corrida de send_workload_to_shopify_api
+        "state": "pending" | "in_progress" | "done" | "failed" | "superseded",
+        "attempts": 0,
+        "job": {...},              # el job tal cual lo recibe send_workload_to_shopify_api
+        "result": {...},           # resultado del último intento (sin el producto completo)
+        "created_at", "updated_at", "expires_at"
+    }
+
+    - La llave incluye el plan_id: un "done" solo evita reenviar dentro del MISMO plan
+      (reanudar una corrida que quedó a medias). Un plan nuevo siempre manda sus jobs,
+      aunque sean idénticos a uno ya aplicado (p.ej. re-archivar algo que alguien
+      desarchivó a mano, o regresar un precio a un valor anterior).
+    - "superseded": job de un plan viejo que ya no se manda porque un plan nuevo lo
+      recalcula (ver INVENTORY_AUTOMATIZATION.resume_pending_jobs).
+    - Los documentos expiran (TTL) después de ttl_hours.
+    """
+
+    DB_NAME = "management"
+    COLLECTION = "shopify_job_journal"
+    RESUMABLE_STATES = ("pending", "in_progress", "failed")
+    INDEXES = [
+        ([("key", ASCENDING)], {"unique": True}),
+        ([("store", ASCENDING), ("state", ASCENDING)], {}),
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ]
+
+    def __init__(self, client, store: str, max_attempts: int = 5, ttl_hours: float = 24):
+        self.collection = client[self.DB_NAME][self.COLLECTION]
+        self.store = store
+        self.max_attempts = int(max_attempts)
+        self.ttl = timedelta(hours=float(ttl_hours))
+
+    def ensure_indexes(self):
+        for keys, options in self.INDEXES:
+            self.collection.create_index(keys, **options)
+
+    @staticmethod
+    def new_plan_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def idempotency_key(store: str, job: dict, plan_id: str) -> str:
+        ident = {
+            "store": store,
+            "plan_id": plan_id,
+            "product_id": str(job.get("shopify_product_id") or job.get("product_id") or ""),
+            "zoho_item_id": str(job.get("zoho_item_id") or ""),
+            "payload": job.get("payload"),
+        }
+        raw = json.dumps(ident, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _compact_result(result: dict) -> dict:
+        # el producto completo vive en {store}.products; aquí solo lo necesario para reanudar
+        return {k: v for k, v in (result or {}).items() if k not in ("product", "job")}
+
+    def plan(self, jobs: list[dict], plan_id: str) -> tuple[list[str], dict]:
+        """
+        Registra los jobs del plan (si no existían) y devuelve:
+        - keys: idempotency key por job, alineadas con `jobs`
+        - done: {key: result} de los jobs de ESTE plan que ya se aplicaron (reanudación)
+        """
+        now = datetime.now(timezone.utc)
+        keys = [self.idempotency_key(self.store, job, plan_id) for job in jobs]
+        ops = [
+            UpdateOne(
+                {"key": key},
+                {"$setOnInsert": {
+                    "store": self.store,
+                    "plan_id": plan_id,
+                    "state": "pending",
+                    "attempts": 0,
+                    "job": job,
+                    "created_at": now,
+                    "updated_at": now,
+                    "expires_at": now + self.ttl,
+                }},
+                upsert=True,
+            )
+            for key, job in zip(keys, jobs)
+        ]
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+        done = {
+            doc["key"]: doc.get("result") or {}
+            for doc in self.collection.find(
+                {"key": {"$in": keys}, "state": "done"},
+                {"_id": 0, "key": 1, "result": 1},
+            )
+        }
+        return keys, done
+
+    def pending(self) -> list[dict]:
+        """Jobs sin terminar de la tienda (incluye fallidos con intentos disponibles)."""
+        return list(self.collection.find(
+            {
+                "store": self.store,
+                "state": {"$in": list(self.RESUMABLE_STATES)},
+                "attempts": {"$lt": self.max_attempts},
+            },
+            {"_id": 0},
+        ).sort("created_at", ASCENDING))
+
+    def supersede(self, keys: list[str]):
+        """Jobs de un plan viejo que ya no se reenvían (un plan nuevo los recalcula)."""
+        if not keys:
+            return
+        now = datetime.now(timezone.utc)
+        self.collection.update_many(
+            {"key": {"$in": list(keys)}},
+            {"$set": {"state": "superseded", "updated_at": now, "expires_at": now + self.ttl}},
+        )
+
+    def mark_in_progress(self, keys: list[str]):
+        if not keys:
+            return
+        now = datetime.now(timezone.utc)
+        self.collection.update_many(
+            {"key": {"$in": list(keys)}},
+            {"$set": {"state": "in_progress", "updated_at": now, "expires_at": now + self.ttl}, "$inc": {"attempts": 1}},
+        )
+
+    def mark_results(self, pairs: list[tuple[str, dict]]):
+        """pairs: [(key, result_dict)] → done si result['ok'], failed si no."""
+        if not pairs:
+            return
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"key": key},
+                {"$set": {
+                    "state": "done" if (result or {}).get("ok") else "failed",
+                    "result": self._compact_result(result),
+                    "updated_at": now,
+                    "expires_at": now + self.ttl,
+                }},
+            )
+            for key, result in pairs
+        ]
+        self.collection.bulk_write(ops, ordered=False)
@@ -0,0 +1,80 @@
+import atexit
+import threading
+
+from pymongo import MongoClient
+
+
+class MONGO_CLIENT_POOL:
+    """
+    Un solo MongoClient por URI para todo el proceso.
+
+    MongoClient ya es un pool de conexiones thread-safe con sus propios hilos de monitoreo;
+    crear uno por llamada (o por rerun de una página de Streamlit) abre sockets e hilos
+    que nunca se cierran. Aquí se crea de forma perezosa la primera vez que se pide
+    y se reutiliza en todas las clases de library/ y en las páginas.
+
+    Tamaño del pool configurable en el YAML:
+
+    non_sql_database:
+      url: "mongodb+srv://..."
+      max_pool_size: 50          # default de pymongo: 100
+      min_pool_size: 0
+      max_idle_time_ms: 300000
+      server_selection_timeout_ms: 30000
+
+    No cierres el cliente que regresa get_client: es compartido. Se cierran todos al salir.
+    """
+
+    _clients: dict = {}
+    _lock = threading.Lock()
+
+    # llave del YAML -> kwarg de MongoClient
+    POOL_OPTIONS = {
+        "max_pool_size": "maxPoolSize",
+        "min_pool_size": "minPoolSize",
+        "max_idle_time_ms": "maxIdleTimeMS",
+        "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+        "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+        "connect_timeout_ms": "connectTimeoutMS",
+    }
+
+    @classmethod
+    def get_client(cls, yaml_data: dict) -> MongoClient:
+        """Cliente compartido para self.data["non_sql_database"] (url + opciones de pool)."""
+        conf = (yaml_data or {}).get("non_sql_database") or {}
+        url = conf.get("url")
+        if not url:
+            raise KeyError("Falta non_sql_database.url en la configuración.")
+        options = {
+            kwarg: conf[key]
+            for key, kwarg in cls.POOL_OPTIONS.items()
+            if conf.get(key) is not None
+        }
+        return cls.for_url(url, **options)
+
+    @classmethod
+    def for_url(cls, url: str, **options) -> MongoClient:
+        """
+        Cliente compartido por URI. Las opciones de pool solo aplican la primera vez que
+        se crea el cliente para esa URI (después se reutiliza el existente).
+        """
+        with cls._lock:
+            client = cls._clients.get(url)
+            if client is None:
+                client = MongoClient(url, **options)
+                cls._clients[url] = client
+            return client
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            clients = list(cls._clients.values())
+            cls._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+atexit.register(MONGO_CLIENT_POOL.close_all)
@@ -0,0 +1,219 @@
+import threading
+import time
+
+import requests
+
+
+class SHOPIFY_GRAPHQL:
+    """
+    Cliente mínimo de la GraphQL Admin API de Shopify con control de costo.
+
+    Shopify limita GraphQL por puntos de costo (bucket de 1000 puntos, 50 pts/seg en planes
+    normales; 2000/100 en Plus) y reporta el estado en extensions.cost.throttleStatus.
+    Este cliente:
+    - Estima el presupuesto disponible entre llamadas (restoreRate).
+    - Reserva el costo estimado antes de mandar la consulta (esperando si no cabe), así
+      varios hilos no pasan juntos el chequeo y rebasan el bucket; al llegar la respuesta
+      la reserva se ajusta al costo real / throttleStatus.
+    - Reintenta cuando Shopify responde THROTTLED.
+    Una instancia por tienda (ver for_store) para que todos los hilos compartan el presupuesto.
+    """
+
+    # Una sola consulta no puede pedir más de 1000 puntos, sin importar el bucket
+    MAX_SINGLE_QUERY_COST = 1000
+
+    _registry: dict = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, store_conf: dict, timeout: int = 60):
+        token = store_conf.get("access_token")
+        api_version = store_conf.get("api_version", "2024-10")
+        store_name = store_conf.get("store_name")
+        if not token or not store_name:
+            raise ValueError(
+                "Config incompleta para GraphQL. Requerido: access_token, store_name. "
+                f"Recibí keys: {list(store_conf.keys())}"
+            )
+
+        base = store_name.strip()
+        if not base.startswith("http"):
+            base = "https://" + base
+        base = base.rstrip("/")
+
+        self.endpoint = f"{base}/admin/api/{api_version}/graphql.json"
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": token,
+        }
+        self.timeout = timeout
+
+        self.maximum_available = float(store_conf.get("graphql_bucket_size", 1000))
+        self.restore_rate = float(store_conf.get("graphql_restore_rate", 50))
+        self.currently_available = self.maximum_available
+        self._reserved = 0.0  # costo reservado por consultas aún en vuelo
+        self.last_cost: dict = {}
+        self.throttled_count = 0  # respuestas THROTTLED / 429 vistas (métrica de la bitácora de estrategia)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_store(cls, store: str, store_conf: dict) -> "SHOPIFY_GRAPHQL":
+        """Devuelve (o crea) el cliente único del proceso para la tienda."""
+        with cls._registry_lock:
+            client = cls._registry.get(store)
+            if client is None:
+                client = cls(store_conf)
+                cls._registry[store] = client
+            return client
+
+    @staticmethod
+    def gid(kind: str, numeric_id) -> str:
+        """gid('Product', 123) -> 'gid://shopify/Product/123' (si ya es gid, lo regresa igual)."""
+        s = str(numeric_id)
+        if s.startswith("gid://"):
+            return s
+        return f"gid://shopify/{kind}/{int(s)}"
+
+    @staticmethod
+    def numeric_id(gid_value):
+        """'gid://shopify/Product/123' -> 123"""
+        if gid_value is None:
+            return None
+        try:
+            return int(str(gid_value).rsplit("/", 1)[-1])
+        except ValueError:
+            return None
+
+    # -------------------------
+    # Presupuesto de costo
+    # -------------------------
+    def _refill_locked(self):
+        """Suma lo restaurado desde la última lectura (llamar con el lock tomado)."""
+        now = time.monotonic()
+        self.currently_available = min(
+            self.maximum_available, self.currently_available + (now - self._last) * self.restore_rate
+        )
+        self._last = now
+
+    def available(self) -> float:
+        """Puntos disponibles estimados en este momento (ya descontadas las reservas)."""
+        with self._lock:
+            self._refill_locked()
+            return max(0.0, self.currently_available)
+
+    def wait_for(self, cost: float):
+        """Bloquea hasta que el bucket tenga al menos `cost` puntos (sin reservarlos)."""
+        cost = min(float(cost), self.maximum_available)
+        while True:
+            avail = self.available()
+            if avail >= cost:
+                return
+            time.sleep((cost - avail) / max(self.restore_rate, 1.0))
+
+    def reserve(self, cost: float) -> float:
+        """Espera a que quepan `cost` puntos y los descuenta del bucket; regresa lo reservado."""
+        cost = min(float(cost), self.maximum_available)
+        while True:
+            with self._lock:
+                self._refill_locked()
+                if self.currently_available >= cost:
+                    self.currently_available -= cost
+                    self._reserved += cost
+                    return cost
+                missing = cost - self.currently_available
+            time.sleep(missing / max(self.restore_rate, 1.0))
+
+    def release(self, reserved: float):
+        """Devuelve una reserva cuya consulta no llegó a costar nada (429 / error HTTP)."""
+        if not reserved:
+            return
+        with self._lock:
+            self._reserved = max(0.0, self._reserved - reserved)
+            self._refill_locked()
+            self.currently_available = min(self.maximum_available, self.currently_available + reserved)
+
+    def _update_throttle(self, body: dict, reserved: float = 0.0):
+        """Ajusta el bucket con la respuesta y cierra la reserva de la consulta."""
+        cost = ((body or {}).get("extensions") or {}).get("cost") or {}
+        status = cost.get("throttleStatus") or {}
+        with self._lock:
+            self.last_cost = cost
+            self._reserved = max(0.0, self._reserved - reserved)
+            if status:
+                # el dato de Shopify ya incluye esta consulta; las otras reservas en vuelo siguen descontadas
+                self.maximum_available = float(status.get("maximumAvailable", self.maximum_available))
+                self.restore_rate = float(status.get("restoreRate", self.restore_rate))
+                self.currently_available = float(status.get("currentlyAvailable", self.currently_available)) - self._reserved
+                self._last = time.monotonic()
+            elif cost.get("actualQueryCost") is not None:
+                # sin throttleStatus: se cambia lo reservado por el costo real
+                self._refill_locked()
+                self.currently_available = min(
+                    self.maximum_available,
+                    self.currently_available + reserved - float(cost["actualQueryCost"]),
+                )
+
+    def _count_throttle(self):
+        with self._lock:
+            self.throttled_count += 1
+
+    @staticmethod
+    def _is_throttled(body: dict) -> bool:
+        for err in (body or {}).get("errors") or []:
+            if ((err or {}).get("extensions") or {}).get("code") == "THROTTLED":
+                return True
+        return False
+
+    # -------------------------
+    # Ejecución
+    # -------------------------
+    def execute(self, query: str, variables: dict | None = None, estimated_cost: float | None = None, max_retries: int = 5) -> dict:
+        """
+        Ejecuta la consulta y regresa el JSON completo (data/errors/extensions).
+        - Si se da estimated_cost, lo reserva del bucket (esperando si no cabe) antes de mandar.
+        - Reintenta THROTTLED y HTTP 429 esperando lo necesario.
+        - Errores HTTP distintos a 429 se propagan (raise_for_status).
+        - extensions.throttled_retries = intentos de esta consulta que salieron THROTTLED / 429
+          (lo agrega este cliente; GRAPHQL_BATCHER lo usa para partir sus lotes).
+        """
+        payload = {"query": query}
+        if variables:
+            payload["variables"] = variables
+
+        throttled_retries = 0
+        for attempt in range(max_retries + 1):
+            reserved = self.reserve(estimated_cost) if estimated_cost else 0.0
+
+            try:
+                resp = requests.post(self.endpoint, headers=self.headers, json=payload, timeout=self.timeout)
+                if resp.status_code == 429:
+                    self._count_throttle()
+                    throttled_retries += 1
+                    self.release(reserved)
+                    if attempt < max_retries:
+                        try:
+                            time.sleep(float(resp.headers.get("Retry-After", 2.0)))
+                        except ValueError:
+                            time.sleep(2.0)
+                        continue
+                    reserved = 0.0
+                resp.raise_for_status()
+                body = resp.json()
+            except Exception:
+                self.release(reserved)
+                raise
+            self._update_throttle(body, reserved)
+
+            throttled = self._is_throttled(body)
+            if throttled:
+                self._count_throttle()
+                throttled_retries += 1
+            if throttled and attempt < max_retries:
+                requested = (self.last_cost or {}).get("requestedQueryCost") or estimated_cost or 0
+                # esperamos a que se restaure lo pedido (o al menos un segundo)
+                self.wait_for(max(float(requested), self.restore_rate))
+                continue
+            break
+        if isinstance(body, dict):
+            body["extensions"] = {**(body.get("extensions") or {}), "throttled_retries": throttled_retries}
+        return body
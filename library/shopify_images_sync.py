@@ -1,7 +1,9 @@
 # library/shopify_images_sync.py
 
 import requests
-from pymongo import MongoClient
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.sync_logger import SYNC_LOGGER
+from library.store_links import STORE_LINKS
 from colorama import init, Fore, Style
 from typing import Callable, Optional
 import os
@@ -13,10 +15,10 @@ from dotenv import load_dotenv
 class ShopifyImageSync:
     """
     Sincroniza imágenes desde MongoDB (management.product_images)
-    hacia Shopify, usando el mapping Zoho_Inventory.items_per_store.
+    hacia Shopify, usando el mapping Zoho_Inventory.store_links.
 
     Flujo:
-      - Para cada item en items_per_store con item_id y shopify_id:
+      - Para cada vínculo en store_links con item_id y shopify_id:
           * Buscar documento en management.product_images con ese item_id.
           * Si existe y tiene imágenes:
               - Borrar todas las imágenes actuales del producto en Shopify.
@@ -32,10 +34,10 @@ class ShopifyImageSync:
         init(autoreset=True)
         self.data = yaml_data
         self.store_key = store_key
+        self.log = SYNC_LOGGER.from_config(self.data)
 
         # Mongo
-        mongo_url = self.data["non_sql_database"]["url"]
-        self.client = MongoClient(mongo_url)
+        self.client = MONGO_CLIENT_POOL.get_client(self.data)
 
         # Shopify config
         shop_conf = self.data[self.store_key]
@@ -47,24 +49,14 @@ class ShopifyImageSync:
         }
 
     def _log(self, msg: str, logger: Optional[Callable[[str], None]] = None):
-        if callable(logger):
-            logger(msg)
-        else:
-            print(msg)
+        self.log.bind(logger, "ShopifyImageSync")(msg)
 
     def _get_items_mapping(self):
         """
-        Lee Zoho_Inventory.items_per_store y devuelve la lista de items
+        Lee Zoho_Inventory.store_links y devuelve la lista de vínculos
         para la store actual (self.store_key).
         """
-        db_zoho = self.client["Zoho_Inventory"]
-        coll = db_zoho["items_per_store"]
-
-        doc = coll.find_one({"store": self.store_key})
-        if not doc or "items" not in doc:
-            return []
-
-        return doc["items"]
+        return STORE_LINKS(self.client).get_links(self.store_key)
 
     def _get_product_images_doc(self, item_id: str):
         """
@@ -172,7 +164,7 @@ class ShopifyImageSync:
     def sync_images(self, logger: Optional[Callable[[str], None]] = None) -> dict:
         """
         Método principal:
-        - Para cada par item_id–shopify_id en items_per_store:
+        - Para cada par item_id–shopify_id en store_links:
             * Si hay documento en management.product_images con ese item_id:
                 - Borra imágenes previas en Shopify
                 - Sube nuevas imágenes
@@ -188,7 +180,7 @@ class ShopifyImageSync:
         items_mapping = self._get_items_mapping()
         total_pairs = len(items_mapping)
         self._log(
-            f"[IMG][{self.store_key}] items_per_store → {total_pairs} items configurados.",
+            f"[IMG][{self.store_key}] store_links → {total_pairs} items configurados.",
             logger,
         )
 
@@ -239,7 +231,7 @@ class ShopifyImageSync:
 
         summary = {
             "store": self.store_key,
-            "total_pairs_in_items_per_store": total_pairs,
+            "total_pairs_in_store_links": total_pairs,
             "processed_with_images": processed,
             "skipped_no_images_doc": skipped_no_images,
             "skipped_missing_ids": skipped_no_ids,
@@ -1,7 +1,14 @@
 from colorama import Fore, Style, init
-from pymongo import MongoClient
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.sync_logger import SYNC_LOGGER
+from library.inventory_map import INVENTORY_MAP
+from library.id_normalizer import ID_NORMALIZER
+from library.index_manager import MONGO_INDEX_MANAGER
+from library.shopify_rate_limiter import SHOPIFY_RATE_LIMITER
+from library.sync_strategy_selector import SYNC_STRATEGY_SELECTOR
 import requests
 import os
+import time
 import sys
 import yaml
 from dotenv import load_dotenv
@@ -16,6 +23,7 @@ class SHOPIFY_MONGODB:
         self.data = yaml_data
         self.shopify_conf = yaml_data[store]   # config de la tienda en el YAML
         self.store = store
+        self.log = SYNC_LOGGER.from_config(self.data)
 
         # REST Admin API base
         api_version = self.shopify_conf.get("api_version", "2024-10")
@@ -38,9 +46,7 @@ class SHOPIFY_MONGODB:
         2) Si no, consultar /locations.json y si hay exactamente UNA location activa y no-legacy, usarla.
         3) Si no se puede determinar (0 o >1), devolver None.
         """
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
+        _log = self.log.bind(logger, "_get_single_location_id", echo=False)
 
         # 1) Revisar si ya viene en el YAML
         conf_location = self.shopify_conf.get("location_id")
@@ -114,16 +120,18 @@ class SHOPIFY_MONGODB:
         """
 
 
-        def _log(msg: str):
-            if callable(logger):
-                logger(str(msg))
+        _log = self.log.bind(logger, "sync_shopify_to_mongo", echo=False)
 
-        mongo_db_url = self.data["non_sql_database"]["url"]
-        client = MongoClient(mongo_db_url)
+        client = MONGO_CLIENT_POOL.get_client(self.data)
 
         db_name = self.store
         db = client[db_name]
 
+        MONGO_INDEX_MANAGER.ensure_once(client, self.data, logger=_log)
+
+        # datos viejos con ids mezclados (int/str/$numberLong) → Int64, una sola vez por tienda
+        ID_NORMALIZER.ensure_migrated(client, self.store, logger=_log)
+
         full_endpoints = {
             "orders": {
                 "pk": "id",
@@ -166,6 +174,9 @@ class SHOPIFY_MONGODB:
         print(msg)
         _log(msg)
         summary = {}
+        # solo existe la paginación REST: se estima y se registra contra lo real para afinar el modelo
+        strategy_selector = SYNC_STRATEGY_SELECTOR(client, self.store, self.shopify_conf)
+        limiter = SHOPIFY_RATE_LIMITER.for_store(self.store, self.shopify_conf)
 
         for endpoint, conf in endpoints.items():
             pk_field = conf["pk"]
@@ -185,8 +196,8 @@ class SHOPIFY_MONGODB:
             # 📁 Colección por endpoint dentro de la DB de la tienda
             collection = db[endpoint]
 
-            # Índice único por el campo de Shopify (id, inventory_item_id, etc.)
-            collection.create_index(pk_field, unique=True)
+            # Índice único por el campo de Shopify (id, inventory_item_id, etc.) + los de consulta
+            MONGO_INDEX_MANAGER.ensure_collection(client, db_name, endpoint)
 
             msg = f"Sincronizando {endpoint} de Shopify para la tienda (DB): {self.store}"
             print(Fore.BLUE + msg + Style.RESET_ALL)
@@ -195,12 +206,19 @@ class SHOPIFY_MONGODB:
             total_docs = 0
             inserted = 0
             updated = 0
+            synced_ids = []
 
             url = f"{self.base_url}/{endpoint}.json"
             params = {"limit": 250}
             params.update(extra_params)
 
+            expected_records = collection.estimated_document_count()
+            estimates = strategy_selector.estimate_ingest(endpoint, expected_records, limiter=limiter)
+            pages = 0
+            started_at = time.monotonic()
+
             while True:
+                pages += 1
                 try:
                     response = requests.get(url, headers=self.headers, params=params, timeout=30)
                 except requests.RequestException as e:
@@ -230,11 +248,14 @@ class SHOPIFY_MONGODB:
                         _log(msg)
                         continue
 
+                    # ids de Shopify como Int64 desde la ingesta (ver ID_NORMALIZER)
+                    rec = ID_NORMALIZER.normalize_shopify_record(endpoint, rec)
                     filter_query = {pk_field: rec[pk_field]}
                     update_query = {"$set": rec}
 
                     result = collection.update_one(filter_query, update_query, upsert=True)
                     total_docs += 1
+                    synced_ids.append(rec[pk_field])
 
                     if result.upserted_id is not None:
                         inserted += 1
@@ -276,8 +297,17 @@ class SHOPIFY_MONGODB:
                 "inserted": inserted,
                 "updated": updated,
             }
+            strategy_selector.record(
+                SYNC_STRATEGY_SELECTOR.ingest_kind(endpoint), "rest_paging", estimates,
+                {"calls": pages, "seconds": round(time.monotonic() - started_at, 3), "records": total_docs},
+                inputs={"expected_records": expected_records, "rest_headroom": round(limiter.headroom(), 2)},
+            )
+
+            # Mantener el mapeo item → inventory_item_id de los productos que acabamos de traer
+            if endpoint == "products" and synced_ids:
+                mapped = INVENTORY_MAP(client).refresh(self.store, product_ids=synced_ids)
+                _log(f"🧭 inventory_map ({self.store}): {mapped} variantes mapeadas")
 
-        client.close()
         return summary
     
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+import threading
+import time
+
+
+class SHOPIFY_RATE_LIMITER:
+    """
+    Leaky bucket compartido por tienda para la REST Admin API de Shopify.
+
+    Shopify permite un bucket de 40 llamadas (80 en Plus) que se vacía a 2 llamadas/seg.
+    Todos los hilos que trabajan contra la misma tienda comparten una sola instancia
+    (ver for_store), así el pool de workers nunca excede el límite de la tienda.
+    El nivel local se corrige con el header X-Shopify-Shop-Api-Call-Limit de cada respuesta.
+    """
+
+    _registry: dict = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, bucket_size: int = 40, leak_rate: float = 2.0, safety_margin: int = 2):
+        self.bucket_size = int(bucket_size)
+        self.leak_rate = float(leak_rate)
+        self.safety_margin = int(safety_margin)
+        self._level = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_store(cls, store: str, store_conf: dict | None = None) -> "SHOPIFY_RATE_LIMITER":
+        """Devuelve (o crea) el limiter único del proceso para la tienda."""
+        store_conf = store_conf or {}
+        with cls._registry_lock:
+            limiter = cls._registry.get(store)
+            if limiter is None:
+                limiter = cls(
+                    bucket_size=store_conf.get("rest_bucket_size", 40),
+                    leak_rate=store_conf.get("rest_leak_rate", 2.0),
+                )
+                cls._registry[store] = limiter
+            return limiter
+
+    def _drain(self):
+        now = time.monotonic()
+        self._level = max(0.0, self._level - (now - self._last) * self.leak_rate)
+        self._last = now
+
+    def acquire(self):
+        """Bloquea hasta que haya espacio en el bucket y reserva una llamada."""
+        while True:
+            with self._lock:
+                self._drain()
+                ceiling = max(1, self.bucket_size - self.safety_margin)
+                if self._level + 1 <= ceiling:
+                    self._level += 1
+                    return
+                wait = (self._level + 1 - ceiling) / self.leak_rate
+            time.sleep(wait)
+
+    def headroom(self) -> float:
+        """Llamadas que caben ahora mismo sin esperar."""
+        with self._lock:
+            self._drain()
+            return max(0.0, self.bucket_size - self.safety_margin - self._level)
+
+    def update_from_header(self, header_value: str | None):
+        """Sincroniza el nivel con el header 'usadas/limite' que regresa Shopify."""
+        if not header_value or "/" not in header_value:
+            return
+        try:
+            used, limit = (int(x) for x in header_value.split("/", 1))
+        except ValueError:
+            return
+        with self._lock:
+            self._drain()
+            self.bucket_size = limit
+            # Shopify es la fuente de verdad, pero no bajamos el nivel por respuestas atrasadas
+            self._level = max(self._level, float(used))
+
+    def penalize(self, retry_after: float | None = None):
+        """Tras un 429: marca el bucket como lleno para que todos los hilos esperen."""
+        with self._lock:
+            self._drain()
+            self._level = float(self.bucket_size)
+            if retry_after:
+                # Forzamos que el bucket tarde al menos retry_after en liberar espacio
+                self._level += max(0.0, float(retry_after) * self.leak_rate - self.safety_margin)
@@ -1,10 +1,11 @@
 import os
 from colorama import Fore, init, Style
-from pymongo import MongoClient
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.sync_logger import SYNC_LOGGER
 import sys
 import yaml
 from dotenv import load_dotenv
-from pprint import pprint
+from pprint import pformat
 from copy import deepcopy
 from datetime import date
 import requests
@@ -22,20 +23,15 @@ class STORE_AUTOMATIZATION:
         self.data = yaml_data
         self.yaml_path = os.path.join(self.working_folder, "config.yml")
         self.store = store
+        self.log = SYNC_LOGGER.from_config(self.data)
     
     def shopify_order_automatization(self, logger=None):
-        def _log(msg: str):
-            # Solo usamos logger si es una función/callable
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))
+        _log = self.log.bind(logger, "shopify_order_automatization")
         ####                                                             ###
         #### 1. Extraemos cada documento por colección de zoho y shopify ###
         ####                                                             ###
         # Conexión a Mongo
-        mongo_db_url = self.data["non_sql_database"]["url"]
-        client = MongoClient(mongo_db_url)
+        client = MONGO_CLIENT_POOL.get_client(self.data)
 
         databases = {
             "Zoho": ["Zoho_Inventory"],
@@ -58,7 +54,13 @@ class STORE_AUTOMATIZATION:
                 db = client[db_name]
                 for coll_name in collections[system]:
                     coll = db[coll_name]
-                    docs = list(coll.find({}))  # trae todos los documentos
+                    if coll_name == "salesorders":
+                        # solo se compara reference_number: consulta cubierta por el índice
+                        docs = list(coll.find({}, {"_id": 0, "reference_number": 1}))
+                    else:
+                        # para comparar solo hace falta el id; las órdenes completas se leen
+                        # después, solo las que hay que crear en Zoho
+                        docs = list(coll.find({}, {"_id": 0, "id": 1}))
 
                     # Ruteamos según base y colección
                     if system == "Zoho" and db_name == "Zoho_Inventory" and coll_name == "salesorders":
@@ -105,14 +107,15 @@ class STORE_AUTOMATIZATION:
             # - orders_to_create: están en Shopify pero NO en Zoho (id ∉ zoho_keys)
             # - orders_to_update: están en ambos (id ∈ zoho_keys)
 
-            orders_to_create = [
-                o for o in store_orders
-                if str(o.get("id")) not in zoho_keys
+            create_ids = [
+                o.get("id") for o in store_orders
+                if o.get("id") is not None and str(o.get("id")) not in zoho_keys
             ]
             orders_to_update = [
                 o for o in store_orders
                 if str(o.get("id")) in zoho_keys
             ]
+            orders_to_create = list(client[store_name]["orders"].find({"id": {"$in": create_ids}})) if create_ids else []
 
             _log(f"\t{store_name}: órdenes para CREAR en Zoho (no presentes en salesorders) → {len(orders_to_create)}")
             _log(f"\t{store_name}: órdenes para ACTUALIZAR en Zoho (ya presentes en salesorders) → {len(orders_to_update)}")
@@ -245,12 +248,7 @@ class STORE_AUTOMATIZATION:
         template_name: nombre del template en el repositorio ('new_order').
         Devuelve una lista de payloads listos para Zoho (sin haber resuelto aún customer_id/item_id).
         """
-        def _log(msg: str):
-            # Solo usamos logger si es una función/callable
-            if callable(logger):
-                logger(str(msg))
-            else:
-                print(str(msg))        
+        _log = self.log.bind(logger, "create_new_order_template")
         if not dict_with_orders:
             _log("\tNo hay órdenes para generar plantillas.")
             return []
@@ -284,7 +282,7 @@ class STORE_AUTOMATIZATION:
             # 4) Por ahora sólo imprimimos la plantilla
             _log("\nPlantilla generada para orden Shopify "
                       f"{order_dict.get('name') or order_dict.get('id')}:")
-            pprint(body)
+            _log.debug(lambda: pformat(body), category="order")
 
             push_list.append(body)
         #pprint(push_list)
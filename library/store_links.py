@@ -0,0 +1,182 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+from library.id_normalizer import ID_NORMALIZER
+
+
+class STORE_LINKS:
+    """
+    Asignación de items de Zoho a tiendas Shopify, normalizada.
+
+    Antes: Zoho_Inventory.items_per_store = un documento por tienda con un arreglo `items`
+    que se reescribía completo en cada alta/baja y se recorría linealmente.
+
+    Ahora: Zoho_Inventory.store_links = un documento por (store, item_id)
+    {
+        "store": "managed_store_one",
+        "item_id": "1072824000000295013",   # Zoho, str (ausente en vínculos huérfanos)
+        "shopify_id": 8123456789,           # Shopify product id, Int64 (None hasta que se crea)
+        "name": "...",                      # snapshot del nombre al asignarlo
+        "added_at": datetime, "linked_at": datetime
+    }
+    Índices: único (store, item_id) y secundario (store, shopify_id).
+    Cada alta/baja/linkeo es una escritura atómica por vínculo.
+
+    La primera vez que se consulta una tienda se migra su documento legacy de
+    items_per_store (que ya no se escribe) y se deja la marca en management.migrations:
+    una tienda que después se queda sin vínculos no vuelve a importar el arreglo legacy.
+    """
+
+    DB_NAME = "Zoho_Inventory"
+    COLLECTION = "store_links"
+    LEGACY_COLLECTION = "items_per_store"
+    MIGRATION_ID = "store_links_from_items_per_store_v1"
+    INDEXES = [
+        ([("store", ASCENDING), ("item_id", ASCENDING)], {"unique": True, "partialFilterExpression": {"item_id": {"$exists": True}}}),
+        ([("store", ASCENDING), ("shopify_id", ASCENDING)], {}),
+    ]
+
+    _migrated: set = set()  # marcas ya vistas en este proceso
+
+    def __init__(self, client):
+        self.db = client[self.DB_NAME]
+        self.collection = self.db[self.COLLECTION]
+        self.migrations = client["management"]["migrations"]
+
+    def ensure_indexes(self):
+        for keys, options in self.INDEXES:
+            self.collection.create_index(keys, **options)
+
+    # -------------------------
+    # Migración desde items_per_store
+    # -------------------------
+    def migrate_from_items_per_store(self, store: str) -> int:
+        """Copia los vínculos del arreglo legacy de la tienda (sin pisar vínculos ya existentes)."""
+        legacy = self.db[self.LEGACY_COLLECTION].find_one({"store": store}, {"items": 1})
+        ops = []
+        for it in (legacy or {}).get("items") or []:
+            item_id = ID_NORMALIZER.to_item_id(it.get("item_id"))
+            shopify_id = ID_NORMALIZER.to_int64(it.get("shopify_id"))
+            fields = {k: v for k, v in it.items() if k not in ("item_id", "shopify_id")}
+            if item_id is not None:
+                ops.append(UpdateOne(
+                    {"store": store, "item_id": item_id},
+                    {"$setOnInsert": {"shopify_id": shopify_id, **fields}},
+                    upsert=True,
+                ))
+            elif shopify_id is not None:
+                # vínculo huérfano (sin item de Zoho): se conserva para que el planner lo archive
+                ops.append(UpdateOne(
+                    {"store": store, "item_id": {"$exists": False}, "shopify_id": shopify_id},
+                    {"$setOnInsert": fields},
+                    upsert=True,
+                ))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    def _ensure_migrated(self, store: str):
+        key = f"{self.MIGRATION_ID}:{store}"
+        if key in self._migrated:
+            return
+        if not self.migrations.find_one({"_id": key}, {"_id": 1}):
+            migrated = 0
+            # sin marca pero con vínculos: ya se había migrado antes de existir la marca
+            if self.collection.count_documents({"store": store}, limit=1) == 0:
+                migrated = self.migrate_from_items_per_store(store)
+            self.migrations.update_one(
+                {"_id": key},
+                {"$set": {"links": migrated, "migrated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        self._migrated.add(key)
+
+    # -------------------------
+    # Lecturas
+    # -------------------------
+    def find(self, store: str, filter_extra: dict | None = None, projection: dict | None = None):
+        """Cursor de vínculos de la tienda (ordenados por item_id)."""
+        self._ensure_migrated(store)
+        query = {"store": store, **(filter_extra or {})}
+        proj = {"_id": 0, **(projection or {})} if projection else {"_id": 0}
+        return self.collection.find(query, proj).sort("item_id", ASCENDING)
+
+    def get_links(self, store: str, projection: dict | None = None) -> list[dict]:
+        return list(self.find(store, projection=projection))
+
+    def iter_windows(self, store: str, size: int, filter_extra: dict | None = None, projection: dict | None = None):
+        """
+        Vínculos de la tienda en ventanas de `size` (paginación por _id, sin cursor abierto
+        entre ventanas: el consumidor puede tardar minutos enviando cada una).
+        Sin projection se regresan los documentos completos sin _id; con projection, tal cual.
+        """
+        self._ensure_migrated(store)
+        size = max(1, int(size))
+        query = {"store": store, **(filter_extra or {})}
+        last_id = None
+        while True:
+            page_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+            window = list(self.collection.find(page_query, projection).sort("_id", ASCENDING).limit(size))
+            if not window:
+                return
+            last_id = window[-1]["_id"]
+            if projection is None:
+                for link in window:
+                    link.pop("_id", None)
+            yield window
+            if len(window) < size:
+                return
+
+    def exists(self, store: str) -> bool:
+        self._ensure_migrated(store)
+        return self.collection.count_documents({"store": store}, limit=1) > 0
+
+    def assigned_item_ids(self, store: str) -> list:
+        return [d["item_id"] for d in self.find(store, {"item_id": {"$exists": True}}, {"item_id": 1})]
+
+    def linked_shopify_ids(self, store: str) -> set:
+        return {
+            d["shopify_id"]
+            for d in self.find(store, {"shopify_id": {"$ne": None}}, {"shopify_id": 1})
+            if d.get("shopify_id") is not None
+        }
+
+    # -------------------------
+    # Escrituras (atómicas por vínculo)
+    # -------------------------
+    def add_items(self, store: str, items: list[dict]) -> int:
+        """items: [{"item_id": ..., "name": ...}] → upsert por vínculo (no duplica)."""
+        self._ensure_migrated(store)
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"store": store, "item_id": ID_NORMALIZER.to_item_id(it["item_id"])},
+                {"$setOnInsert": {"name": it.get("name"), "shopify_id": None, "added_at": now}},
+                upsert=True,
+            )
+            for it in items
+            if ID_NORMALIZER.to_item_id(it.get("item_id")) is not None
+        ]
+        if not ops:
+            return 0
+        result = self.collection.bulk_write(ops, ordered=False)
+        return result.upserted_count
+
+    def remove_items(self, store: str, item_ids: list) -> int:
+        self._ensure_migrated(store)
+        if not item_ids:
+            return 0
+        ids = [ID_NORMALIZER.to_item_id(x) for x in item_ids]
+        return self.collection.delete_many({"store": store, "item_id": {"$in": ids}}).deleted_count
+
+    def link_op(self, store: str, item_id, shopify_id, linked_at: datetime | None = None) -> UpdateOne:
+        """Operación (para bulk_write) que guarda el shopify_id de un vínculo."""
+        return UpdateOne(
+            {"store": store, "item_id": ID_NORMALIZER.to_item_id(item_id)},
+            {"$set": {"shopify_id": ID_NORMALIZER.to_int64(shopify_id), "linked_at": linked_at or datetime.utcnow()}},
+        )
+
+    def bulk_write(self, ops: list):
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
@@ -0,0 +1,226 @@
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+
+class SYNC_LOGGER:
+    """
+    Logger estructurado (niveles + muestreo por categoría + formateo perezoso) para los
+    procesos de sincronización.
+
+    Los planners imprimían varias líneas por producto (repr de campos, pprint de listas
+    completas) y, a través del logger de Streamlit, eso dominaba el tiempo de corrida en
+    catálogos grandes. Ahora el detalle por item es nivel "debug" y solo se formatea si
+    se va a emitir.
+
+    Configuración opcional en el YAML:
+
+    logging:
+      level: info                 # debug | info | warning | error
+      sample:                     # fracción de registros que se emiten por categoría
+        item: 0.05                # (solo aplica a los que ya pasaron el nivel)
+      jsonl_path: ./logs/sync.jsonl   # sink asíncrono en JSON lines (opcional)
+      jsonl_level: debug          # nivel mínimo del sink JSONL (default: level)
+
+    Uso dentro de un método (reemplaza al closure _log):
+
+        _log = self.log.bind(logger, "shopify_update_items")
+        _log("✅ mensaje normal")                                   # info
+        _log.debug("{i} Producto {pid}", category="item", i=i, pid=pid)  # perezoso
+        _log.warning("⚠️ algo raro")
+    """
+
+    LEVELS = {"debug": 10, "info": 20, "success": 20, "warning": 30, "error": 40}
+
+    def __init__(self, conf: dict | None = None):
+        conf = conf or {}
+        self.level = self._level_no(conf.get("level", "info"))
+        self.sample = {str(k): float(v) for k, v in (conf.get("sample") or {}).items()}
+        self.jsonl_level = self._level_no(conf.get("jsonl_level", conf.get("level", "info")))
+        path = conf.get("jsonl_path")
+        self.sink = _JSONL_SINK.for_path(path) if path else None
+
+    @classmethod
+    def from_config(cls, yaml_data: dict) -> "SYNC_LOGGER":
+        return cls((yaml_data or {}).get("logging") or {})
+
+    @classmethod
+    def _level_no(cls, level) -> int:
+        if isinstance(level, int):
+            return level
+        return cls.LEVELS.get(str(level).lower(), 20)
+
+    def enabled(self, level: str = "info") -> bool:
+        """¿Se emitiría un registro con este nivel? (para evitar trabajo caro antes de llamar)."""
+        level_no = self._level_no(level)
+        return level_no >= self.level or (self.sink is not None and level_no >= self.jsonl_level)
+
+    def _sampled(self, category: str | None) -> bool:
+        rate = self.sample.get(category, 1.0) if category else 1.0
+        return rate >= 1.0 or random.random() < rate
+
+    def emit(self, msg, level: str = "info", category: str | None = None, component: str | None = None, out=None, **fields):
+        level_no = self._level_no(level)
+        to_out = level_no >= self.level
+        to_sink = self.sink is not None and level_no >= self.jsonl_level
+        if not (to_out or to_sink) or not self._sampled(category):
+            return
+
+        # formateo perezoso: solo aquí, cuando sí se va a emitir
+        if callable(msg):
+            msg = msg()
+        text = str(msg)
+        if fields:
+            try:
+                text = text.format(**fields)
+            except (KeyError, IndexError, ValueError):
+                pass
+
+        if to_out and out is not None:
+            out(text)
+        if to_sink:
+            self.sink.put({
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "level": str(level).lower(),
+                "component": component,
+                "category": category,
+                "msg": text,
+                **({"fields": fields} if fields else {}),
+            })
+
+    def bind(self, logger=None, component: str | None = None, echo: bool = True) -> "_BOUND_LOG":
+        """
+        Callable tipo _log para un método. logger es el callable de siempre (Streamlit, etc.);
+        si no es callable y echo=True se usa print.
+        """
+        if callable(logger):
+            out = logger
+        elif echo:
+            out = print
+        else:
+            out = None
+        return _BOUND_LOG(self, out, component)
+
+
+class _BOUND_LOG:
+    def __init__(self, base: SYNC_LOGGER, out, component: str | None):
+        self.base = base
+        self.out = out
+        self.component = component
+
+    def __call__(self, msg, level: str = "info", category: str | None = None, **fields):
+        self.base.emit(msg, level=level, category=category, component=self.component, out=self.out, **fields)
+
+    def debug(self, msg, category: str | None = None, **fields):
+        self(msg, "debug", category, **fields)
+
+    def info(self, msg, category: str | None = None, **fields):
+        self(msg, "info", category, **fields)
+
+    def warning(self, msg, category: str | None = None, **fields):
+        self(msg, "warning", category, **fields)
+
+    def error(self, msg, category: str | None = None, **fields):
+        self(msg, "error", category, **fields)
+
+    def enabled(self, level: str = "info") -> bool:
+        return self.base.enabled(level)
+
+    def buffered(self) -> "_BUFFERED_LOG":
+        """Misma interfaz, pero acumula los registros para emitirlos después (hilos worker)."""
+        return _BUFFERED_LOG(self.base, self.out, self.component)
+
+
+class _BUFFERED_LOG(_BOUND_LOG):
+    """
+    Los workers no pueden escribir al logger de Streamlit (solo acepta el hilo principal):
+    guardan sus registros aquí (sin formatear) y el hilo principal llama flush().
+    Es seguro llamar flush() mientras otro hilo sigue registrando (p.ej. el verificador).
+    """
+
+    def __init__(self, base: SYNC_LOGGER, out, component: str | None):
+        super().__init__(base, out, component)
+        self.records: list = []
+        self._lock = threading.Lock()
+
+    def __call__(self, msg, level: str = "info", category: str | None = None, **fields):
+        if self.base.enabled(level):
+            with self._lock:
+                self.records.append((msg, level, category, fields))
+
+    def flush(self):
+        with self._lock:
+            records, self.records = self.records, []
+        for msg, level, category, fields in records:
+            self.base.emit(msg, level=level, category=category, component=self.component, out=self.out, **fields)
+
+
+class _JSONL_SINK:
+    """Escritor en segundo plano: junta registros y los escribe por lotes (uno por archivo)."""
+
+    _registry: dict = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path: str, flush_every: float = 0.5, batch_size: int = 500):
+        self.path = path
+        self.flush_every = flush_every
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue()
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._thread = threading.Thread(target=self._worker, name=f"jsonl-sink:{path}", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_path(cls, path: str) -> "_JSONL_SINK":
+        with cls._registry_lock:
+            sink = cls._registry.get(path)
+            if sink is None:
+                sink = cls(path)
+                cls._registry[path] = sink
+            return sink
+
+    def put(self, record: dict):
+        self.queue.put(record)
+
+    def _worker(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_every))
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+    @classmethod
+    def flush_all(cls):
+        with cls._registry_lock:
+            sinks = list(cls._registry.values())
+        for sink in sinks:
+            sink.flush()
+
+
+atexit.register(_JSONL_SINK.flush_all)
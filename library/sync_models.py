@@ -0,0 +1,120 @@
+"""
+Registros compactos (__slots__) para los loops calientes del sync.
+
+Los planners recorrían documentos crudos de Mongo con decenas de llaves que no se usan
+y cadenas de .get() en cada vuelta. Estas clases se construyen una vez desde filas ya
+proyectadas (PROJECTION de cada clase) y solo guardan lo que el loop lee:
+- Link: vínculo store_links (item_id de Zoho ↔ shopify_id).
+- ZohoItemView: item de Zoho para stock (item_id, sku, stock a publicar).
+- ShopifyProductView / VariantView: producto del espejo {store}.products para
+  archivados e inventory_map.
+
+Los ids llegan canónicos desde la ingesta (item_id str, ids de Shopify Int64; ver
+ID_NORMALIZER), así que aquí no hay coerciones.
+"""
+
+
+class Link:
+    __slots__ = ("item_id", "shopify_id", "name")
+
+    PROJECTION = {"_id": 0, "item_id": 1, "shopify_id": 1, "name": 1}
+
+    def __init__(self, item_id=None, shopify_id=None, name=None):
+        self.item_id = item_id if item_id != "" else None
+        self.shopify_id = shopify_id or None
+        self.name = name
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Link":
+        return cls(doc.get("item_id"), doc.get("shopify_id"), doc.get("name"))
+
+    def __repr__(self):
+        return f"Link(item_id={self.item_id!r}, shopify_id={self.shopify_id!r}, name={self.name!r})"
+
+
+class ZohoItemView:
+    __slots__ = ("item_id", "sku", "stock")
+
+    PROJECTION = {"_id": 0, "item_id": 1, "sku": 1, "actual_available_stock": 1, "available_stock": 1}
+
+    def __init__(self, item_id, sku=None, stock: int = 0):
+        self.item_id = item_id
+        self.sku = sku
+        self.stock = stock
+
+    @staticmethod
+    def stock_of(doc: dict) -> int:
+        """actual_available_stock (o available_stock si falta) como int; 0 si no es numérico."""
+        stock = doc.get("actual_available_stock")
+        if stock is None:
+            stock = doc.get("available_stock", 0)
+        try:
+            return int(stock)
+        except (TypeError, ValueError):
+            return 0
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "ZohoItemView":
+        return cls(doc.get("item_id"), doc.get("sku"), cls.stock_of(doc))
+
+    def __repr__(self):
+        return f"ZohoItemView(item_id={self.item_id!r}, sku={self.sku!r}, stock={self.stock})"
+
+
+class VariantView:
+    __slots__ = ("id", "sku", "inventory_item_id", "position")
+
+    def __init__(self, id, sku=None, inventory_item_id=None, position: int = 1):
+        self.id = id
+        self.sku = sku
+        self.inventory_item_id = inventory_item_id
+        self.position = position
+
+    @classmethod
+    def from_doc(cls, doc: dict, index: int = 0) -> "VariantView":
+        return cls(doc.get("id"), doc.get("sku"), doc.get("inventory_item_id"), doc.get("position") or index + 1)
+
+    def __repr__(self):
+        return f"VariantView(id={self.id!r}, sku={self.sku!r}, inventory_item_id={self.inventory_item_id!r})"
+
+
+class ShopifyProductView:
+    __slots__ = ("id", "gid", "status", "variants")
+
+    PROJECTION = {
+        "_id": 0, "id": 1, "admin_graphql_api_id": 1, "status": 1,
+        "variants.id": 1, "variants.sku": 1, "variants.inventory_item_id": 1, "variants.position": 1,
+    }
+
+    def __init__(self, id, gid=None, status=None, variants: tuple = ()):
+        self.id = id
+        self.gid = gid
+        self.status = (status or "").lower()
+        self.variants = variants
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "ShopifyProductView":
+        return cls(
+            doc.get("id"),
+            doc.get("admin_graphql_api_id"),
+            doc.get("status"),
+            tuple(VariantView.from_doc(v, i) for i, v in enumerate(doc.get("variants") or [])),
+        )
+
+    @property
+    def archived(self) -> bool:
+        return self.status == "archived"
+
+    def primary_variant(self, sku=None) -> VariantView | None:
+        """Variante cuyo SKU coincide con el de Zoho; si ninguna, la de menor position."""
+        variants = [v for v in self.variants if v.id is not None and v.inventory_item_id is not None]
+        if not variants:
+            return None
+        if sku:
+            match = next((v for v in variants if v.sku == sku), None)
+            if match is not None:
+                return match
+        return min(variants, key=lambda v: v.position)
+
+    def __repr__(self):
+        return f"ShopifyProductView(id={self.id!r}, status={self.status!r}, variants={len(self.variants)})"
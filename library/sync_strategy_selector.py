@@ -0,0 +1,190 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from statistics import median
+
+from pymongo import ASCENDING, DESCENDING
+
+
+class SYNC_STRATEGY_SELECTOR:
+    """
+    Estimación de costo por estrategia para cada corrida (llamadas y segundos).
+
+    Cuál camino es más barato depende de cuántos registros cambiaron y de cuánto margen
+    queda en los límites de la tienda:
+    - REST: una llamada por job (+ GETs de verificación) contra el leaky bucket
+      (SHOPIFY_RATE_LIMITER: bucket_size, leak_rate, nivel actual).
+    - GraphQL: productUpdate con alias por lote + productVariantsBulkUpdate por producto,
+      contra el presupuesto de costo (SHOPIFY_GRAPHQL: available(), restore_rate).
+    El tiempo estimado es el mayor entre lo que impone el límite de la API y la latencia
+    por llamada repartida entre los workers.
+
+    Solo se estiman las estrategias que existen en el código: escrituras de productos
+    (rest | graphql) e ingesta por paginación REST (rest_paging; no hay bulk operations).
+
+    Cada estimación se guarda junto al resultado real en management.sync_strategy_log;
+    la mediana de real/estimado de las últimas corridas (por tienda, tipo y estrategia)
+    corrige las siguientes estimaciones. El factor se cachea por proceso
+    (strategy_calibration_ttl_seconds, default 600): send_workload estima en cada ventana
+    y en cada lote de altas, y no hace falta releer la bitácora en cada una.
+    {
+        "store": "managed_store_one",
+        "kind": "writes",                 # writes | ingest:{endpoint}
+        "chosen": "graphql",
+        "estimates": {"rest": {"calls": 120, "raw_seconds": 61.0, "seconds": 55.2}, "graphql": {...}},
+        "inputs": {...},                  # tamaños y margen usados para estimar
+        "actual": {"calls": 9, "seconds": 7.4, "throttled": 0},
+        "created_at": datetime
+    }
+    """
+
+    DB_NAME = "management"
+    COLLECTION = "sync_strategy_log"
+    REST_PAGE_SIZE = 250
+    DEFAULT_LATENCY = {"rest": 0.6, "graphql": 1.0, "rest_paging": 0.8}
+    CALIBRATION_WINDOW = 20
+    CALIBRATION_BOUNDS = (0.25, 4.0)
+    CALIBRATION_TTL_SECONDS = 600
+    INDEXES = [
+        ([("store", ASCENDING), ("kind", ASCENDING), ("chosen", ASCENDING), ("created_at", DESCENDING)], {}),
+    ]
+
+    _calibration_cache: dict = {}  # (store, kind, strategy) -> (expira, factor)
+    _calibration_lock = threading.Lock()
+
+    def __init__(self, client, store: str, store_conf: dict | None = None):
+        self.collection = client[self.DB_NAME][self.COLLECTION]
+        self.store = store
+        conf = store_conf or {}
+        self.latency = {
+            "rest": float(conf.get("strategy_latency_rest", self.DEFAULT_LATENCY["rest"])),
+            "graphql": float(conf.get("strategy_latency_graphql", self.DEFAULT_LATENCY["graphql"])),
+            "rest_paging": float(conf.get("strategy_latency_rest_paging", self.DEFAULT_LATENCY["rest_paging"])),
+        }
+        self.calibration_ttl = float(conf.get("strategy_calibration_ttl_seconds", self.CALIBRATION_TTL_SECONDS))
+
+    # -------------------------
+    # Modelo
+    # -------------------------
+    @staticmethod
+    def _rest_seconds(calls: int, limiter) -> float:
+        """Segundos que el leaky bucket tarda en dejar pasar `calls` llamadas."""
+        if limiter is None:
+            return 0.0
+        return max(0.0, calls - limiter.headroom()) / max(limiter.leak_rate, 0.1)
+
+    @staticmethod
+    def _graphql_seconds(cost: float, gql) -> float:
+        """Segundos para que el presupuesto de costo cubra `cost`."""
+        if gql is None or cost <= 0:
+            return 0.0
+        return max(0.0, cost - gql.available()) / max(gql.restore_rate, 1.0)
+
+    def calibration(self, kind: str, strategy: str) -> float:
+        """Mediana de real/estimado (segundos) de las últimas corridas; 1.0 sin historial."""
+        key = (self.store, kind, strategy)
+        now = time.monotonic()
+        with self._calibration_lock:
+            cached = self._calibration_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        factor = self._load_calibration(kind, strategy)
+        with self._calibration_lock:
+            self._calibration_cache[key] = (now + self.calibration_ttl, factor)
+        return factor
+
+    def _load_calibration(self, kind: str, strategy: str) -> float:
+        ratios = []
+        for doc in self.collection.find(
+            {"store": self.store, "kind": kind, "chosen": strategy, "actual.seconds": {"$gt": 0}},
+            {"_id": 0, "chosen": 1, "estimates": 1, "actual": 1},
+        ).sort("created_at", DESCENDING).limit(self.CALIBRATION_WINDOW):
+            estimated = ((doc.get("estimates") or {}).get(strategy) or {}).get("raw_seconds")
+            if estimated:
+                ratios.append(doc["actual"]["seconds"] / estimated)
+        if not ratios:
+            return 1.0
+        low, high = self.CALIBRATION_BOUNDS
+        return min(high, max(low, median(ratios)))
+
+    def estimate_writes(self, n_header: int, n_variants: int, n_rest_only: int, *, limiter, gql,
+                        workers: int, verify_mode: str = "response", sample_pct: float = 10.0,
+                        graphql_batch_size: int = 50, per_op_cost: float = 11.0, variant_op_cost: float = 11.0) -> dict:
+        """
+        n_header: jobs que GraphQL puede mandar con productUpdate (header / archivados).
+        n_variants: jobs de solo variantes (productVariantsBulkUpdate).
+        n_rest_only: jobs que van por REST con cualquier estrategia.
+        """
+        workers = max(1, int(workers))
+
+        def _verify_gets(n: int) -> int:
+            if verify_mode == "full":
+                return n
+            if verify_mode == "sample":
+                return int(math.ceil(n * float(sample_pct) / 100.0))
+            return 0
+
+        # REST: todo por PUT
+        n_all = n_header + n_variants + n_rest_only
+        rest_calls = n_all + _verify_gets(n_all)
+        rest_raw = max(self._rest_seconds(rest_calls, limiter), rest_calls * self.latency["rest"] / workers)
+
+        # GraphQL: alias por lote + una mutation por producto de solo variantes; lo demás por REST.
+        # La verificación de los lotes es un nodes(ids) por lote; la de variantes, GET REST.
+        batch = max(1, int(graphql_batch_size))
+        n_batches = int(math.ceil(n_header / batch))
+        verify_batches = n_batches if verify_mode in ("full", "sample") else 0
+        gql_requests = n_batches + verify_batches + n_variants
+        gql_cost = n_header * per_op_cost + n_batches + n_variants * variant_op_cost
+        if verify_batches:
+            gql_cost += _verify_gets(n_header) + verify_batches
+        left_calls = n_rest_only + _verify_gets(n_rest_only) + _verify_gets(n_variants)
+        gql_raw = max(
+            self._graphql_seconds(gql_cost, gql),
+            self._rest_seconds(left_calls, limiter),
+            (gql_requests * self.latency["graphql"] + left_calls * self.latency["rest"]) / workers,
+        )
+
+        estimates = {
+            "rest": {"calls": rest_calls, "raw_seconds": round(rest_raw, 3)},
+            "graphql": {"calls": gql_requests + left_calls, "cost": gql_cost, "raw_seconds": round(gql_raw, 3)},
+        }
+        for strategy, est in estimates.items():
+            est["seconds"] = round(est["raw_seconds"] * self.calibration("writes", strategy), 3)
+        return estimates
+
+    @staticmethod
+    def ingest_kind(endpoint: str) -> str:
+        return f"ingest:{endpoint}"
+
+    def estimate_ingest(self, endpoint: str, expected_records: int, *, limiter=None) -> dict:
+        """Páginas de 250 para traer ~expected_records (p.ej. lo que ya hay en el espejo)."""
+        pages = max(1, int(math.ceil(max(0, expected_records) / self.REST_PAGE_SIZE)))
+        raw = max(self._rest_seconds(pages, limiter), pages * self.latency["rest_paging"])
+        est = {"calls": pages, "raw_seconds": round(raw, 3)}
+        est["seconds"] = round(raw * self.calibration(self.ingest_kind(endpoint), "rest_paging"), 3)
+        return {"rest_paging": est}
+
+    @staticmethod
+    def pick(estimates: dict) -> str:
+        """Estrategia con menos segundos estimados (empate → menos llamadas)."""
+        return min(estimates, key=lambda s: (estimates[s]["seconds"], estimates[s]["calls"]))
+
+    # -------------------------
+    # Bitácora
+    # -------------------------
+    def record(self, kind: str, chosen: str, estimates: dict, actual: dict, inputs: dict | None = None):
+        try:
+            self.collection.insert_one({
+                "store": self.store,
+                "kind": kind,
+                "chosen": chosen,
+                "estimates": estimates,
+                "inputs": inputs or {},
+                "actual": actual,
+                "created_at": datetime.now(timezone.utc),
+            })
+        except Exception:
+            # la bitácora es para afinar el modelo: nunca debe tumbar un sync
+            pass
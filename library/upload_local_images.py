@@ -4,6 +4,7 @@ import base64
 from io import BytesIO
 from PIL import Image,ImageChops
 from pymongo import MongoClient
+from library.mongo_client import MONGO_CLIENT_POOL
 from datetime import datetime
 from colorama import init, Fore, Style
 from dotenv import load_dotenv
@@ -179,8 +180,7 @@ class SHOPIFY_IMAGES:
         return folder_name  # si no tiene separador, usamos todo
 
     def _get_mongo_client(self) -> MongoClient:
-        mongo_url = self.data["non_sql_database"]["url"]
-        return MongoClient(mongo_url)
+        return MONGO_CLIENT_POOL.get_client(self.data)
 
     # ================== CASO 1: PRIMERA VEZ ==================
 
@@ -1,7 +1,10 @@
 from colorama import Fore, init, Style
 import requests
 import os
-from pymongo import MongoClient
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.sync_logger import SYNC_LOGGER
+from library.id_normalizer import ID_NORMALIZER
+from library.index_manager import MONGO_INDEX_MANAGER
 from colorama import Fore, Style
 import requests
 import yaml
@@ -18,6 +21,7 @@ class ZOHO_INVENTORY:
         self.data = yaml_data
         self.yaml_path = os.path.join(self.working_folder, "config.yml")
         self.store = store
+        self.log = SYNC_LOGGER.from_config(self.data)
 
     def refresh_zoho_token(self):
         """Refresca el access_token de Zoho y actualiza el YAML."""
@@ -70,15 +74,11 @@ class ZOHO_INVENTORY:
         enviará mensajes de texto plano al logger (por ejemplo, para Streamlit).
         """
 
-        def _log(msg: str):
-            # Solo usamos logger si es una función/callable
-            if callable(logger):
-                logger(str(msg))
+        _log = self.log.bind(logger, "sync_zoho_inventory_to_mongo", echo=False)
 
         db_name = "Zoho_Inventory"
 
         zoho_conf = self.data["zoho"]
-        mongo_db_url = self.data["non_sql_database"]["url"]
 
         # endpoint -> (primary_key, list_key_en_respuesta)
         full_endpoints_zoho = {
@@ -127,7 +127,7 @@ class ZOHO_INVENTORY:
         )
 
         # Conexión a Mongo
-        client = MongoClient(mongo_db_url)
+        client = MONGO_CLIENT_POOL.get_client(self.data)
         db = client[db_name]
 
         summary = {}
@@ -141,8 +141,8 @@ class ZOHO_INVENTORY:
             _log(msg)
 
             collection = db[endpoint]
-            # Aseguramos índice único por el campo de Zoho
-            collection.create_index(pk_field, unique=True)
+            # Aseguramos índice único por el campo de Zoho (+ los de consulta declarados)
+            MONGO_INDEX_MANAGER.ensure_collection(client, db_name, endpoint)
 
             page = 1
             per_page = 200
@@ -225,6 +225,9 @@ class ZOHO_INVENTORY:
                         _log(msg)
                         continue
 
+                    if pk_field == "item_id":
+                        # item_id de Zoho siempre como str (ver ID_NORMALIZER)
+                        doc[pk_field] = ID_NORMALIZER.to_item_id(doc[pk_field])
                     filter_query = {pk_field: doc[pk_field]}
                     update_query = {"$set": doc}
 
@@ -261,7 +264,6 @@ class ZOHO_INVENTORY:
                 "updated": updated,
             }
 
-        client.close()
         return summary
 
 
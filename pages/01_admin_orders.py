@@ -1,4 +1,3 @@
-from pymongo import MongoClient
 import pandas as pd
 import os
 import sys
@@ -91,10 +90,14 @@ if pkg_exists:
         yaml_data.update(pkg_data)   # sobreescribe claves si ya existen
 
 # ================== CONEXIÓN A MONGODB ==================
-mongo_db_url = yaml_data["non_sql_database"]["url"]
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.index_manager import MONGO_INDEX_MANAGER
 
 try:
-    client = MongoClient(mongo_db_url)
+    # cliente compartido del proceso: no se crea uno nuevo en cada rerun
+    client = MONGO_CLIENT_POOL.get_client(yaml_data)
+    # índices declarados en library/index_manager.py (una vez por proceso)
+    MONGO_INDEX_MANAGER.ensure_once(client, yaml_data)
     db = client["Zoho_Inventory"]
     collection = db["salesorders"]
 except Exception as e:
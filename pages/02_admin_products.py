@@ -1,4 +1,3 @@
-from pymongo import MongoClient
 import pandas as pd
 import os
 import sys
@@ -137,10 +136,16 @@ with col3:
 
 
 # ================== CONEXIÓN A MONGODB ==================
-mongo_db_url = yaml_data["non_sql_database"]["url"]
+from library.mongo_client import MONGO_CLIENT_POOL
+from library.index_manager import MONGO_INDEX_MANAGER
+from library.store_links import STORE_LINKS
+from library.inventory_map import INVENTORY_MAP
 
 try:
-    client = MongoClient(mongo_db_url)
+    # cliente compartido del proceso: no se crea uno nuevo en cada rerun
+    client = MONGO_CLIENT_POOL.get_client(yaml_data)
+    # índices declarados en library/index_manager.py (una vez por proceso)
+    MONGO_INDEX_MANAGER.ensure_once(client, yaml_data)
     db = client["Zoho_Inventory"]
     collection = db["items"]
 except Exception as e:
@@ -201,7 +206,7 @@ else:
 st.divider()
 st.header("Asignación de productos por tienda")
 
-items_per_store_coll = db["items_per_store"]
+store_links = STORE_LINKS(client)
 
 # Claves internas -> etiqueta amigable
 stores = {
@@ -215,13 +220,8 @@ for tab, (store_key, store_label) in zip(tabs, stores.items()):
     with tab:
         st.subheader(store_label)
 
-        # --- Leer o inicializar documento de la tienda ---
-        store_doc = items_per_store_coll.find_one({"store": store_key}) or {
-            "store": store_key,
-            "items": [],
-        }
-        items_list = store_doc.get("items", [])
-        assigned_ids = [it["item_id"] for it in items_list if "item_id" in it]
+        # --- Vínculos actuales de la tienda ---
+        assigned_ids = store_links.assigned_item_ids(store_key)
 
         # --- DataFrame de productos ya asignados a esta tienda ---
         df_assigned = df[df["item_id"].isin(assigned_ids)].copy()
@@ -270,30 +270,11 @@ for tab, (store_key, store_label) in zip(tabs, stores.items()):
             )
 
             if st.button("Agregar a la tienda", key=f"btn_add_{store_key}") and to_add_ids:
-                # Recargar documento para evitar condiciones de carrera
-                store_doc = items_per_store_coll.find_one({"store": store_key}) or {
-                    "store": store_key,
-                    "items": [],
-                }
-                items_list = store_doc.get("items", [])
-                existing_ids = {it["item_id"] for it in items_list if "item_id" in it}
-
-                for item_id in to_add_ids:
-                    if item_id in existing_ids:
-                        continue
-                    row = df.loc[df["item_id"] == item_id].iloc[0]
-                    items_list.append(
-                        {
-                            "item_id": item_id,
-                            "name": row["item_name"],  # snapshot del nombre actual
-                        }
-                    )
-                    existing_ids.add(item_id)
-
-                items_per_store_coll.update_one(
-                    {"store": store_key},
-                    {"$set": {"store": store_key, "items": items_list}},
-                    upsert=True,
+                # upsert por vínculo: si otro usuario ya lo agregó, no se duplica
+                names = df.set_index("item_id")["item_name"].to_dict()
+                store_links.add_items(
+                    store_key,
+                    [{"item_id": item_id, "name": names.get(item_id)} for item_id in to_add_ids],  # snapshot del nombre actual
                 )
                 st.success(f"Se agregaron {len(to_add_ids)} productos a {store_label}.")
                 st.rerun()
@@ -319,25 +300,22 @@ for tab, (store_key, store_label) in zip(tabs, stores.items()):
             )
 
             if st.button("Retirar de la tienda", key=f"btn_remove_{store_key}") and to_remove_ids:
-                store_doc = items_per_store_coll.find_one({"store": store_key}) or {
-                    "store": store_key,
-                    "items": [],
-                }
-                items_list = [
-                    it for it in store_doc.get("items", [])
-                    if it.get("item_id") not in to_remove_ids
-                ]
-
-                items_per_store_coll.update_one(
-                    {"store": store_key},
-                    {"$set": {"store": store_key, "items": items_list}},
-                    upsert=True,
-                )
+                store_links.remove_items(store_key, to_remove_ids)
+                INVENTORY_MAP(client).remove_items(store_key, to_remove_ids)
                 st.success(f"Se retiraron {len(to_remove_ids)} productos de {store_label}.")
                 st.rerun()
         else:
             st.info("No hay productos que retirar en esta tienda.")
 
+# ================== ÍNDICES DE MONGODB ==================
+with st.expander("🧭 Índices de MongoDB (declarados vs existentes)"):
+    st.caption("missing = falta crearlo · unused = sin accesos desde el último reinicio · extra = nadie lo declara")
+    try:
+        index_rows = MONGO_INDEX_MANAGER.report(client, MONGO_INDEX_MANAGER.stores_from_config(yaml_data))
+        st.dataframe(pd.DataFrame(index_rows), use_container_width=True)
+    except Exception as e:
+        st.error(f"❌ No pude leer los índices: {e}")
+
 import streamlit as st
 
 stores = ["managed_store_one", "managed_store_two"]
@@ -351,9 +329,10 @@ Este botón ejecuta el **pipeline completo** para que Shopify refleje el inventa
 1. Zoho Inventory → Base interna (MongoDB)
 2. Shopify → Base interna (estado inicial)
 3. Ciclo 1: Base interna → Shopify (creación/ajustes de artículos)
-4. Shopify → Base interna (reflejar cambios del ciclo 1)
-5. Ciclo 2: Base interna → Shopify (estatus y afinado)
-6. Shopify → Base interna (reflejar el último cambio)
+4. Ciclo 2: Base interna → Shopify (estatus y afinado)
+
+Las respuestas de Shopify de cada escritura se guardan directo en la base interna,
+así que no hace falta volver a rastrear la tienda al final.
 """
 )
 
@@ -430,12 +409,7 @@ if st.button("Sincronizar PRODUCTOS Zoho y Shopify", use_container_width=True, k
         
             app = INVENTORY_AUTOMATIZATION(working_folder, yaml_data, store)
             app.run_product_sync(store) 
-        for store in stores:
-            st.write(f"📥 Shopify → Base interna (estado final) para **{store}**...")
-            shopify_sync = SHOPIFY_MONGODB(working_folder, yaml_data, store)
-            shopify_sync_before[store] = shopify_sync.sync_shopify_to_mongo(
-                logger=streamlit_logger, needed_endpoints= ['products']
-            )                    
+        # Sin rastreo final: lo que Shopify regresa de cada escritura ya se guardó en el espejo
          
     st.success("✅ Creación y actualización productos por tienda Shopify completados.")
     #st.json(shopify_sync_before)
@@ -475,24 +449,48 @@ if st.button("Sincronizar NIVELES DE INVENTARIO Zoho y Shopify", use_container_w
             shopify_sync_before[store] = shopify_sync.sync_shopify_to_mongo(
                 logger=streamlit_logger, needed_endpoints= ['inventory_levels']
             )
-        for store in stores:
-            st.write(f"📥 Base interna de con Zoho actualizado a -> Shopify para **{store}**...")
-            from library.inventory_automatization import INVENTORY_AUTOMATIZATION
-        
-            app = INVENTORY_AUTOMATIZATION(working_folder, yaml_data, store)
-            app.run_inventory_sync(store) 
-        for store in stores:
-            st.write(f"📥 Shopify → Base interna (estado final) para **{store}**...")
-            shopify_sync = SHOPIFY_MONGODB(working_folder, yaml_data, store)
-            shopify_sync_before[store] = shopify_sync.sync_shopify_to_mongo(
-                logger=streamlit_logger, needed_endpoints= ['inventory_levels']
-            )                    
+        # Una sola lectura de stock de Zoho para todas las tiendas; envío concurrente por tienda
+        st.write(f"📥 Base interna de con Zoho actualizado a -> Shopify para **{', '.join(stores)}**...")
+        from library.inventory_automatization import INVENTORY_AUTOMATIZATION
+
+        app = INVENTORY_AUTOMATIZATION(working_folder, yaml_data)
+        app.run_inventory_sync_all(stores)
+        # Sin rastreo final: lo que Shopify regresa de cada escritura ya se guardó en el espejo
          
     st.success("✅ Actualización de niveles de inventario por tienda Shopify completados.")
     #st.json(shopify_sync_before)
 
     st.success("🎉 Pipeline completo Zoho ↔ Shopify finalizado correctamente.")
 
+if st.button("Sincronizar TODO (productos + inventario) Zoho y Shopify", use_container_width=True, key="btn_fused_sync"):
+    from library.zoho_inventory import ZOHO_INVENTORY
+    from library.shopify_mongo_db import SHOPIFY_MONGODB
+    from library.inventory_automatization import INVENTORY_AUTOMATIZATION
+
+    st.info("⏳ Iniciando sync combinado Zoho ↔ Shopify (una sola carga de datos)...")
+
+    st.subheader("1️⃣ Zoho Inventory → Base interna")
+    with st.spinner("Sincronizando Zoho Inventory con la base interna..."):
+        zoho_inventory = ZOHO_INVENTORY(working_folder, yaml_data)
+        zoho_summary = zoho_inventory.sync_zoho_inventory_to_mongo(logger=streamlit_logger, needed_endpoints = ['items'])
+    st.success("✅ Zoho Inventory sincronizado con la base interna.")
+
+    st.subheader("2️⃣ Shopify → Base interna → Shopify (productos + inventario)")
+    fused_summary = {}
+    with st.spinner("Sincronizando productos e inventario por tienda..."):
+        app = INVENTORY_AUTOMATIZATION(working_folder, yaml_data)
+        for store in stores:
+            st.write(f"📥 Shopify → Base interna (productos + niveles) para **{store}**...")
+            shopify_sync = SHOPIFY_MONGODB(working_folder, yaml_data, store)
+            shopify_sync.sync_shopify_to_mongo(
+                logger=streamlit_logger, needed_endpoints= ['products', 'inventory_levels']
+            )
+            st.write(f"📤 Catálogo y stock → Shopify para **{store}**...")
+            fused_summary[store] = app.run_full_sync(store)
+        # Sin rastreo final: lo que Shopify regresa de cada escritura ya se guardó en el espejo
+    st.json(fused_summary)
+    st.success("🎉 Sync combinado Zoho ↔ Shopify finalizado correctamente.")
+
 
 st.divider()        
 st.subheader("🖼 Gestión de imágenes de productos")
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+    import mongomock.collection as _mongomock_collection
+except ImportError:
+    _mongomock_collection = None
+
+if _mongomock_collection is not None:
+    # pymongo >= 4.11 manda sort= a UpdateOne dentro de bulk_write; mongomock aún no lo acepta
+    _add_update = _mongomock_collection.BulkOperationBuilder.add_update
+
+    def _add_update_without_sort(self, *args, sort=None, **kwargs):
+        return _add_update(self, *args, **kwargs)
+
+    _mongomock_collection.BulkOperationBuilder.add_update = _add_update_without_sort
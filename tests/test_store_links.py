@@ -0,0 +1,38 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from library.store_links import STORE_LINKS
+
+
+@pytest.fixture
+def client():
+    STORE_LINKS._migrated.clear()
+    client = mongomock.MongoClient()
+    client["Zoho_Inventory"]["items_per_store"].insert_one({
+        "store": "managed_store_one",
+        "items": [{"item_id": "1", "name": "uno"}, {"item_id": "2", "name": "dos", "shopify_id": 20}],
+    })
+    yield client
+    STORE_LINKS._migrated.clear()
+
+
+def test_migrates_legacy_items_once(client):
+    assert STORE_LINKS(client).assigned_item_ids("managed_store_one") == ["1", "2"]
+    assert client["management"]["migrations"].find_one({"_id": "store_links_from_items_per_store_v1:managed_store_one"})
+
+
+def test_removing_all_links_keeps_store_empty(client):
+    STORE_LINKS(client).remove_items("managed_store_one", ["1", "2"])
+
+    assert STORE_LINKS(client).assigned_item_ids("managed_store_one") == []
+    STORE_LINKS._migrated.clear()  # otro proceso: solo queda la marca persistida
+    assert STORE_LINKS(client).assigned_item_ids("managed_store_one") == []
+    assert not STORE_LINKS(client).exists("managed_store_one")
+
+
+def test_store_with_links_is_marked_without_reimport(client):
+    client["Zoho_Inventory"]["store_links"].insert_one({"store": "managed_store_one", "item_id": "9", "shopify_id": None})
+
+    assert STORE_LINKS(client).assigned_item_ids("managed_store_one") == ["9"]
+    assert client["management"]["migrations"].find_one({"_id": "store_links_from_items_per_store_v1:managed_store_one"})